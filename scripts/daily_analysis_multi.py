@@ -96,15 +96,7 @@ def run_daily_analysis():
 
     # 处理所有表格
     print("\n开始获取数据...")
-    results = []
-    for config in table_configs:
-        print(f"\n处理表格: {config['name']} ({config['table_id']})")
-        result = processor.process_table_data(
-            config['table_id'],
-            config['view_id'],
-            config['last_n']
-        )
-        results.append(result)
+    results = processor.process_tables(table_configs)
 
     # 检查是否有错误
     has_error = any("error" in r for r in results)
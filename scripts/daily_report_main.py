@@ -4,7 +4,6 @@
 """
 import sys
 import os
-import requests
 from datetime import datetime
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,13 +13,14 @@ sys.path.insert(0, os.path.join(project_root, "src"))
 sys.path.insert(0, scripts_dir)
 
 from generate_daily_report import generate_report, MultiTableDataProcessor
+from tools.feishu_http import get_webhook_session
 
 
-def send_to_feishu(title: str, markdown_content: str) -> bool:
+def send_to_feishu(title: str, markdown_content: str, webhook_url: str | None = None) -> bool:
     """发送报告到飞书群组"""
     try:
-        # 从环境变量获取 Webhook URL，如果没有则使用默认值
-        webhook_url = os.getenv("FEISHU_WEBHOOK_URL")
+        # 未显式指定时从环境变量获取 Webhook URL，如果没有则使用默认值
+        webhook_url = webhook_url or os.getenv("FEISHU_WEBHOOK_URL")
         if not webhook_url:
             # 默认使用二重螺旋群的 Webhook URL
             webhook_url = "https://open.feishu.cn/open-apis/bot/v2/hook/9d70437e-690c-4f96-8601-5b7058db0ebd"
@@ -52,7 +52,7 @@ def send_to_feishu(title: str, markdown_content: str) -> bool:
             }
         }
 
-        response = requests.post(webhook_url, json=payload)
+        response = get_webhook_session().post(webhook_url, json=payload, timeout=30)
         result = response.json()
 
         if result.get("code") == 0:
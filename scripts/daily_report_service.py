@@ -8,7 +8,6 @@ import sys
 import os
 import time
 import json
-import subprocess
 import signal
 import logging
 from datetime import datetime
@@ -19,6 +18,8 @@ from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from report_runner import get_report_runner
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -47,18 +48,13 @@ def run_report(config_file):
         logger.info(f"开始执行日报任务: {config_file}")
         logger.info(f"========================================")
 
-        cmd = [sys.executable, "scripts/generate_report.py", "--config", config_file]
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-        if result.stdout:
-            logger.info(result.stdout)
-        if result.stderr:
-            logger.warning(result.stderr)
+        # 由执行器在预加载模块的子进程中执行，统一限制并发与超时
+        result = get_report_runner().run_one(config_file)
 
-        if result.returncode == 0:
+        if result.success:
             logger.info(f"✅ {config_file} 执行成功")
         else:
-            logger.error(f"❌ {config_file} 执行失败，返回码: {result.returncode}")
+            logger.error(f"❌ {config_file} 执行失败: {result.error}")
 
     except Exception as e:
         logger.error(f"❌ 执行异常: {str(e)}", exc_info=True)
@@ -175,6 +171,7 @@ def main():
         logger.error(f"服务异常: {str(e)}", exc_info=True)
     finally:
         scheduler.shutdown()
+        get_report_runner().shutdown(wait=False)
         cleanup_pid()
         logger.info("服务已停止")
 
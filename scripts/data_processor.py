@@ -23,17 +23,17 @@ class DataProcessor:
         self.client = FeishuBitableClient()
         self.token = get_access_token()
 
-    def fetch_data(self, page_size=200):
-        """获取原始数据"""
+    def fetch_data(self, page_size=500):
+        """获取原始数据（自动翻页）"""
         try:
-            search_response = self.client.search_records(
+            return list(self.client.iter_records(
                 self.token,
                 self.app_token,
                 self.table_id,
                 sort=[{"field_name": "日期", "desc": True}],
-                page_size=page_size
-            )
-            return search_response.get("data", {}).get("items", [])
+                page_size=page_size,
+                prefetch=True
+            ))
         except Exception as e:
             print(f"获取数据失败: {str(e)}")
             return []
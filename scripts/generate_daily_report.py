@@ -5,13 +5,13 @@
 import sys
 import os
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 sys.path.insert(0, os.path.join(project_root, "src"))
 
 from multi_table_processor import MultiTableDataProcessor
+from metrics_engine import DailyMetrics
 
 
 # 业务场景：海外游戏项目二重螺旋的数据分析师
@@ -25,69 +25,6 @@ from multi_table_processor import MultiTableDataProcessor
 # - 移动端：IOS、安卓
 
 
-def get_latest_date(records):
-    """获取最新日期"""
-    if not records:
-        return None
-
-    dates = [r["date"] for r in records if r["date"]]
-    if not dates:
-        return None
-
-    return max(dates)
-
-
-def get_records_by_date(records, target_date):
-    """获取指定日期的所有记录"""
-    return [r for r in records if r["date"] == target_date]
-
-
-def summarize_by_group(records):
-    """按分组汇总数据"""
-    group_summary = defaultdict(lambda: {
-        "dau": 0,
-        "new_users": 0,
-        "income": 0.0,
-        "paid_users": 0
-    })
-
-    total_dau = 0
-    total_new = 0
-    total_income = 0.0
-    total_paid = 0
-
-    for rec in records:
-        group = rec["group"]
-
-        group_summary[group]["dau"] += rec["dau"]
-        group_summary[group]["new_users"] += rec["new_users"]
-        group_summary[group]["income"] += rec["income"]
-        group_summary[group]["paid_users"] += rec["paid_users"]
-
-        total_dau += rec["dau"]
-        total_new += rec["new_users"]
-        total_income += rec["income"]
-        total_paid += rec["paid_users"]
-
-    # 计算ARPU和ARPPU
-    arpu = round(total_income / total_dau, 2) if total_dau > 0 else 0
-    arppu = round(total_income / total_paid, 2) if total_paid > 0 else 0
-    paid_rate = round(total_paid / total_dau * 100, 2) if total_dau > 0 else 0
-
-    return {
-        "total": {
-            "dau": total_dau,
-            "new_users": total_new,
-            "income": total_income,
-            "paid_users": total_paid,
-            "paid_rate": paid_rate,
-            "arpu": arpu,
-            "arppu": arppu
-        },
-        "groups": dict(group_summary)
-    }
-
-
 def format_change(current, previous, metric_name="", is_percentage=False):
     """格式化变化"""
     if previous == 0:
@@ -146,31 +83,24 @@ def generate_report(processor, table_configs):
 
         # 获取所有记录（重新获取原始记录）
         records = processor.fetch_data(config['table_id'], config['view_id'])
-        for record in records:
-            parsed = processor.parse_record(record)
-            if parsed:
-                parsed["table_name"] = config['name']
-                all_records.append(parsed)
+        for parsed in processor.parse_records(records):
+            parsed["table_name"] = config['name']
+            all_records.append(parsed)
 
-    # 按表格分类
-    base_records = [r for r in all_records if r["table_name"] == "游戏基础数据"]
-    channel_records = [r for r in all_records if r["table_name"] == "游戏渠道数据"]
-    country_records = [r for r in all_records if r["table_name"] == "游戏主要国家数据"]
+    # 按表格分类，各表一次性按日期、分组聚合
+    base_metrics = DailyMetrics(r for r in all_records if r["table_name"] == "游戏基础数据")
+    channel_metrics = DailyMetrics(r for r in all_records if r["table_name"] == "游戏渠道数据")
+    country_metrics = DailyMetrics(r for r in all_records if r["table_name"] == "游戏主要国家数据")
 
     # 获取最新日期（昨日）
-    latest_date = get_latest_date(base_records)
-    if not latest_date:
+    sorted_dates = base_metrics.dates
+    if not sorted_dates:
         print("\n❌ 没有找到有效数据！")
         return None
 
-    print(f"\n最新数据日期: {latest_date}")
+    print(f"\n最新数据日期: {sorted_dates[-1]}")
 
     # 获取前日数据
-    base_date_groups = defaultdict(list)
-    for rec in base_records:
-        base_date_groups[rec["date"]].append(rec)
-
-    sorted_dates = sorted(base_date_groups.keys())
     if len(sorted_dates) < 2:
         print("\n❌ 数据不足，无法对比！")
         return None
@@ -182,32 +112,15 @@ def generate_report(processor, table_configs):
     print(f"前日: {day_before_date}")
 
     # 汇总昨日和前日的基础数据
-    yesterday_records = base_date_groups[yesterday_date]
-    day_before_records = base_date_groups[day_before_date]
-
-    yesterday_summary = summarize_by_group(yesterday_records)
-    day_before_summary = summarize_by_group(day_before_records)
-
-    # 获取昨日渠道数据
-    channel_date_groups = defaultdict(list)
-    for rec in channel_records:
-        channel_date_groups[rec["date"]].append(rec)
-
-    yesterday_channel_records = channel_date_groups.get(yesterday_date, [])
-    day_before_channel_records = channel_date_groups.get(day_before_date, [])
-    yesterday_channel_summary = summarize_by_group(yesterday_channel_records)
-
-    # 获取昨日国家数据
-    country_date_groups = defaultdict(list)
-    for rec in country_records:
-        country_date_groups[rec["date"]].append(rec)
+    yesterday_summary = base_metrics.summary(yesterday_date)
+    day_before_summary = base_metrics.summary(day_before_date)
 
-    yesterday_country_records = country_date_groups.get(yesterday_date, [])
-    day_before_country_records = country_date_groups.get(day_before_date, [])
-    yesterday_country_summary = summarize_by_group(yesterday_country_records)
+    # 获取昨日渠道、国家数据
+    yesterday_channel_summary = channel_metrics.summary(yesterday_date)
+    yesterday_country_summary = country_metrics.summary(yesterday_date)
 
     # 获取近7天数据
-    recent_7_days = sorted_dates[-7:] if len(sorted_dates) >= 7 else sorted_dates
+    recent_7_days = base_metrics.latest_dates(7)
 
     # 生成报告
     report_lines = []
@@ -244,10 +157,9 @@ def generate_report(processor, table_configs):
     has_reason = False
 
     # 分析各渠道的数据变化
-    if len(channel_records) > 0:
+    if channel_metrics.dates:
         # 汇总前日和昨日的渠道数据
-        day_before_channel_summary = summarize_by_group(day_before_channel_records)
-        yesterday_channel_summary = summarize_by_group(yesterday_channel_records)
+        day_before_channel_summary = channel_metrics.summary(day_before_date)
 
         day_before_channels = day_before_channel_summary["groups"]
         yesterday_channels = yesterday_channel_summary["groups"]
@@ -299,10 +211,9 @@ def generate_report(processor, table_configs):
                 has_reason = True
 
     # 分析各国家的数据变化
-    if len(country_records) > 0:
+    if country_metrics.dates:
         # 汇总前日和昨日的国家数据
-        day_before_country_summary = summarize_by_group(day_before_country_records)
-        yesterday_country_summary = summarize_by_group(yesterday_country_records)
+        day_before_country_summary = country_metrics.summary(day_before_date)
 
         day_before_countries = day_before_country_summary["groups"]
         yesterday_countries = yesterday_country_summary["groups"]
@@ -433,16 +344,14 @@ def generate_report(processor, table_configs):
     arpu_values = []
     arppu_values = []
 
-    for date in recent_7_days:
-        records_for_date = base_date_groups.get(date, [])
-        summary = summarize_by_group(records_for_date)
-        dau_values.append(summary["total"]["dau"])
-        new_values.append(summary["total"]["new_users"])
-        income_values.append(summary["total"]["income"])
-        paid_users_values.append(summary["total"]["paid_users"])
-        paid_rate_values.append(summary["total"]["paid_rate"])
-        arpu_values.append(summary["total"]["arpu"])
-        arppu_values.append(summary["total"]["arppu"])
+    for total in base_metrics.window(recent_7_days):
+        dau_values.append(total["dau"])
+        new_values.append(total["new_users"])
+        income_values.append(total["income"])
+        paid_users_values.append(total["paid_users"])
+        paid_rate_values.append(total["paid_rate"])
+        arpu_values.append(total["arpu"])
+        arppu_values.append(total["arppu"])
 
     # 1. DAU趋势
     report_lines.append("\n### 1. DAU趋势分析")
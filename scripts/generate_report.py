@@ -9,7 +9,6 @@ import os
 import json
 import argparse
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 scripts_dir = os.path.join(project_root, "scripts")
@@ -18,6 +17,8 @@ sys.path.insert(0, os.path.join(project_root, "src"))
 sys.path.insert(0, scripts_dir)
 
 from multi_table_processor import MultiTableDataProcessor
+from metrics_engine import DailyMetrics
+from record_parser import RecordParser, aliases_from_config
 
 
 class ConfigurableReportGenerator:
@@ -31,6 +32,8 @@ class ConfigurableReportGenerator:
         self.report_config = self.config.get("report", {})
         self.feishu_config = self.config.get("feishu", {})
         self.fields_config = self.config.get("fields", {})
+        self.field_aliases = aliases_from_config(self.fields_config)
+        self._record_parser = RecordParser(aliases=self.field_aliases)
         self.terminology = self.config.get("terminology", {})
 
         # 初始化数据处理器
@@ -97,119 +100,22 @@ class ConfigurableReportGenerator:
 
     def _parse_record(self, record, table_type="base"):
         """解析单条记录（支持配置化字段名）"""
-        fields_data = record.get("fields", {})
+        return self._record_parser.parse(record)
 
-        # 解析日期
-        date_value = fields_data.get("日期")
-        if isinstance(date_value, (int, float)):
-            date_str = datetime.fromtimestamp(date_value / 1000).strftime('%Y-%m-%d')
-        else:
-            return None
+    def _build_metrics(self, table_config, records):
+        """按表格字段结构解析记录，并一次性按日期、分组聚合"""
+        if not table_config or not records:
+            return DailyMetrics([])
+        parser = self.processor.get_parser(table_config["table_id"], self.field_aliases)
+        return DailyMetrics(parser.parse_many(records))
 
-        # 解析分组字段（基础数据/渠道/国家）
-        group_value = fields_data.get("渠道/国家") or fields_data.get("分组")
-        if isinstance(group_value, list) and len(group_value) > 0:
-            if isinstance(group_value[0], dict):
-                group = group_value[0].get('text', 'Total')
-            else:
-                group = str(group_value[0])
-        else:
-            group = 'Total'
-
-        # 根据配置解析字段
-        # DAU
-        dau_field = self.fields_config.get("dau", {}).get("aliases", ["DAU"])
-        dau = 0
-        for field_name in dau_field:
-            dau_value = fields_data.get(field_name)
-            if dau_value is not None:
-                if isinstance(dau_value, (int, float)):
-                    dau = int(dau_value)
-                elif isinstance(dau_value, dict) and 'value' in dau_value:
-                    val = dau_value['value']
-                    dau = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-                break
-
-        # 新增
-        new_field = self.fields_config.get("new_users", {}).get("aliases", ["新增", "新增角色"])
-        new_users = 0
-        for field_name in new_field:
-            new_value = fields_data.get(field_name)
-            if new_value is not None:
-                if isinstance(new_value, (int, float)):
-                    new_users = int(new_value)
-                elif isinstance(new_value, dict) and 'value' in new_value:
-                    val = new_value['value']
-                    new_users = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-                break
-
-        # 收入/付费金额
-        income_field = self.fields_config.get("revenue", {}).get("aliases", ["收入(美元)数字", "付费金额"])
-        income = 0.0
-        for field_name in income_field:
-            income_value = fields_data.get(field_name)
-            if income_value is not None:
-                if isinstance(income_value, (int, float)):
-                    income = float(income_value)
-                elif isinstance(income_value, dict) and 'value' in income_value:
-                    val = income_value['value']
-                    income = float(val[0]) if isinstance(val, list) and len(val) > 0 else float(val)
-                break
-
-        # 付费用户/付费人数
-        paid_field = self.fields_config.get("paid_users", {}).get("aliases", ["付费用户", "付费人数"])
-        paid_users = 0
-        for field_name in paid_field:
-            paid_value = fields_data.get(field_name)
-            if paid_value is not None:
-                if isinstance(paid_value, (int, float)):
-                    paid_users = int(paid_value)
-                elif isinstance(paid_value, dict) and 'value' in paid_value:
-                    val = paid_value['value']
-                    paid_users = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-                break
-
-        return {
-            "date": date_str,
-            "group": group,
-            "dau": dau,
-            "new_users": new_users,
-            "income": income,
-            "paid_users": paid_users
-        }
-
-    def _get_date_summary(self, records, date_str):
+    def _get_date_summary(self, metrics, date_str):
         """获取指定日期的汇总数据"""
-        if not records:
-            return {'dau': 0, 'new_users': 0, 'income': 0, 'paid_users': 0}
-
-        total = {'dau': 0, 'new_users': 0, 'income': 0, 'paid_users': 0}
-        for record in records:
-            parsed = self._parse_record(record)
-            if parsed and parsed.get('date') == date_str:
-                total['dau'] += parsed.get('dau', 0)
-                total['new_users'] += parsed.get('new_users', 0)
-                total['income'] += parsed.get('income', 0)
-                total['paid_users'] += parsed.get('paid_users', 0)
-
-        return total
+        return metrics.totals(date_str)
 
-    def _get_date_groups(self, records, date_str):
+    def _get_date_groups(self, metrics, date_str):
         """获取指定日期的分组数据（按group字段分组）"""
-        if not records:
-            return {}
-
-        groups = defaultdict(lambda: {'dau': 0, 'new_users': 0, 'income': 0, 'paid_users': 0})
-        for record in records:
-            parsed = self._parse_record(record)
-            if parsed and parsed.get('date') == date_str:
-                group = parsed.get('group', '未知')
-                groups[group]['dau'] += parsed.get('dau', 0)
-                groups[group]['new_users'] += parsed.get('new_users', 0)
-                groups[group]['income'] += parsed.get('income', 0)
-                groups[group]['paid_users'] += parsed.get('paid_users', 0)
-
-        return dict(groups)
+        return metrics.groups(date_str)
 
     def _generate_report(self):
         """生成报告"""
@@ -270,21 +176,17 @@ class ConfigurableReportGenerator:
             print("❌ 未找到基础数据表配置！")
             return None
 
-        base_records = self.processor.fetch_data(base_config['table_id'], base_config['view_id'])
-
-        channel_config = get_table_config("channel")
-        channel_records = self.processor.fetch_data(channel_config['table_id'], channel_config['view_id']) if channel_config else []
-
-        country_config = get_table_config("country")
-        country_records = self.processor.fetch_data(country_config['table_id'], country_config['view_id']) if country_config else []
+        # 所有表格并发获取，耗时取决于最慢的一张表
+        fetched = dict(zip(
+            (cfg["type"] for cfg in table_configs),
+            self.processor.fetch_tables(table_configs)
+        ))
+        base_metrics = self._build_metrics(base_config, fetched["base"])
+        channel_metrics = self._build_metrics(get_table_config("channel"), fetched.get("channel", []))
+        country_metrics = self._build_metrics(get_table_config("country"), fetched.get("country", []))
 
         # 检查可用日期
-        from collections import Counter
-        available_dates = set()
-        for record in base_records[:50]:
-            parsed = self.processor.parse_record(record)
-            if parsed:
-                available_dates.add(parsed['date'])
+        available_dates = set(base_metrics.dates)
 
         if yesterday_str not in available_dates or day_before_str not in available_dates:
             print(f"\n❌ 未找到指定日期的数据！")
@@ -292,8 +194,8 @@ class ConfigurableReportGenerator:
             return None
 
         # 获取基础数据
-        y_base = self._get_date_summary(base_records, yesterday_str)
-        d_base = self._get_date_summary(base_records, day_before_str)
+        y_base = self._get_date_summary(base_metrics, yesterday_str)
+        d_base = self._get_date_summary(base_metrics, day_before_str)
 
         # 计算付费率、ARPU、ARPPU
         y_dau = y_base['dau']
@@ -347,8 +249,8 @@ class ConfigurableReportGenerator:
             report_lines.append("**变化原因细拆：**")
 
             # 分析渠道数据
-            y_channel = self._get_date_groups(channel_records, yesterday_str)
-            d_channel = self._get_date_groups(channel_records, day_before_str)
+            y_channel = self._get_date_groups(channel_metrics, yesterday_str)
+            d_channel = self._get_date_groups(channel_metrics, day_before_str)
 
             # 收入变化归因
             income_changes = {}
@@ -406,8 +308,8 @@ class ConfigurableReportGenerator:
                         report_lines.append(f"- DAU增长{contribution_pct:.0f}%来自{channel_name}：该渠道DAU增长{change_amount:,}，占总DAU增长的{contribution_pct:.0f}%")
 
             # 分析国家数据
-            y_country = self._get_date_groups(country_records, yesterday_str)
-            d_country = self._get_date_groups(country_records, day_before_str)
+            y_country = self._get_date_groups(country_metrics, yesterday_str)
+            d_country = self._get_date_groups(country_metrics, day_before_str)
 
             # 收入变化归因
             country_income_changes = {}
@@ -476,6 +378,9 @@ class ConfigurableReportGenerator:
 
         Args:
             dry_run: 如果为 True，只生成报告文件，不发送到飞书
+
+        Returns:
+            报告是否生成（并发送）成功
         """
         # 生成报告
         report = self._generate_report()
@@ -506,17 +411,16 @@ class ConfigurableReportGenerator:
             # 发送到飞书（除非是 dry_run 模式）
             if not dry_run:
                 print("\n正在发送报告到飞书群组...")
-                import os
-                os.environ["FEISHU_WEBHOOK_URL"] = self.feishu_config.get("webhook_url")
-
+                # 直接传入 webhook，避免同进程内多个项目并发时互相覆盖环境变量
                 from daily_report_main import send_to_feishu
-                send_to_feishu(f"🎮 {title}", report)
-                print("✅ 报告已成功发送到飞书群组！")
+                return send_to_feishu(f"🎮 {title}", report, webhook_url=self.feishu_config.get("webhook_url"))
             else:
                 print("\n🔒 [DRY-RUN 模式] 跳过发送到飞书群组")
                 print(f"📤 如需发送，请移除 --dry-run 参数")
+                return True
         else:
             print("❌ 报告生成失败")
+            return False
 
 
 def main():
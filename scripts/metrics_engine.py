@@ -0,0 +1,90 @@
+"""
+日报指标计算引擎
+将解析后的记录一次性转成 pandas 列，按 (日期, 分组) 做一次分组聚合并向量化计算付费率、ARPU、ARPPU，
+之后昨日/前日/近N日等查询都直接读取聚合结果，不再逐条扫描记录
+"""
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# 可直接求和的基础指标
+BASE_METRICS = ("dau", "new_users", "income", "paid_users")
+# 由基础指标派生的比率指标
+RATE_METRICS = ("paid_rate", "arpu", "arppu")
+
+_DTYPES = {"dau": "int64", "new_users": "int64", "income": "float64", "paid_users": "int64"}
+
+
+def empty_metrics():
+    """无数据日期/分组的指标（全部为0）"""
+    return {"dau": 0, "new_users": 0, "income": 0.0, "paid_users": 0, "paid_rate": 0, "arpu": 0, "arppu": 0}
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    """逐行计算 numerator / denominator * scale，分母为0时取0，保留两位小数"""
+    num = numerator.to_numpy(dtype="float64") * scale
+    den = denominator.to_numpy(dtype="float64")
+    out = np.zeros_like(num)
+    np.divide(num, den, out=out, where=den > 0)
+    return np.round(out, 2)
+
+
+def _with_rates(frame):
+    """追加付费率、ARPU、ARPPU 列"""
+    return frame.assign(
+        paid_rate=_ratio(frame["paid_users"], frame["dau"], 100),
+        arpu=_ratio(frame["income"], frame["dau"]),
+        arppu=_ratio(frame["income"], frame["paid_users"]),
+    )
+
+
+def _to_rows(frame):
+    """DataFrame 转为 (索引, dict) 列表，数值转换为 Python 原生 int/float"""
+    columns = {col: frame[col].tolist() for col in frame.columns}
+    return zip(frame.index.tolist(), (dict(zip(columns, values)) for values in zip(*columns.values())))
+
+
+class DailyMetrics:
+    """按日期、分组预聚合的指标表"""
+
+    def __init__(self, parsed_records):
+        frame = pd.DataFrame.from_records(list(parsed_records), columns=["date", "group", *BASE_METRICS])
+        frame = frame.fillna({name: 0 for name in BASE_METRICS}).astype(_DTYPES)
+
+        by_group = frame.groupby(["date", "group"], sort=True)[list(BASE_METRICS)].sum()
+        by_date = by_group.groupby(level="date").sum()
+
+        self._totals = dict(_to_rows(_with_rates(by_date)))
+        self._groups = defaultdict(dict)
+        for (date, group), row in _to_rows(_with_rates(by_group)):
+            self._groups[date][group] = row
+
+        # 升序排列的全部日期
+        self.dates = list(self._totals)
+
+    @classmethod
+    def from_records(cls, records, parse_record):
+        """从原始记录构建，parse_record 返回 None 的记录会被跳过"""
+        return cls(parsed for parsed in map(parse_record, records) if parsed)
+
+    def latest_dates(self, n):
+        """最近 n 个有数据的日期（升序）"""
+        return self.dates[-n:] if n > 0 else []
+
+    def totals(self, date):
+        """指定日期全部分组合计的指标"""
+        row = self._totals.get(date)
+        return dict(row) if row is not None else empty_metrics()
+
+    def groups(self, date):
+        """指定日期各分组的指标 {分组: 指标}"""
+        return {group: dict(row) for group, row in self._groups.get(date, {}).items()}
+
+    def summary(self, date):
+        """指定日期的合计与分组指标 {"total": 合计指标, "groups": {分组: 指标}}"""
+        return {"total": self.totals(date), "groups": self.groups(date)}
+
+    def window(self, dates):
+        """多个日期的合计指标列表，用于近N日趋势"""
+        return [self.totals(date) for date in dates]
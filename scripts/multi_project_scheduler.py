@@ -6,9 +6,9 @@
 
 import time
 import schedule
-import subprocess
 import json
 from datetime import datetime
+from collections import defaultdict
 import logging
 import sys
 import os
@@ -17,6 +17,8 @@ import glob
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from report_runner import get_report_runner
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -63,28 +65,28 @@ def load_project_configs():
 
 def run_project_report(project_id, project_name, config_file):
     """执行指定项目的报告生成任务"""
+    run_project_reports([{
+        "project_id": project_id,
+        "project_name": project_name,
+        "config_file": config_file,
+    }])
+
+
+def run_project_reports(projects):
+    """在当前进程内并发执行同一调度时间的多个项目日报，单个项目失败/超时互不影响"""
     logger.info("="*80)
-    logger.info(f"开始执行 {project_name} ({project_id}) 日报任务")
+    logger.info(f"开始执行 {', '.join(p['project_name'] for p in projects)} 日报任务")
     logger.info("="*80)
 
     try:
-        # 执行报告生成脚本
-        cmd = [sys.executable, "scripts/generate_report.py", "--config", config_file]
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-        # 输出执行结果
-        if result.stdout:
-            logger.info(result.stdout)
-        if result.stderr:
-            logger.error(result.stderr)
-
-        if result.returncode == 0:
-            logger.info(f"✅ {project_name} 日报任务执行成功")
-        else:
-            logger.error(f"❌ {project_name} 日报任务执行失败，返回码: {result.returncode}")
-
+        results = get_report_runner().run_batch([p["config_file"] for p in projects])
+        for project, result in zip(projects, results):
+            if result.success:
+                logger.info(f"✅ {project['project_name']} 日报任务执行成功，耗时 {result.elapsed:.1f}s")
+            else:
+                logger.error(f"❌ {project['project_name']} 日报任务执行失败: {result.error}")
     except Exception as e:
-        logger.error(f"❌ {project_name} 日报任务执行异常: {str(e)}", exc_info=True)
+        logger.error(f"❌ 日报任务执行异常: {str(e)}", exc_info=True)
 
     logger.info("="*80)
 
@@ -109,20 +111,21 @@ def main():
     # 为每个项目设置定时任务
     current_time = datetime.now().time()
 
+    # 同一时间点的项目合并为一批，在同一进程内并发执行
+    projects_by_time = defaultdict(list)
     for project_id, project_info in project_configs.items():
-        project_name = project_info["project_name"]
-        schedule_time = project_info["schedule_time"]
-        config_file = project_info["config_file"]
+        projects_by_time[project_info["schedule_time"]].append({
+            "project_id": project_id,
+            "project_name": project_info["project_name"],
+            "config_file": project_info["config_file"],
+        })
 
+    for schedule_time, projects in projects_by_time.items():
         # 设置定时任务
-        schedule.every().day.at(schedule_time).do(
-            run_project_report,
-            project_id=project_id,
-            project_name=project_name,
-            config_file=config_file
-        )
-
-        logger.info(f"📅 {project_name} 已设置为每天 {schedule_time} 执行")
+        schedule.every().day.at(schedule_time).do(run_project_reports, projects=projects)
+
+        for project in projects:
+            logger.info(f"📅 {project['project_name']} 已设置为每天 {schedule_time} 执行")
 
     # 检查是否有项目的调度时间已过
     logger.info("\n检查项目调度时间...")
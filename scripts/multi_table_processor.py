@@ -4,130 +4,126 @@
 """
 import sys
 import os
-from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 sys.path.insert(0, os.path.join(project_root, "src"))
 
 from tools.feishu_bitable_tool import FeishuBitableClient, get_access_token
+from table_cache import BitableSnapshotCache
+from metrics_engine import DailyMetrics
+from record_parser import RecordParser
+
+# 是否启用本地快照缓存（增量同步）
+BITABLE_CACHE_ENABLED = os.getenv("BITABLE_CACHE_ENABLED", "1") == "1"
+
+_snapshot_cache = None
+
+
+def get_snapshot_cache():
+    """获取进程内共享的本地快照缓存"""
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        _snapshot_cache = BitableSnapshotCache()
+    return _snapshot_cache
 
 
 class MultiTableDataProcessor:
     """多表格数据处理器"""
 
-    def __init__(self, app_token):
+    def __init__(self, app_token, use_cache=BITABLE_CACHE_ENABLED):
         self.app_token = app_token
         self.client = FeishuBitableClient()
         self.token = get_access_token()
+        self.cache = get_snapshot_cache() if use_cache else None
+        self._default_parser = RecordParser()
+        self._parsers = {}
 
-    def fetch_data(self, table_id, view_id=None, page_size=200):
-        """获取指定表格的数据"""
+    def get_fields(self, table_id):
+        """获取表格字段列表（get_fields 的 data.items），失败时返回空列表"""
         try:
-            search_response = self.client.search_records(
+            return self.client.get_fields(self.token, self.app_token, table_id).get("data", {}).get("items", [])
+        except Exception as e:
+            print(f"获取表格 {table_id} 字段失败: {str(e)}")
+            return []
+
+    def get_parser(self, table_id, aliases=None):
+        """获取按表格字段结构与别名编译的记录解析器（每张表、每套别名只编译一次，需多请求一次 get_fields）"""
+        key = (table_id, tuple(sorted((aliases or {}).items())))
+        parser = self._parsers.get(key)
+        if parser is None:
+            parser = RecordParser(self.get_fields(table_id), aliases)
+            self._parsers[key] = parser
+        return parser
+
+    def fetch_data(self, table_id, view_id=None, page_size=500):
+        """获取指定表格的全部数据（自动翻页，启用缓存时增量同步）"""
+        if self.cache is not None:
+            try:
+                return self.cache.sync(self.client, self.token, self.app_token, table_id, view_id, page_size=page_size)
+            except Exception as e:
+                print(f"表格 {table_id} 缓存同步失败，改为直接拉取: {str(e)}")
+
+        try:
+            return list(self.client.iter_records(
                 self.token,
                 self.app_token,
                 table_id,
                 view_id=view_id,
                 sort=[{"field_name": "日期", "desc": True}],
-                page_size=page_size
-            )
-            return search_response.get("data", {}).get("items", [])
+                page_size=page_size,
+                prefetch=True
+            ))
         except Exception as e:
             print(f"获取表格 {table_id} 数据失败: {str(e)}")
             return []
 
-    def parse_record(self, record):
-        """解析单条记录"""
-        fields_data = record.get("fields", {})
+    def fetch_tables(self, table_configs, max_workers=None):
+        """并发获取多个表格的数据，按 table_configs 顺序返回各表记录列表
 
-        # 解析日期
-        date_value = fields_data.get("日期")
-        if isinstance(date_value, (int, float)):
-            date_str = datetime.fromtimestamp(date_value / 1000).strftime('%Y-%m-%d')
-        else:
-            return None
-
-        # 解析分组字段（基础数据/渠道/国家）
-        group_value = fields_data.get("渠道/国家") or fields_data.get("分组")
-        if isinstance(group_value, list) and len(group_value) > 0:
-            if isinstance(group_value[0], dict):
-                group = group_value[0].get('text', 'Total')
-            else:
-                group = str(group_value[0])
-        else:
-            group = 'Total'
-
-        # 解析DAU
-        dau_value = fields_data.get("DAU", 0)
-        if isinstance(dau_value, (int, float)):
-            dau = int(dau_value)
-        elif isinstance(dau_value, dict) and 'value' in dau_value:
-            val = dau_value['value']
-            dau = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-        else:
-            dau = 0
-
-        # 解析新增
-        new_value = fields_data.get("新增", 0)
-        if isinstance(new_value, (int, float)):
-            new_users = int(new_value)
-        elif isinstance(new_value, dict) and 'value' in new_value:
-            val = new_value['value']
-            new_users = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-        else:
-            new_users = 0
+        每个配置需包含 table_id，可选 view_id；单表失败时该表返回空列表
+        """
+        if not table_configs:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers or len(table_configs), thread_name_prefix="table-fetch") as executor:
+            futures = [
+                executor.submit(self.fetch_data, config['table_id'], config.get('view_id'))
+                for config in table_configs
+            ]
+            return [future.result() for future in futures]
 
-        # 解析收入
-        income_value = fields_data.get("收入(美元)数字")
-        if isinstance(income_value, dict) and 'value' in income_value:
-            val = income_value['value']
-            income = float(val[0]) if isinstance(val, list) and len(val) > 0 else float(val)
-        else:
-            income = 0.0
-
-        # 解析付费用户
-        paid_value = fields_data.get("付费用户", 0)
-        if isinstance(paid_value, (int, float)):
-            paid_users = int(paid_value)
-        elif isinstance(paid_value, dict) and 'value' in paid_value:
-            val = paid_value['value']
-            paid_users = int(val[0]) if isinstance(val, list) and len(val) > 0 else int(val)
-        else:
-            paid_users = 0
+    def parse_record(self, record):
+        """解析单条记录"""
+        return self._default_parser.parse(record)
 
-        return {
-            "date": date_str,
-            "group": group,
-            "dau": dau,
-            "new_users": new_users,
-            "income": income,
-            "paid_users": paid_users
-        }
+    def parse_records(self, records):
+        """批量解析记录（与 parse_record 一致），跳过无效记录"""
+        return self._default_parser.parse_many(records)
 
-    def process_table_data(self, table_id, view_id=None, last_n=None):
-        """处理单个表格的数据"""
+    def process_table_data(self, table_id, view_id=None, last_n=None, records=None):
+        """处理单个表格的数据（records 为已获取的原始记录时不再请求）"""
         print(f"\n处理表格: {table_id}")
         if view_id:
             print(f"视图ID: {view_id}")
 
-        records = self.fetch_data(table_id, view_id)
+        if records is None:
+            records = self.fetch_data(table_id, view_id)
 
         if not records:
             return {"error": f"表格 {table_id} 没有数据"}
 
         # 解析所有记录
-        parsed_records = []
-        for record in records:
-            parsed = self.parse_record(record)
-            if parsed:
-                parsed_records.append(parsed)
+        parsed_records = self.parse_records(records)
 
         if not parsed_records:
             return {"error": f"表格 {table_id} 没有有效数据"}
 
-        # 获取最后N条记录（按原始顺序）
+        # fetch_data 返回全表（接口按日期倒序，缓存同步后的顺序也不固定），
+        # 先按日期升序排列，最后N条即最新的N条记录
+        parsed_records.sort(key=lambda rec: rec["date"])
+
+        # 获取最后N条记录（按日期顺序）
         if last_n and len(parsed_records) >= last_n:
             target_records = parsed_records[-last_n:]
         else:
@@ -135,54 +131,10 @@ class MultiTableDataProcessor:
 
         print(f"  获取最后 {len(target_records)} 条记录")
 
-        # 按日期分组（针对这N条记录）
-        date_groups = defaultdict(list)
-        for rec in target_records:
-            date_groups[rec["date"]].append(rec)
-
-        # 排序日期
-        sorted_dates = sorted(date_groups.keys())
-
-        # 汇总数据
-        daily_summary = {}
-        for date in sorted_dates:
-            records_for_date = date_groups[date]
-
-            # 按分组汇总
-            group_summary = defaultdict(lambda: {
-                "dau": 0,
-                "new_users": 0,
-                "income": 0.0,
-                "paid_users": 0
-            })
-
-            total_dau = 0
-            total_new = 0
-            total_income = 0.0
-            total_paid = 0
-
-            for rec in records_for_date:
-                group = rec["group"]
-
-                group_summary[group]["dau"] += rec["dau"]
-                group_summary[group]["new_users"] += rec["new_users"]
-                group_summary[group]["income"] += rec["income"]
-                group_summary[group]["paid_users"] += rec["paid_users"]
-
-                total_dau += rec["dau"]
-                total_new += rec["new_users"]
-                total_income += rec["income"]
-                total_paid += rec["paid_users"]
-
-            daily_summary[date] = {
-                "total": {
-                    "dau": total_dau,
-                    "new_users": total_new,
-                    "income": total_income,
-                    "paid_users": total_paid
-                },
-                "groups": dict(group_summary)
-            }
+        # 一次分组聚合得到每个日期的合计与分组数据
+        metrics = DailyMetrics(target_records)
+        sorted_dates = metrics.dates
+        daily_summary = {date: metrics.summary(date) for date in sorted_dates}
 
         return {
             "table_id": table_id,
@@ -198,6 +150,19 @@ class MultiTableDataProcessor:
             "daily_summary": daily_summary
         }
 
+    def process_tables(self, table_configs):
+        """并发获取后逐个处理多个表格，配置需包含 table_id、view_id、last_n"""
+        all_records = self.fetch_tables(table_configs)
+        return [
+            self.process_table_data(
+                config['table_id'],
+                config['view_id'],
+                config['last_n'],
+                records=records
+            )
+            for config, records in zip(table_configs, all_records)
+        ]
+
 
 def format_multi_table_data(results, table_configs):
     """格式化多个表格的数据"""
@@ -279,14 +244,7 @@ def test_multi_table_processor():
     ]
 
     # 处理所有表格
-    results = []
-    for config in table_configs:
-        result = processor.process_table_data(
-            config['table_id'],
-            config['view_id'],
-            config['last_n']
-        )
-        results.append(result)
+    results = processor.process_tables(table_configs)
 
     # 格式化输出
     formatted = format_multi_table_data(results, table_configs)
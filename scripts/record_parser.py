@@ -0,0 +1,176 @@
+"""
+多维表格记录解析器
+根据表格字段元数据（get_fields）与项目 fields 别名配置预先确定：
+- 每个指标实际使用哪个字段（别名解析）
+- 字段值的形态（数字 / 公式、查找引用的 {"value": [...]}）
+- 日期时间戳到日期字符串的转换（按时间戳缓存）
+解析大量记录时只剩字段读取和类型转换，不再逐条解析别名、判断类型
+"""
+from datetime import datetime
+
+# 指标 -> 默认字段名（与原 MultiTableDataProcessor.parse_record 一致）
+DEFAULT_ALIASES = {
+    "dau": ("DAU",),
+    "new_users": ("新增",),
+    "income": ("收入(美元)数字",),
+    "paid_users": ("付费用户",),
+}
+
+# 项目配置未指定 aliases 时的候选字段名（按优先级，与原 ConfigurableReportGenerator 一致）
+CONFIG_DEFAULT_ALIASES = {
+    "dau": ("DAU",),
+    "new_users": ("新增", "新增角色"),
+    "income": ("收入(美元)数字", "付费金额"),
+    "paid_users": ("付费用户", "付费人数"),
+}
+
+# 项目配置 fields 中的键 -> 指标
+CONFIG_KEYS = {"dau": "dau", "new_users": "new_users", "revenue": "income", "paid_users": "paid_users"}
+
+DATE_FIELD = "日期"
+GROUP_FIELDS = ("渠道/国家", "分组")
+
+# 飞书字段类型：2 数字，19 查找引用，20 公式
+FIELD_TYPE_NUMBER = 2
+FIELD_TYPE_LOOKUP = 19
+FIELD_TYPE_FORMULA = 20
+
+
+def aliases_from_config(fields_config):
+    """将项目配置中的 fields（含 aliases）转换为 指标 -> 候选字段名"""
+    aliases = dict(CONFIG_DEFAULT_ALIASES)
+    for config_key, metric in CONFIG_KEYS.items():
+        names = (fields_config or {}).get(config_key, {}).get("aliases")
+        if names:
+            aliases[metric] = tuple(names)
+    return aliases
+
+
+def _convert_any(cast, value):
+    """未知形态的字段值：数字直接转换，{"value": [...]} 取第一个值"""
+    if isinstance(value, (int, float)):
+        return cast(value)
+    if isinstance(value, dict) and 'value' in value:
+        val = value['value']
+        return cast(val[0]) if isinstance(val, list) and len(val) > 0 else cast(val)
+    return cast(0)
+
+
+def _value_only_converter(cast):
+    """只接受 {"value": [...]} 形态，其他形态取 0（默认解析器的收入字段）"""
+    def convert(value):
+        if isinstance(value, dict) and 'value' in value:
+            val = value['value']
+            return cast(val[0]) if isinstance(val, list) and len(val) > 0 else cast(val)
+        return cast(0)
+    return convert
+
+
+def _number_converter(cast):
+    def convert(value):
+        if type(value) in (int, float):
+            return cast(value)
+        return _convert_any(cast, value)
+    return convert
+
+
+def _formula_converter(cast):
+    def convert(value):
+        try:
+            val = value['value']
+            if type(val) is list and val:
+                return cast(val[0])
+        except (TypeError, KeyError, ValueError):
+            pass
+        return _convert_any(cast, value)
+    return convert
+
+
+def _any_converter(cast):
+    def convert(value):
+        return _convert_any(cast, value)
+    return convert
+
+
+def _converter_for(field_type, cast):
+    if field_type == FIELD_TYPE_NUMBER:
+        return _number_converter(cast)
+    if field_type in (FIELD_TYPE_FORMULA, FIELD_TYPE_LOOKUP):
+        return _formula_converter(cast)
+    return _any_converter(cast)
+
+
+class RecordParser:
+    """按表格字段结构编译出的记录解析器"""
+
+    _CASTS = {"dau": int, "new_users": int, "income": float, "paid_users": int}
+
+    def __init__(self, fields=None, aliases=None):
+        """
+        fields: get_fields 返回的字段列表（data.items），为空时按别名逐条回退解析
+        aliases: 指标 -> 候选字段名；不传时使用 DEFAULT_ALIASES，且收入字段与原解析一致，
+                 只接受公式/查找引用的 {"value": [...]} 形态，数字形态记为 0
+        """
+        value_only_income = aliases is None
+        aliases = aliases or DEFAULT_ALIASES
+        types = {f.get("field_name"): f.get("type") for f in (fields or [])}
+
+        # 每个指标：[(字段名, 转换函数), ...]，通常只剩一个候选
+        self._metrics = []
+        for metric, cast in self._CASTS.items():
+            names = aliases.get(metric) or DEFAULT_ALIASES[metric]
+            if metric == "income" and value_only_income:
+                candidates = [(name, _value_only_converter(cast)) for name in names]
+            else:
+                present = [name for name in names if name in types]
+                candidates = [(name, _converter_for(types[name], cast)) for name in present] or \
+                    [(name, _any_converter(cast)) for name in names]
+            self._metrics.append((metric, tuple(candidates), cast(0)))
+
+        present_groups = [name for name in GROUP_FIELDS if name in types]
+        self._group_fields = tuple(present_groups or GROUP_FIELDS)
+        self._dates = {}
+
+    def _date_str(self, timestamp):
+        date_str = self._dates.get(timestamp)
+        if date_str is None:
+            date_str = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d')
+            self._dates[timestamp] = date_str
+        return date_str
+
+    def _group(self, fields_data):
+        group_value = None
+        for name in self._group_fields:
+            group_value = fields_data.get(name)
+            if group_value:
+                break
+        if isinstance(group_value, list) and len(group_value) > 0:
+            first = group_value[0]
+            return first.get('text', 'Total') if isinstance(first, dict) else str(first)
+        return 'Total'
+
+    def parse(self, record):
+        """解析单条记录，日期缺失时返回 None"""
+        fields_data = record.get("fields", {})
+
+        date_value = fields_data.get(DATE_FIELD)
+        if not isinstance(date_value, (int, float)):
+            return None
+
+        parsed = {"date": self._date_str(date_value), "group": self._group(fields_data)}
+        for metric, candidates, default in self._metrics:
+            value = default
+            for name, convert in candidates:
+                raw = fields_data.get(name)
+                if raw is not None:
+                    value = convert(raw)
+                    break
+            parsed[metric] = value
+        return parsed
+
+    def parse_many(self, records):
+        """批量解析，跳过无效记录"""
+        parse = self.parse
+        return [parsed for parsed in map(parse, records) if parsed is not None]
+
+    __call__ = parse
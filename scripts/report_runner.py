@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+日报任务执行器
+每个项目的日报在独立子进程中执行，由有界线程池限制并发：
+- 子进程由预先导入 ConfigurableReportGenerator 的 forkserver 派生，不必每次重新导入 langchain 等依赖
+- 超时的任务直接终止子进程并释放工作线程，不会占满线程池
+- 单个项目失败或超时不影响其他项目
+"""
+
+import sys
+import os
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+scripts_dir = os.path.join(project_root, "scripts")
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+sys.path.insert(0, scripts_dir)
+
+logger = logging.getLogger(__name__)
+
+# 同时执行的项目数上限
+REPORT_MAX_WORKERS = int(os.getenv("REPORT_MAX_WORKERS", "4"))
+# 单个项目日报的超时时间（秒）
+REPORT_JOB_TIMEOUT = float(os.getenv("REPORT_JOB_TIMEOUT", "600"))
+# 超时后等待子进程响应 SIGTERM 的时间（秒），之后强制 kill
+REPORT_TERMINATE_GRACE = float(os.getenv("REPORT_TERMINATE_GRACE", "5"))
+
+
+def _mp_context():
+    """优先使用预加载生成器模块的 forkserver（避免在多线程进程中直接 fork），不支持时退回 spawn"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["generate_report"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _run_report_process(config_file, dry_run):
+    """子进程入口：退出码 0 表示报告生成（并发送）成功"""
+    from generate_report import ConfigurableReportGenerator
+    success = ConfigurableReportGenerator(config_file).generate_and_send(dry_run=dry_run)
+    sys.exit(0 if success else 1)
+
+
+@dataclass
+class ReportJobResult:
+    config_file: str
+    success: bool = field(default=False)
+    error: str = field(default_factory=str)
+    elapsed: float = field(default=0.0)  # 耗时，单位秒
+
+
+@dataclass
+class _ReportJob:
+    config_file: str
+    future: Future | None = field(default=None)
+    process: multiprocessing.process.BaseProcess | None = field(default=None)
+    started: threading.Event = field(default_factory=threading.Event)
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = field(default=None)
+    finished_at: float | None = field(default=None)
+
+
+class ReportJobRunner:
+    """日报任务执行器（子进程执行、有界并发、超时终止）"""
+
+    def __init__(self, max_workers=REPORT_MAX_WORKERS, timeout=REPORT_JOB_TIMEOUT, dry_run=False):
+        self.timeout = timeout
+        self.dry_run = dry_run
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._context = _mp_context()
+
+    def _stop_process(self, process):
+        process.terminate()
+        process.join(REPORT_TERMINATE_GRACE)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _run_job(self, job):
+        job.started_at = time.time()
+        job.started.set()
+        try:
+            process = self._context.Process(
+                target=_run_report_process,
+                args=(job.config_file, self.dry_run),
+                name=f"report-{os.path.basename(job.config_file)}",
+            )
+            job.process = process
+            process.start()
+            process.join(self.timeout)
+            if process.is_alive():
+                # 超时：终止子进程，工作线程随即可以执行下一个任务
+                self._stop_process(process)
+                raise FutureTimeoutError()
+            return process.exitcode == 0
+        finally:
+            job.finished_at = time.time()
+
+    def submit(self, config_file):
+        """提交一个项目的日报任务，返回 _ReportJob"""
+        job = _ReportJob(config_file=config_file)
+        job.future = self._executor.submit(self._run_job, job)
+        return job
+
+    def wait(self, job):
+        """等待任务结束；超时由执行任务的工作线程从子进程启动时开始计算并终止子进程"""
+        result = ReportJobResult(config_file=job.config_file)
+        try:
+            result.success = bool(job.future.result())
+            if not result.success:
+                exitcode = job.process.exitcode if job.process is not None else None
+                result.error = f"报告生成或发送失败（退出码 {exitcode}）"
+        except FutureTimeoutError:
+            result.error = f"执行超时（超过 {self.timeout:g} 秒），已终止"
+        except Exception as e:
+            logger.error(f"❌ {job.config_file} 日报任务执行异常: {str(e)}", exc_info=True)
+            result.error = str(e)
+        result.elapsed = (job.finished_at or time.time()) - (job.started_at or job.submitted_at)
+        return result
+
+    def run_one(self, config_file):
+        """执行单个项目的日报并等待结果"""
+        return self.wait(self.submit(config_file))
+
+    def run_batch(self, config_files):
+        """并发执行一批项目的日报，按输入顺序返回 ReportJobResult 列表"""
+        jobs = [self.submit(config_file) for config_file in config_files]
+        return [self.wait(job) for job in jobs]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        if not wait:
+            # 不等待时终止仍在运行的子进程，避免退出后遗留孤儿进程
+            for process in self._context.active_children():
+                self._stop_process(process)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_report_runner():
+    """获取进程级共享的日报任务执行器"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = ReportJobRunner()
+    return _runner
+
+
+def main():
+    """主函数：在一个进程内执行多个项目的日报"""
+    parser = argparse.ArgumentParser(description="批量生成数据分析报告")
+    parser.add_argument("--config", action="append", required=True, help="配置文件路径，可重复指定")
+    parser.add_argument("--dry-run", action="store_true", help="只生成报告，不发送到飞书")
+    parser.add_argument("--workers", type=int, default=REPORT_MAX_WORKERS, help="并发执行的项目数")
+    parser.add_argument("--timeout", type=float, default=REPORT_JOB_TIMEOUT, help="单个项目超时时间（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    runner = ReportJobRunner(max_workers=args.workers, timeout=args.timeout, dry_run=args.dry_run)
+    try:
+        results = runner.run_batch(args.config)
+    finally:
+        runner.shutdown(wait=False)
+
+    for result in results:
+        if result.success:
+            logger.info(f"✅ {result.config_file} 日报任务执行成功，耗时 {result.elapsed:.1f}s")
+        else:
+            logger.error(f"❌ {result.config_file} 日报任务执行失败: {result.error}")
+
+    sys.exit(0 if all(r.success for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,18 +22,13 @@ echo "========================================" >> "$LOG_FILE"
 # 进入项目目录
 cd "$PROJECT_ROOT" || exit 1
 
-# 执行顺序：二重螺旋-海外 -> Pocket-小程序 -> SGame-小程序
+# 在同一个进程内并发执行：二重螺旋-海外、Pocket-小程序、SGame-小程序
 echo "" >> "$LOG_FILE"
-echo "【1/3】生成二重螺旋-海外日报..." >> "$LOG_FILE"
-python scripts/generate_report.py --config scripts/projects/project_ershong.json >> "$LOG_FILE" 2>&1
-
-echo "" >> "$LOG_FILE"
-echo "【2/3】生成 Pocket-小程序日报..." >> "$LOG_FILE"
-python scripts/generate_report.py --config scripts/projects/project_pocket.json >> "$LOG_FILE" 2>&1
-
-echo "" >> "$LOG_FILE"
-echo "【3/3】生成 SGame-小程序日报..." >> "$LOG_FILE"
-python scripts/generate_report.py --config scripts/projects/project_sgame.json >> "$LOG_FILE" 2>&1
+echo "生成二重螺旋-海外、Pocket-小程序、SGame-小程序日报..." >> "$LOG_FILE"
+python scripts/report_runner.py \
+    --config scripts/projects/project_ershong.json \
+    --config scripts/projects/project_pocket.json \
+    --config scripts/projects/project_sgame.json >> "$LOG_FILE" 2>&1
 
 # 记录结束时间
 echo "" >> "$LOG_FILE"
@@ -0,0 +1,180 @@
+"""
+多维表格本地快照缓存
+按 app_token/table_id/view_id 将记录保存在本地 SQLite 中，后续同步只拉取日期水位线附近的新记录：
+- 首次同步、字段结构变化或距上次全量同步超过最长间隔时全量拉取（远端在回看区间之外删除/修改的记录由此纠正）
+- 之后只拉取 日期 晚于（水位线 - 回看天数）或 日期 为空的记录并覆盖本地对应区间，兼顾前几天数据被修正的情况
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 缓存文件路径
+BITABLE_CACHE_PATH = os.getenv("BITABLE_CACHE_PATH", os.path.join(project_root, "cache", "bitable_cache.sqlite3"))
+# 增量同步时重新拉取的天数（覆盖回填/修正的数据）
+BITABLE_CACHE_LOOKBACK_DAYS = int(os.getenv("BITABLE_CACHE_LOOKBACK_DAYS", "3"))
+# 两次全量同步的最长间隔（小时），0 表示每次都全量同步
+BITABLE_CACHE_FULL_SYNC_HOURS = float(os.getenv("BITABLE_CACHE_FULL_SYNC_HOURS", "24"))
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    key TEXT PRIMARY KEY,
+    schema_hash TEXT NOT NULL,
+    watermark INTEGER,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    date INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (key, record_id)
+);
+CREATE INDEX IF NOT EXISTS idx_records_key_date ON records (key, date);
+"""
+
+
+class BitableSnapshotCache:
+    """多维表格记录的本地快照缓存（增量同步）"""
+
+    def __init__(self, path=BITABLE_CACHE_PATH, date_field="日期", lookback_days=BITABLE_CACHE_LOOKBACK_DAYS,
+                 full_sync_hours=BITABLE_CACHE_FULL_SYNC_HOURS):
+        self.path = path
+        self.date_field = date_field
+        self.lookback_days = lookback_days
+        self.full_sync_seconds = full_sync_hours * 60 * 60
+        # 同一张表的同步串行执行，不同表之间互不阻塞
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {name for _, name, *_ in conn.execute("PRAGMA table_info(snapshots)")}
+            if "full_synced_at" not in columns:
+                # 旧版本缓存文件没有该列，按从未全量同步处理
+                conn.execute("ALTER TABLE snapshots ADD COLUMN full_synced_at REAL")
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _key(app_token, table_id, view_id):
+        return f"{app_token}/{table_id}/{view_id or ''}"
+
+    @staticmethod
+    def _schema_hash(fields):
+        """字段名与类型的摘要，变化时触发全量同步"""
+        signature = sorted((f.get("field_name", ""), f.get("type", 0)) for f in fields)
+        return hashlib.sha1(json.dumps(signature, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _record_date(self, record):
+        value = record.get("fields", {}).get(self.date_field)
+        return int(value) if isinstance(value, (int, float)) else None
+
+    def _date_filter(self, since_ms):
+        """日期 晚于 since_ms 或为空的记录（日期为空的记录没有水位线可比较，每次增量同步都重新拉取）"""
+        return {
+            "conjunction": "or",
+            "conditions": [
+                {
+                    "field_name": self.date_field,
+                    "operator": "isGreater",
+                    "value": ["ExactDate", str(since_ms)],
+                },
+                {
+                    "field_name": self.date_field,
+                    "operator": "isEmpty",
+                    "value": [],
+                },
+            ],
+        }
+
+    def sync(self, client, token, app_token, table_id, view_id=None, page_size=500):
+        """同步并返回表格全部记录（按日期倒序），与 search_records 返回的 items 结构一致"""
+        key = self._key(app_token, table_id, view_id)
+        with self._lock_for(key):
+            # 结构变更检测必须读取最新字段，绕过（并刷新）字段结构缓存
+            fields = client.get_fields(token, app_token, table_id, use_cache=False).get("data", {}).get("items", [])
+            schema_hash = self._schema_hash(fields)
+
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT schema_hash, watermark, full_synced_at FROM snapshots WHERE key = ?", (key,)
+                ).fetchone()
+
+            now = time.time()
+            full = (
+                row is None
+                or row[0] != schema_hash
+                or row[1] is None
+                or row[2] is None
+                or now - row[2] >= self.full_sync_seconds
+            )
+            if full:
+                since = None
+                print(f"  [缓存] {key} 全量同步")
+            else:
+                since = row[1] - self.lookback_days * DAY_MS
+                print(f"  [缓存] {key} 增量同步（{self.lookback_days} 天回看）")
+
+            records = list(client.iter_records(
+                token, app_token, table_id,
+                view_id=view_id,
+                # 远端多取一天，保证覆盖本地将要替换的区间
+                filter=self._date_filter(since - DAY_MS) if since is not None else None,
+                page_size=page_size,
+                prefetch=True,
+            ))
+
+            with self._connect() as conn:
+                if full:
+                    conn.execute("DELETE FROM records WHERE key = ?", (key,))
+                else:
+                    conn.execute("DELETE FROM records WHERE key = ? AND (date >= ? OR date IS NULL)", (key, since))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO records (key, record_id, date, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (key, r.get("record_id") or r.get("id", ""), self._record_date(r), json.dumps(r, ensure_ascii=False))
+                        for r in records
+                    ],
+                )
+                watermark = conn.execute("SELECT MAX(date) FROM records WHERE key = ?", (key,)).fetchone()[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (key, schema_hash, watermark, synced_at, full_synced_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, schema_hash, watermark, now, now if full else row[2]),
+                )
+                rows = conn.execute(
+                    "SELECT data FROM records WHERE key = ? ORDER BY date DESC", (key,)
+                ).fetchall()
+
+            print(f"  [缓存] 拉取 {len(records)} 条，本地共 {len(rows)} 条")
+            return [json.loads(data) for (data,) in rows]
+
+    def invalidate(self, app_token, table_id, view_id=None):
+        """删除指定表格的快照，下次同步时全量拉取"""
+        key = self._key(app_token, table_id, view_id)
+        with self._lock_for(key), self._connect() as conn:
+            conn.execute("DELETE FROM records WHERE key = ?", (key,))
+            conn.execute("DELETE FROM snapshots WHERE key = ?", (key,))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+测试脚本：本地快照缓存的增量同步不遗留过期记录
+用内存中的假客户端模拟多维表格，覆盖回看区间之外的修改/删除、日期为空记录的修改/删除
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from table_cache import BitableSnapshotCache, DAY_MS
+
+BASE_MS = 1_700_000_000_000
+
+
+class FakeBitableClient:
+    """只实现 BitableSnapshotCache 用到的 get_fields / iter_records，按 filter 条件在内存中筛选"""
+
+    def __init__(self, records):
+        # record_id -> fields
+        self.records = dict(records)
+        self.requests = []
+
+    def get_fields(self, token, app_token, table_id, use_cache=True):
+        return {"data": {"items": [{"field_name": "日期", "type": 5}, {"field_name": "DAU", "type": 2}]}}
+
+    def iter_records(self, token, app_token, table_id, view_id=None, filter=None, page_size=500, prefetch=False):
+        self.requests.append(filter)
+        for record_id, fields in self.records.items():
+            if filter is None or self._match(filter, fields):
+                yield {"record_id": record_id, "fields": dict(fields)}
+
+    @staticmethod
+    def _match(filter, fields):
+        results = []
+        for cond in filter["conditions"]:
+            value = fields.get(cond["field_name"])
+            if cond["operator"] == "isEmpty":
+                results.append(value is None)
+            elif cond["operator"] == "isGreater":
+                results.append(value is not None and value > int(cond["value"][1]))
+        return any(results) if filter["conjunction"] == "or" else all(results)
+
+
+def _sync(cache, client):
+    return {r["record_id"]: r["fields"] for r in cache.sync(client, "token", "app", "tbl")}
+
+
+def _new_cache(tmpdir, **kwargs):
+    return BitableSnapshotCache(path=os.path.join(tmpdir, "cache.sqlite3"), lookback_days=3, **kwargs)
+
+
+def test_incremental_refreshes_empty_date_records():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        client = FakeBitableClient({
+            "old": {"日期": BASE_MS - 30 * DAY_MS, "DAU": 1},
+            "new": {"日期": BASE_MS, "DAU": 2},
+            "nodate": {"DAU": 3},
+            "nodate_gone": {"DAU": 4},
+        })
+        cache = _new_cache(tmpdir)
+        _sync(cache, client)
+
+        # 日期为空的记录在远端被修改或删除，随后补填了日期
+        client.records["nodate"]["DAU"] = 30
+        del client.records["nodate_gone"]
+        client.records["filled"] = {"日期": BASE_MS - DAY_MS, "DAU": 5}
+        records = _sync(cache, client)
+
+        assert client.requests[-1] is not None, "第二次同步应为增量同步"
+        assert records["nodate"]["DAU"] == 30
+        assert "nodate_gone" not in records
+        assert records["filled"]["DAU"] == 5
+        assert records["old"]["DAU"] == 1
+
+
+def test_full_resync_drops_stale_records_outside_lookback():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        client = FakeBitableClient({
+            "old": {"日期": BASE_MS - 30 * DAY_MS, "DAU": 1},
+            "old_gone": {"日期": BASE_MS - 20 * DAY_MS, "DAU": 2},
+            "new": {"日期": BASE_MS, "DAU": 3},
+        })
+        cache = _new_cache(tmpdir)
+        _sync(cache, client)
+
+        # 回看区间之外的修改与删除，增量同步看不到
+        client.records["old"]["DAU"] = 10
+        del client.records["old_gone"]
+        records = _sync(cache, client)
+        assert records["old"]["DAU"] == 1 and "old_gone" in records
+
+        # 超过全量同步间隔后全量拉取，本地快照与远端一致
+        cache.full_sync_seconds = 0
+        records = _sync(cache, client)
+        assert client.requests[-1] is None, "超过最长间隔应全量同步"
+        assert records == {rid: fields for rid, fields in client.records.items()}
+
+
+def test_legacy_cache_file_forces_full_sync():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "cache.sqlite3")
+        # 旧版本缓存文件：snapshots 表没有 full_synced_at 列
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE snapshots (key TEXT PRIMARY KEY, schema_hash TEXT NOT NULL, "
+            "watermark INTEGER, synced_at REAL NOT NULL)"
+        )
+        conn.commit()
+        conn.close()
+
+        client = FakeBitableClient({"new": {"日期": BASE_MS, "DAU": 1}})
+        cache = BitableSnapshotCache(path=path)
+        _sync(cache, client)
+        _sync(cache, client)
+        assert client.requests[0] is None and client.requests[1] is not None
+
+
+def main():
+    for name, case in (
+        ("日期为空的记录在增量同步时刷新", test_incremental_refreshes_empty_date_records),
+        ("回看区间之外的修改/删除由定期全量同步纠正", test_full_resync_drops_stale_records_outside_lookback),
+        ("旧版本缓存文件自动迁移", test_legacy_cache_file_forces_full_sync),
+    ):
+        try:
+            case()
+            print(f"✅ {name}")
+        except AssertionError as e:
+            print(f"❌ {name}: {e}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
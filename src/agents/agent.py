@@ -8,12 +8,16 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import AnyMessage
 from coze_coding_utils.runtime_ctx.context import default_headers
 from storage.memory.memory_saver import get_memory_saver
+from utils.helper.llm_client import get_http_client, get_async_http_client
 
 LLM_CONFIG = "config/agent_llm_config.json"
 
 # 默认保留最近 20 轮对话 (40 条消息)
 MAX_MESSAGES = 40
 
+# 配置文件路径 -> (mtime_ns, 配置)，文件未修改时不再重复读取
+_config_cache: dict = {}
+
 def _windowed_messages(old, new):
     """滑动窗口: 只保留最近 MAX_MESSAGES 条消息"""
     return add_messages(old, new)[-MAX_MESSAGES:]  # type: ignore
@@ -21,13 +25,46 @@ def _windowed_messages(old, new):
 class AgentState(MessagesState):
     messages: Annotated[list[AnyMessage], _windowed_messages]
 
-def build_agent(ctx=None):
-    """构建数据分析 Agent（无工具版本，数据通过参数提供）"""
+def _config_path():
     workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
-    config_path = os.path.join(workspace_path, LLM_CONFIG)
+    return os.path.join(workspace_path, LLM_CONFIG)
+
+def _load_config(config_path):
+    mtime = os.stat(config_path).st_mtime_ns
+    cached = _config_cache.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
     with open(config_path, 'r', encoding='utf-8') as f:
         cfg = json.load(f)
+    _config_cache[config_path] = (mtime, cfg)
+    return cfg
+
+def agent_cache_key():
+    """
+    Agent 实例缓存键：配置文件路径、模型参数、系统提示词与模型服务地址
+    配置文件修改（mtime 变化）后重新读取，参数变化时 graph_helper 重新构建 Agent
+    """
+    config_path = _config_path()
+    cfg = _load_config(config_path)
+    model_cfg = cfg['config']
+    return (
+        config_path,
+        model_cfg.get("model"),
+        model_cfg.get('temperature', 0.7),
+        model_cfg.get('timeout', 600),
+        model_cfg.get('thinking', 'disabled'),
+        cfg.get("sp"),
+        os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY"),
+        os.getenv("COZE_INTEGRATION_MODEL_BASE_URL"),
+    )
+
+def build_agent(ctx=None):
+    """
+    构建数据分析 Agent（无工具版本，数据通过参数提供）
+    ctx 为空时构建可复用的实例，请求级 header 由 utils.helper.llm_client 在发出请求时注入
+    """
+    cfg = _load_config(_config_path())
 
     api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
     base_url = os.getenv("COZE_INTEGRATION_MODEL_BASE_URL")
@@ -44,7 +81,10 @@ def build_agent(ctx=None):
                 "type": cfg['config'].get('thinking', 'disabled')
             }
         },
-        default_headers=default_headers(ctx) if ctx else {}
+        default_headers=default_headers(ctx) if ctx else {},
+        # 进程级共享连接池，Agent 重建后也复用到模型服务的连接
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
     )
 
     # 不传入工具，数据通过参数提供
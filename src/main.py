@@ -5,12 +5,12 @@ import traceback
 import logging
 from typing import Any, Dict, Iterable, AsyncIterable, AsyncGenerator, Optional
 import threading
-import contextvars
-import cozeloop
 import uvicorn
 import time
+import os
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
@@ -18,6 +18,7 @@ from langgraph.graph.state import CompiledStateGraph
 from coze_coding_utils.runtime_ctx.context import new_context, Context
 from utils.helper import graph_helper
 from utils.log.node_log import LOG_FILE
+from utils.log.log_writer import close_log_writers
 from utils.log.write_log import setup_logging, request_context
 from utils.log.config import LOG_LEVEL
 from utils.messages.server import (
@@ -41,25 +42,82 @@ from utils.helper.agent_helper import (
     to_stream_input,
     to_client_message,
     agent_iter_server_messages,
+    agent_aiter_server_messages,
 )
+from utils.helper.producer_pool import producer_pool
+from utils.helper.stream_buffer import StreamBuffer, coalesce_answer_dicts
+from utils.helper.sse import sse_message_event
+from utils.helper.run_registry import run_registry, TaskTable
+from utils.helper.admission import admission, AdmissionRejectedError
+from utils.helper.cancellation import CancelScope, set_current_scope
+from utils.helper.metrics import metrics, record_run_error
 from utils.openai.handler import OpenAIChatHandler
-from utils.log.parser import LangGraphParser
+from utils.log.parser import get_graph_parser
 from utils.log.err_trace import extract_core_stack
-from utils.log.loop_trace import init_run_config, init_agent_config
+from utils.log.loop_trace import init_run_config, init_agent_config, trace_error, schedule_flush, flush_traces
 
 
 # 超时配置常量
 TIMEOUT_SECONDS = 900  # 15分钟
+# 流式接口是否使用 graph.astream 原生异步执行（0 时统一走后台线程 + graph.stream）
+GRAPH_ASYNC_STREAM = os.getenv("GRAPH_ASYNC_STREAM", "1") == "1"
+
+def _stream_error_reporter(run_config: RunnableConfig, ctx: Context, cancelled: Optional[CancelScope] = None):
+    """图执行异常在 agent_helper 中被转换为 message_end，由该回调补充上报追踪与错误指标"""
+    def report(ex: Exception):
+        if cancelled is not None and cancelled.is_set():
+            return
+        trace_error(run_config, ctx, ex)
+        record_run_error(ex)
+    return report
+
 
 class GraphService:
     def __init__(self):
         if not graph_helper.is_agent_proj():
             self.graph = graph_helper.get_graph_instance("graphs.graph")
 
-        # 用于跟踪正在运行的任务（使用asyncio.Task）
-        self.running_tasks: Dict[str, asyncio.Task] = {}
+        # 用于跟踪正在运行的任务（使用asyncio.Task），多 worker 时同步登记到 run_registry
+        self.running_tasks: Dict[str, asyncio.Task] = TaskTable(run_registry)
         # 错误分类器
         self.error_classifier = ErrorClassifier()
+        # 图结构内省结果：出入参 Schema、节点函数出入参、单节点运行图，首次使用或 warm_up 时计算
+        self._inout_schema: Optional[Dict[str, Any]] = None
+        self._node_inout: Optional[Dict[str, Any]] = None
+        self._node_graphs: Dict[str, CompiledStateGraph] = {}
+
+    def warm_up(self):
+        """启动时预计算图的出入参 Schema 与各节点出入参模型，内省接口直接从内存返回"""
+        if graph_helper.is_agent_proj():
+            return
+        self.graph_inout_schema()
+        self._get_node_inout()
+        get_graph_parser(self.graph)
+        logger.info(f"Graph introspection warmed up: {len(self._node_inout)} nodes")
+
+    def _get_node_inout(self) -> Dict[str, Any]:
+        if self._node_inout is None:
+            self._node_inout = graph_helper.get_graph_nodes_with_inout(self.graph.get_graph())
+        return self._node_inout
+
+    def _get_node_graph(self, node_id: str) -> CompiledStateGraph:
+        """单节点运行图：按节点缓存编译结果，节点不存在时抛出 KeyError"""
+        _graph = self._node_graphs.get(node_id)
+        if _graph is not None:
+            return _graph
+
+        node_func, input_cls, output_cls = self._get_node_inout().get(node_id, (None, None, None))
+        if node_func is None or input_cls is None:
+            raise KeyError(f"node_id '{node_id}' not found")
+        metadata = get_graph_parser(self.graph).get_node_metadata(node_id) or {}
+
+        _g = StateGraph(input_cls, input_schema=input_cls, output_schema=output_cls)
+        _g.add_node("sn", node_func, metadata=metadata)
+        _g.set_entry_point("sn")
+        _g.add_edge("sn", END)
+        _graph = _g.compile()
+        self._node_graphs[node_id] = _graph
+        return _graph
 
     
     def _get_graph(self, ctx=Context):
@@ -70,8 +128,8 @@ class GraphService:
     
     
     @staticmethod
-    def _sse_event(data: Any) -> str:
-        return f"event: message\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    def _sse_event(data: Any) -> bytes:
+        return sse_message_event(data)
 
     # 流式运行（原始迭代器）：本地调用使用
     def stream(self, payload: Dict[str, Any], run_config: RunnableConfig, ctx=Context) -> Iterable[Any]:
@@ -89,6 +147,7 @@ class GraphService:
                 local_msg_id=client_msg.local_msg_id,
                 run_id=ctx.run_id,
                 log_id=ctx.logid,
+                on_error=_stream_error_reporter(run_config, ctx),
             )
             for sm in server_msgs_iter:
                 yield sm.dict()
@@ -109,6 +168,8 @@ class GraphService:
         except Exception as ex:
             # 使用错误分类器获取错误码
             err = self.error_classifier.classify(ex, {"node_name": "stream"})
+            trace_error(run_config, ctx, ex)
+            record_run_error(err)
             error_msg = create_message_error_dict(
                 code=str(err.code) if err is not None else "exception",
                 message=str(ex),
@@ -128,6 +189,7 @@ class GraphService:
 
         run_id = ctx.run_id
         logger.info(f"Starting run with run_id: {run_id}")
+        run_config = None
 
         try:
             graph = self._get_graph(ctx)
@@ -145,6 +207,8 @@ class GraphService:
         except Exception as e:
             # 使用错误分类器分类错误
             err = self.error_classifier.classify(e, {"node_name": "run", "run_id": run_id})
+            trace_error(run_config, ctx, e)
+            record_run_error(err)
             # 记录详细的错误信息和堆栈跟踪
             logger.error(
                 f"Error in GraphService.run: [{err.code}] {err.message}\n"
@@ -158,7 +222,7 @@ class GraphService:
             self.running_tasks.pop(run_id, None)
 
     # 流式运行（SSE 格式化）：HTTP 路由使用
-    async def stream_sse(self, payload: Dict[str, Any], ctx=None) -> AsyncGenerator[str, None]:
+    async def stream_sse(self, payload: Dict[str, Any], ctx=None) -> AsyncGenerator[bytes, None]:
         if ctx is None:
             ctx = new_context(method="stream_sse")
 
@@ -176,7 +240,7 @@ class GraphService:
         finally:
             # 清理任务记录
             self.running_tasks.pop(run_id, None)
-            cozeloop.flush()
+            schedule_flush()
 
     # 取消执行 - 使用asyncio的标准方式
     def cancel_run(self, run_id: str, ctx: Optional[Context] = None) -> Dict[str, Any]:
@@ -221,30 +285,29 @@ class GraphService:
         if ctx is None or Context.run_id == "":
             ctx = new_context(method="node_run")
 
-        node_func, input_cls, output_cls = graph_helper.get_graph_node_func_with_inout(self.graph.get_graph(), node_id)
-        if node_func is None or input_cls is None:
-            raise KeyError(f"node_id '{node_id}' not found")
         assert self.graph is not None, "Graph is not initialized"
-        parser = LangGraphParser(self.graph)
-        metadata = parser.get_node_metadata(node_id) or {}
-
-        _g = StateGraph(input_cls, input_schema=input_cls, output_schema=output_cls)
-        _g.add_node("sn", node_func, metadata=metadata)
-        _g.set_entry_point("sn")
-        _g.add_edge("sn", END)
-        _graph = _g.compile()
+        _graph = self._get_node_graph(node_id)
 
         run_config = init_run_config(_graph, ctx)
-        return await _graph.ainvoke(payload, config=run_config)
+        try:
+            return await _graph.ainvoke(payload, config=run_config)
+        except Exception as e:
+            trace_error(run_config, ctx, e, name=node_id)
+            record_run_error(e)
+            raise
 
     # 获取工作流的出入参Schema
     def graph_inout_schema(self) -> Any:
         if graph_helper.is_agent_proj():
             return {"input_schema": {}, "output_schema": {}}
-        _graph_input = self.graph.get_input_schema()
-        _graph_output = self.graph.get_output_schema()
-
-        return {"input_schema": _graph_input.model_json_schema(), "output_schema": _graph_output.model_json_schema()}
+        if self._inout_schema is None:
+            _graph_input = self.graph.get_input_schema()
+            _graph_output = self.graph.get_output_schema()
+            self._inout_schema = {
+                "input_schema": _graph_input.model_json_schema(),
+                "output_schema": _graph_output.model_json_schema(),
+            }
+        return self._inout_schema
 
     async def astream(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
         client_msg, session_id = to_client_message(payload)
@@ -252,13 +315,147 @@ class GraphService:
         run_config["configurable"] = {"thread_id": session_id}
         stream_input = to_stream_input(client_msg)
 
-        # 使用后台线程拉取同步流，并通过事件循环安全地推送到异步队列
+        # 优先在事件循环上直接驱动 graph.astream，只有同步图才回退到后台线程
+        if GRAPH_ASYNC_STREAM and hasattr(graph, "astream"):
+            source = self._astream_native(graph, stream_input, client_msg, run_config, ctx)
+        else:
+            source = self._astream_threaded(graph, stream_input, client_msg, run_config, ctx)
+        async with aclosing(source):
+            async for item in source:
+                yield item
+
+    async def _astream_native(self, graph, stream_input, client_msg, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        # 图在同一事件循环的 producer 任务上执行，经有界缓冲推送给消费方（积压到高水位时挂起 producer）
         loop = asyncio.get_running_loop()
-        q: asyncio.Queue = asyncio.Queue()
-        context = contextvars.copy_context()
+        buffer = StreamBuffer(loop)
+        start_time = time.time()
+        # 超时定时器触发后置位，producer 据此把任务取消识别为超时
+        timed_out = False
+        # 图执行已结束、producer 正在发送结束消息，此时不再取消
+        finishing = False
+        # 图内节点可能在子任务中发起模型调用，任务取消未必传递到进行中的请求；
+        # 取消作用域经 contextvar 传给 producer 及其子任务，set() 时关闭进行中的响应连接
+        cancelled = CancelScope()
+
+        def timeout_end_msg(reply_id: str, sequence_id: int) -> Dict[str, Any]:
+            return create_message_end_dict(
+                code="TIMEOUT",
+                message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                log_id=ctx.logid,
+                time_cost_ms=int((time.time() - start_time) * 1000),
+                reply_id=reply_id,
+                sequence_id=sequence_id,
+            )
+
+        async def producer():
+            nonlocal finishing
+            last_seq = 0
+            reply_id = ""
+            set_current_scope(cancelled)
+            try:
+                items = graph.astream(stream_input, stream_mode="messages", config=run_config, context=ctx)
+                server_msgs_iter = agent_aiter_server_messages(
+                    items,
+                    session_id=client_msg.session_id,
+                    query_msg_id=client_msg.local_msg_id,
+                    local_msg_id=client_msg.local_msg_id,
+                    run_id=ctx.run_id,
+                    log_id=ctx.logid,
+                    # 取消/超时中断模型调用引发的异常不是运行失败
+                    on_error=_stream_error_reporter(run_config, ctx, cancelled),
+                )
+                async with aclosing(server_msgs_iter):
+                    async for sm in server_msgs_iter:
+                        if not await buffer.aput(sm.dict()):
+                            # 消费方已退出
+                            return
+                        last_seq = sm.sequence_id
+                        reply_id = getattr(sm, 'reply_id', '')
+            except asyncio.CancelledError:
+                if not timed_out:
+                    raise
+                # 超时定时器取消了 producer 任务，图执行与进行中的模型调用已随之中断
+                logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                await buffer.aput(timeout_end_msg(reply_id, last_seq + 1))
+            except Exception as ex:
+                finishing = True
+                if timed_out:
+                    # 超时关闭连接导致的模型调用异常先于任务取消到达
+                    logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                    await buffer.aput(timeout_end_msg(reply_id, last_seq + 1))
+                    return
+                # 使用错误分类器获取错误码
+                err = classify_error(ex, {"node_name": "astream"})
+                trace_error(run_config, ctx, ex)
+                record_run_error(err)
+                await buffer.aput(create_message_end_dict(
+                    code=str(err.code),
+                    message=err.message,
+                    session_id=client_msg.session_id,
+                    query_msg_id=client_msg.local_msg_id,
+                    log_id=ctx.logid,
+                    time_cost_ms=int((time.time() - start_time) * 1000),
+                    reply_id="",
+                    sequence_id=last_seq + 1,
+                ))
+            finally:
+                finishing = True
+                await buffer.aput(None)
+
+        producer_task = asyncio.create_task(producer())
+
+        def on_timeout():
+            nonlocal timed_out
+            if not finishing and not producer_task.done():
+                timed_out = True
+                cancelled.set()
+                producer_task.cancel()
+
+        # 墙钟超时：不必等到下一条消息，模型长时间无输出时也能按时中断
+        timeout_timer = loop.call_later(TIMEOUT_SECONDS, on_timeout)
+        try:
+            while True:
+                # 一次取走全部积压消息，客户端读取较慢时合并连续的 answer 增量
+                batch = await buffer.get_batch()
+                done = batch[-1] is None
+                if done:
+                    batch.pop()
+                for item in coalesce_answer_dicts(batch):
+                    yield item
+                if done:
+                    break
+        except asyncio.CancelledError:
+            # 取消作用在消费方任务上，由 finally 取消图执行所在的 producer 任务
+            logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
+            raise
+        finally:
+            timeout_timer.cancel()
+            buffer.close()
+            if not producer_task.done():
+                cancelled.set()
+                producer_task.cancel()
+            await asyncio.gather(producer_task, return_exceptions=True)
+
+    async def _astream_threaded(self, graph, stream_input, client_msg, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        # 使用后台线程拉取同步流，通过有界缓冲推送给事件循环（积压到高水位时暂停 producer）
+        buffer = StreamBuffer(asyncio.get_running_loop())
         start_time = time.time()
-        # 取消标志，用于通知 producer 线程停止
-        cancelled = threading.Event()
+        # 取消标志，用于通知 producer 线程停止，同时中断进行中的模型调用
+        cancelled = CancelScope()
+
+        def timeout_end_msg(reply_id: str, sequence_id: int) -> Dict[str, Any]:
+            return create_message_end_dict(
+                code="TIMEOUT",
+                message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                log_id=ctx.logid,
+                time_cost_ms=int((time.time() - start_time) * 1000),
+                reply_id=reply_id,
+                sequence_id=sequence_id,
+            )
 
         def producer():
             last_seq = 0
@@ -276,8 +473,15 @@ class GraphService:
                     local_msg_id=client_msg.local_msg_id,
                     run_id=ctx.run_id,
                     log_id=ctx.logid,
+                    # 取消/超时中断模型调用引发的异常不是运行失败
+                    on_error=_stream_error_reporter(run_config, ctx, cancelled),
                 )
                 for sm in server_msgs_iter:
+                    # 主动检查执行时间，及时中断
+                    if time.time() - start_time > TIMEOUT_SECONDS:
+                        logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                        buffer.put(timeout_end_msg(getattr(sm, 'reply_id', ''), last_seq + 1))
+                        return
                     # 检查是否已取消
                     if cancelled.is_set():
                         logger.info(f"Producer cancelled during iteration for run_id: {ctx.run_id}")
@@ -292,33 +496,26 @@ class GraphService:
                             reply_id=getattr(sm, 'reply_id', ''),
                             sequence_id=last_seq + 1,
                         )
-                        loop.call_soon_threadsafe(q.put_nowait, cancel_msg)
+                        buffer.put(cancel_msg)
                         return
-
-                    # 主动检查执行时间，及时中断
-                    if time.time() - start_time > TIMEOUT_SECONDS:
-                        logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
-                        timeout_msg = create_message_end_dict(
-                            code="TIMEOUT",
-                            message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
-                            session_id=client_msg.session_id,
-                            query_msg_id=client_msg.local_msg_id,
-                            log_id=ctx.logid,
-                            time_cost_ms=int((time.time() - start_time) * 1000),
-                            reply_id=getattr(sm, 'reply_id', ''),
-                            sequence_id=last_seq + 1,
-                        )
-                        loop.call_soon_threadsafe(q.put_nowait, timeout_msg)
+                    if not buffer.put(sm.dict()):
+                        # 消费方已退出
                         return
-                    loop.call_soon_threadsafe(q.put_nowait, sm.dict())
                     last_seq = sm.sequence_id
             except Exception as ex:
                 # 如果已取消，不再发送错误消息
                 if cancelled.is_set():
+                    if time.time() - start_time > TIMEOUT_SECONDS:
+                        # 超时定时器中断了模型调用
+                        logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                        buffer.put(timeout_end_msg("", last_seq + 1))
+                        return
                     logger.info(f"Producer exception after cancel for run_id: {ctx.run_id}, ignoring: {ex}")
                     return
                 # 使用错误分类器获取错误码
                 err = classify_error(ex, {"node_name": "astream"})
+                trace_error(run_config, ctx, ex)
+                record_run_error(err)
                 end_msg = create_message_end_dict(
                     code=str(err.code),
                     message=err.message,
@@ -329,27 +526,68 @@ class GraphService:
                     reply_id="",
                     sequence_id=last_seq + 1,
                 )
-                loop.call_soon_threadsafe(q.put_nowait, end_msg)
+                buffer.put(end_msg)
             finally:
-                loop.call_soon_threadsafe(q.put_nowait, None)
+                buffer.put(None)
 
-        threading.Thread(target=lambda: context.run(producer), daemon=True).start()
+        # 共享有界线程池执行 producer，已满时抛出 ProducerPoolFullError
+        producer_pool.submit(producer, cancelled=cancelled)
+        # 超时后直接中断模型调用，不必等到下一条消息
+        timeout_timer = asyncio.get_running_loop().call_later(TIMEOUT_SECONDS, cancelled.set)
 
         try:
             while True:
-                item = await q.get()
-                if item is None:
+                # 一次取走全部积压消息，客户端读取较慢时合并连续的 answer 增量
+                batch = await buffer.get_batch()
+                done = batch[-1] is None
+                if done:
+                    batch.pop()
+                for item in coalesce_answer_dicts(batch):
+                    yield item
+                if done:
                     break
-                yield item
         except asyncio.CancelledError:
             logger.info(f"Stream cancelled for run_id: {ctx.run_id}, signaling producer to stop")
-            # 设置取消标志，通知 producer 线程停止
-            cancelled.set()
             raise
+        finally:
+            # 设置取消标志，通知 producer 线程停止（含客户端断开导致的生成器关闭）
+            timeout_timer.cancel()
+            cancelled.set()
+            buffer.close()
 
 
 service = GraphService()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # 预计算图内省结果，失败时退化为首次请求时计算
+    try:
+        service.warm_up()
+    except Exception as e:
+        logger.warning(f"Graph introspection warm-up failed: {e}")
+    # 多 worker 模式：监听控制套接字，接收其他 worker 转发的取消请求
+    await run_registry.start(service.cancel_run)
+    try:
+        yield
+    finally:
+        await run_registry.stop()
+        # 排空节点日志队列与追踪数据
+        await asyncio.to_thread(close_log_writers)
+        await asyncio.to_thread(flush_traces)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _admission_rejected(e: AdmissionRejectedError) -> JSONResponse:
+    """并发已达上限：429 + Retry-After"""
+    return JSONResponse(
+        status_code=429,
+        content={"error_code": e.code, "error_message": e.message},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 
 # OpenAI 兼容接口处理器
 openai_handler = OpenAIChatHandler(service)
@@ -377,6 +615,12 @@ async def http_run(request: Request) -> Dict[str, Any]:
         f"body={body_text}"
     )
 
+    try:
+        ticket = await admission.acquire("run", ctx.project_id)
+    except AdmissionRejectedError as e:
+        logger.warning(f"Rejected /run request run_id={run_id}: {e.message}")
+        return _admission_rejected(e)
+
     try:
         payload = await request.json()
 
@@ -429,7 +673,8 @@ async def http_run(request: Request) -> Dict[str, Any]:
             }
         )
     finally:
-        cozeloop.flush()
+        ticket.release()
+        schedule_flush()
 
 
 @app.post("/stream_run")
@@ -505,9 +750,15 @@ async def http_stream_run(request: Request):
             )
             yield service._sse_event(error_msg)
 
-    # 注意：StreamingResponse会在后台运行generator
+    try:
+        ticket = await admission.acquire("stream_run", ctx.project_id)
+    except AdmissionRejectedError as e:
+        logger.warning(f"Rejected /stream_run request run_id={run_id}: {e.message}")
+        return _admission_rejected(e)
+
+    # 注意：StreamingResponse会在后台运行generator，名额在流结束后释放
     response = StreamingResponse(cancellable_stream(), media_type="text/event-stream")
-    return response
+    return admission.hold_until_done(response, ticket)
 
 @app.post("/cancel/{run_id}")
 async def http_cancel(run_id: str, request: Request):
@@ -521,6 +772,11 @@ async def http_cancel(run_id: str, request: Request):
     request_context.set(ctx)
     logger.info(f"Received cancel request for run_id: {run_id}")
     result = service.cancel_run(run_id, ctx)
+    if result["status"] == "not_found":
+        # 多 worker 模式下任务可能属于其他 worker
+        forwarded = await run_registry.forward_cancel(run_id)
+        if forwarded is not None:
+            result = forwarded
     return result
 
 
@@ -545,6 +801,11 @@ async def http_node_run(node_id: str, request: Request):
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error in http_node_run: {e}, traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=400, detail=f"Invalid JSON format:{extract_core_stack()}")
+    try:
+        ticket = await admission.acquire("node_run", ctx.project_id)
+    except AdmissionRejectedError as e:
+        logger.warning(f"Rejected /node_run/{node_id} request: {e.message}")
+        return _admission_rejected(e)
     try:
         return await service.run_node(node_id, payload, ctx)
     except KeyError:
@@ -566,7 +827,8 @@ async def http_node_run(node_id: str, request: Request):
             }
         )
     finally:
-        cozeloop.flush()
+        ticket.release()
+        schedule_flush()
 
 
 @app.post("/v1/chat/completions")
@@ -579,12 +841,25 @@ async def openai_chat_completions(request: Request):
 
     try:
         payload = await request.json()
-        return await openai_handler.handle(payload, ctx)
+
+        try:
+            ticket = await admission.acquire("openai_chat", ctx.project_id)
+        except AdmissionRejectedError as e:
+            logger.warning(f"Rejected /v1/chat/completions request run_id={ctx.run_id}: {e.message}")
+            return openai_handler.overloaded_response(e.message, str(e.code), e.retry_after)
+
+        try:
+            response = await openai_handler.handle(payload, ctx)
+        except BaseException:
+            ticket.release()
+            raise
+        # 流式响应在流结束后释放名额
+        return admission.hold_until_done(response, ticket)
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error in openai_chat_completions: {e}")
         raise HTTPException(status_code=400, detail="Invalid JSON format")
     finally:
-        cozeloop.flush()
+        schedule_flush()
 
 
 @app.get("/health")
@@ -594,11 +869,19 @@ async def health_check():
         return {
             "status": "ok",
             "message": "Service is running",
+            "producer_pool": producer_pool.stats(),
+            "admission": admission.stats(),
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@app.get("/metrics")
+async def http_metrics():
+    """Prometheus 文本格式指标（本 worker 进程）"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get(path="/graph_parameter")
 async def http_graph_inout_parameter(request: Request):
     return service.graph_inout_schema()
@@ -608,6 +891,7 @@ def parse_args():
     parser.add_argument("-m", type=str, default="http", help="Run mode, support http,flow,node")
     parser.add_argument("-n", type=str, default="", help="Node ID for single node run")
     parser.add_argument("-p", type=int, default=5000, help="HTTP server port")
+    parser.add_argument("-w", type=int, default=int(os.getenv("HTTP_WORKERS", "1")), help="HTTP server worker processes")
     parser.add_argument("-i", type=str, default="", help="Input JSON string for flow/node mode")
     return parser.parse_args()
 
@@ -624,11 +908,15 @@ def parse_input(input_str: str) -> Dict[str, Any]:
         # If not valid JSON, treat as plain text
         return {"text": input_str}
 
-def start_http_server(port):
-    workers = 1
+def start_http_server(port, workers=1):
     reload = False
     if graph_helper.is_dev_env():
         reload = True
+        # reload 模式只支持单进程
+        workers = 1
+    workers = max(workers, 1)
+    # worker 进程继承该环境变量，据此启用跨 worker 的取消路由
+    os.environ["HTTP_WORKERS"] = str(workers)
 
     logger.info(f"Start HTTP Server, Port: {port}, Workers: {workers}")
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload, workers=workers)
@@ -636,7 +924,7 @@ def start_http_server(port):
 if __name__ == "__main__":
     args = parse_args()
     if args.m == "http":
-        start_http_server(args.p)
+        start_http_server(args.p, args.w)
     elif args.m == "flow":
         payload = parse_input(args.i)
         result = asyncio.run(service.run(payload))
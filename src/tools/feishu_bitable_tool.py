@@ -2,21 +2,52 @@
 飞书多维表格工具
 用于从飞书多维表格获取数据
 """
+import re
 import json
+import asyncio
+import httpx
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from typing import AsyncIterator, Iterator
 from langchain.tools import tool, ToolRuntime
-from coze_workload_identity import Client
+from langchain_core.tools import StructuredTool
 from cozeloop.decorator import observe
+from tools.feishu_credential import get_credential, aget_credential, invalidate_credential
+from tools.feishu_schema_cache import schema_cache
+from tools.feishu_http import (
+    get_http_session,
+    get_async_http_client,
+    retry_delay,
+    MAX_RETRIES,
+    RETRY_STATUS,
+)
 
-client = Client()
+FEISHU_BASE_CREDENTIAL = "integration-feishu-base"
+# access token 无效 / 已过期的错误码，作废缓存的凭证后用新 token 重试一次
+TOKEN_INVALID_CODES = frozenset({99991663, 99991668})
+# 字段不存在（FieldIdNotFound / FieldNameNotFound）：表结构已变更，缓存的字段结构需要失效
+FIELD_NOT_FOUND_CODES = frozenset({1254044, 1254045})
+_TABLE_PATH = re.compile(r"/apps/([^/]+)/tables/([^/]+)")
+
+
+def _invalidate_schema_on_field_error(path: str, resp_data: dict):
+    if resp_data.get("code") in FIELD_NOT_FOUND_CODES:
+        match = _TABLE_PATH.search(path)
+        if match:
+            schema_cache.invalidate(match.group(1), match.group(2))
 
 def get_access_token() -> str:
     """
-    获取飞书多维表格的访问令牌
+    获取飞书多维表格的访问令牌（带缓存）
     """
-    access_token = client.get_integration_credential("integration-feishu-base")
-    return access_token
+    return get_credential(FEISHU_BASE_CREDENTIAL)
+
+async def aget_access_token() -> str:
+    """
+    获取飞书多维表格的访问令牌（带缓存），异步版本
+    """
+    return await aget_credential(FEISHU_BASE_CREDENTIAL)
 
 def require_token(func):
     @wraps(func)
@@ -27,11 +58,45 @@ def require_token(func):
         return func(token, *args, **kwargs)
     return wrapper
 
+# search 接口单页最大记录数
+MAX_PAGE_SIZE = 500
+DEFAULT_BASE_URL = "https://open.larkoffice.com/open-apis"
+
+
+def _search_query(
+    view_id: str | None,
+    field_names: list[str] | None,
+    sort: list | None,
+    filter: dict | str | None,
+    page_size: int | None,
+    page_token: str | None,
+) -> tuple[dict, dict]:
+    """
+    构造 records/search 请求的 query 参数与请求体
+    """
+    params: dict = {}
+    if page_size is not None:
+        params["page_size"] = page_size
+    if page_token:
+        params["page_token"] = page_token
+
+    body: dict = {}
+    if view_id is not None:
+        body["view_id"] = view_id
+    if field_names is not None:
+        body["field_names"] = field_names
+    if sort is not None:
+        body["sort"] = sort
+    if filter is not None:
+        body["filter"] = filter
+    return params, body
+
+
 class FeishuBitableClient:
     """
     飞书多维表格HTTP客户端
     """
-    def __init__(self, base_url: str = "https://open.larkoffice.com/open-apis", timeout: int = 30):
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, timeout: int = 30):
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
 
@@ -41,15 +106,22 @@ class FeishuBitableClient:
             "Content-Type": "application/json; charset=utf-8",
         }
 
-    @observe
-    def _request(self, token: str, method: str, path: str, params: dict | None = None, json_data: dict | None = None) -> dict:
+    def _send(self, token: str, method: str, url: str, params: dict | None, json_data: dict | None) -> dict:
         try:
-            url = f"{self.base_url}{path}"
-            resp = requests.request(method, url, headers=self._headers(token), params=params, json=json_data, timeout=self.timeout)
-            resp_data = resp.json()
+            resp = get_http_session().request(method, url, headers=self._headers(token), params=params, json=json_data, timeout=self.timeout)
+            return resp.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"FeishuBitable API request error: {e}")
+
+    @observe
+    def _request(self, token: str, method: str, path: str, params: dict | None = None, json_data: dict | None = None) -> dict:
+        url = f"{self.base_url}{path}"
+        resp_data = self._send(token, method, url, params, json_data)
+        if resp_data.get("code") in TOKEN_INVALID_CODES:
+            invalidate_credential(FEISHU_BASE_CREDENTIAL, token)
+            resp_data = self._send(get_access_token(), method, url, params, json_data)
         if resp_data.get("code") != 0:
+            _invalidate_schema_on_field_error(path, resp_data)
             raise Exception(f"FeishuBitable API error: {resp_data}")
         return resp_data
 
@@ -63,123 +135,375 @@ class FeishuBitableClient:
         sort: list | None = None,
         filter: dict | str | None = None,
         page_size: int | None = None,
+        page_token: str | None = None,
     ) -> dict:
         """
-        条件查询记录
-        """
-        params: dict = {}
-        if page_size is not None:
-            params["page_size"] = page_size
-        
-        body: dict = {}
-        if view_id is not None:
-            body["view_id"] = view_id
-        if field_names is not None:
-            body["field_names"] = field_names
-        if sort is not None:
-            body["sort"] = sort
-        if filter is not None:
-            body["filter"] = filter
-        
+        条件查询记录（单页）
+        """
+        params, body = _search_query(view_id, field_names, sort, filter, page_size, page_token)
         return self._request(token, "POST", f"/bitable/v1/apps/{app_token}/tables/{table_id}/records/search", params=params, json_data=body)
 
+    def iter_record_pages(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        view_id: str | None = None,
+        field_names: list[str] | None = None,
+        sort: list | None = None,
+        filter: dict | str | None = None,
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: bool = False,
+    ) -> Iterator[list[dict]]:
+        """
+        按 page_token/has_more 逐页查询记录，每次产出一页 items
+
+        prefetch=True 时，拿到当前页后立即在后台线程请求下一页，
+        调用方解析当前页的同时下一页已在网络上，总耗时由请求往返决定。
+        """
+        query = dict(
+            view_id=view_id,
+            field_names=field_names,
+            sort=sort,
+            filter=filter,
+            page_size=min(page_size, MAX_PAGE_SIZE),
+        )
+
+        def fetch(page_token: str | None) -> dict:
+            return self.search_records(token, app_token, table_id, page_token=page_token, **query).get("data", {}) or {}
+
+        if not prefetch:
+            page_token = None
+            while True:
+                data = fetch(page_token)
+                yield data.get("items") or []
+                page_token = data.get("page_token")
+                if not data.get("has_more") or not page_token:
+                    return
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bitable-prefetch")
+        try:
+            future = executor.submit(fetch, None)
+            while future is not None:
+                data = future.result()
+                page_token = data.get("page_token")
+                # 先发出下一页请求，再交出当前页
+                future = executor.submit(fetch, page_token) if data.get("has_more") and page_token else None
+                yield data.get("items") or []
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_records(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        max_records: int | None = None,
+        **kwargs,
+    ) -> Iterator[dict]:
+        """
+        逐条产出记录，自动翻页；参数同 iter_record_pages，max_records 限制最多返回条数
+        """
+        count = 0
+        for items in self.iter_record_pages(token, app_token, table_id, **kwargs):
+            for item in items:
+                if max_records is not None and count >= max_records:
+                    return
+                yield item
+                count += 1
+
     def get_fields(
         self,
         token: str,
         app_token: str,
         table_id: str,
+        use_cache: bool = True,
     ) -> dict:
         """
-        获取数据表字段信息
+        获取数据表字段信息（默认读取共享的字段结构缓存）
         """
-        return self._request(token, "GET", f"/bitable/v1/apps/{app_token}/tables/{table_id}/fields")
+        def load() -> dict:
+            return self._request(token, "GET", f"/bitable/v1/apps/{app_token}/tables/{table_id}/fields")
+
+        if not use_cache:
+            return schema_cache.put(app_token, table_id, load())
+        return schema_cache.get(app_token, table_id, load)
 
 
-@tool
-def get_bitable_data(app_token: str, table_id: str, filter_condition: str = None, sort_field: str = None, page_size: int = 100) -> str:
+class AsyncFeishuBitableClient:
     """
-    从飞书多维表格获取数据
-    
-    Args:
-        app_token: 飞书多维表格的App Token
-        table_id: 数据表的Table ID
-        filter_condition: 筛选条件（可选），格式为JSON字符串，例如：'{"field_name": "status", "operator": "is", "value": "active"}'
-        sort_field: 排序字段（可选），例如："created_time"
-        page_size: 每页获取的记录数，默认100
-    
-    Returns:
-        JSON格式的数据，包含字段信息和记录列表
+    飞书多维表格异步HTTP客户端（httpx），接口与 FeishuBitableClient 一致，
+    供运行在 FastAPI 事件循环上的工具直接 await
+    """
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, timeout: int = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _headers(self, token: str) -> dict:
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json; charset=utf-8",
+        }
+
+    async def _send(self, token: str, method: str, url: str, params: dict | None, json_data: dict | None) -> dict:
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                resp = await get_async_http_client().request(method, url, headers=self._headers(token), params=params, json=json_data, timeout=self.timeout)
+                if resp.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                    break
+                await asyncio.sleep(retry_delay(attempt, resp.headers.get("Retry-After")))
+            return resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise Exception(f"FeishuBitable API request error: {e}")
+
+    @observe
+    async def _request(self, token: str, method: str, path: str, params: dict | None = None, json_data: dict | None = None) -> dict:
+        url = f"{self.base_url}{path}"
+        resp_data = await self._send(token, method, url, params, json_data)
+        if resp_data.get("code") in TOKEN_INVALID_CODES:
+            invalidate_credential(FEISHU_BASE_CREDENTIAL, token)
+            resp_data = await self._send(await aget_access_token(), method, url, params, json_data)
+        if resp_data.get("code") != 0:
+            _invalidate_schema_on_field_error(path, resp_data)
+            raise Exception(f"FeishuBitable API error: {resp_data}")
+        return resp_data
+
+    async def search_records(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        view_id: str | None = None,
+        field_names: list[str] | None = None,
+        sort: list | None = None,
+        filter: dict | str | None = None,
+        page_size: int | None = None,
+        page_token: str | None = None,
+    ) -> dict:
+        """
+        条件查询记录（单页）
+        """
+        params, body = _search_query(view_id, field_names, sort, filter, page_size, page_token)
+        return await self._request(token, "POST", f"/bitable/v1/apps/{app_token}/tables/{table_id}/records/search", params=params, json_data=body)
+
+    async def iter_record_pages(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        view_id: str | None = None,
+        field_names: list[str] | None = None,
+        sort: list | None = None,
+        filter: dict | str | None = None,
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: bool = False,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        按 page_token/has_more 逐页查询记录，每次产出一页 items；
+        prefetch=True 时在交出当前页前先以 Task 发出下一页请求
+        """
+        query = dict(
+            view_id=view_id,
+            field_names=field_names,
+            sort=sort,
+            filter=filter,
+            page_size=min(page_size, MAX_PAGE_SIZE),
+        )
+
+        async def fetch(page_token: str | None) -> dict:
+            resp = await self.search_records(token, app_token, table_id, page_token=page_token, **query)
+            return resp.get("data", {}) or {}
+
+        next_page: asyncio.Task | None = None
+        try:
+            data = await fetch(None)
+            while True:
+                page_token = data.get("page_token")
+                has_more = bool(data.get("has_more") and page_token)
+                if has_more and prefetch:
+                    next_page = asyncio.create_task(fetch(page_token))
+                yield data.get("items") or []
+                if not has_more:
+                    return
+                if next_page is not None:
+                    data, next_page = await next_page, None
+                else:
+                    data = await fetch(page_token)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def iter_records(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        max_records: int | None = None,
+        **kwargs,
+    ) -> AsyncIterator[dict]:
+        """
+        逐条产出记录，自动翻页；参数同 iter_record_pages，max_records 限制最多返回条数
+        """
+        count = 0
+        async for items in self.iter_record_pages(token, app_token, table_id, **kwargs):
+            for item in items:
+                if max_records is not None and count >= max_records:
+                    return
+                yield item
+                count += 1
+
+    async def get_fields(
+        self,
+        token: str,
+        app_token: str,
+        table_id: str,
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        获取数据表字段信息（默认读取共享的字段结构缓存）
+        """
+        async def load() -> dict:
+            return await self._request(token, "GET", f"/bitable/v1/apps/{app_token}/tables/{table_id}/fields")
+
+        if not use_cache:
+            return schema_cache.put(app_token, table_id, await load())
+        return await schema_cache.aget(app_token, table_id, load)
+
+
+def _build_data_query(filter_condition: str | None, sort_field: str | None, page_size: int) -> dict:
+    """
+    构建 get_bitable_data 的查询参数，筛选条件不是合法JSON时抛出 json.JSONDecodeError
     """
-    ctx = None  # 工具不需要上下文
-    
-    feishu_client = FeishuBitableClient()
-    token = get_access_token()
-    
-    # 获取字段信息
-    fields_response = feishu_client.get_fields(token, app_token, table_id)
-    fields_info = fields_response.get("data", {}).get("items", [])
-    
-    # 构建查询参数
     query_params = {}
     if page_size:
         query_params["page_size"] = page_size
-    
+
     if sort_field:
         query_params["sort"] = [{
             "field_name": sort_field,
             "desc": False
         }]
-    
+
     # 如果有筛选条件
     if filter_condition:
-        try:
-            filter_obj = json.loads(filter_condition) if isinstance(filter_condition, str) else filter_condition
-            query_params["filter"] = filter_obj
-        except json.JSONDecodeError:
-            return json.dumps({"error": "Invalid filter condition JSON format"}, ensure_ascii=False)
-    
-    # 搜索记录
-    records_response = feishu_client.search_records(
-        token, app_token, table_id,
-        **query_params
-    )
-    
+        filter_obj = json.loads(filter_condition) if isinstance(filter_condition, str) else filter_condition
+        query_params["filter"] = filter_obj
+    return query_params
+
+
+def _bitable_data_result(fields_response: dict, records_response: dict) -> str:
+    fields_info = fields_response.get("data", {}).get("items", [])
     records = records_response.get("data", {}).get("items", [])
-    
+
     # 构建返回结果
     result = {
         "fields": fields_info,
         "total": len(records),
         "records": records
     }
-    
+
     return json.dumps(result, ensure_ascii=False, indent=2)
 
 
-@tool
-def get_bitable_fields(app_token: str, table_id: str) -> str:
+def _bitable_fields_result(table_id: str, fields_response: dict) -> str:
+    fields_info = fields_response.get("data", {}).get("items", [])
+
+    result = {
+        "table_id": table_id,
+        "field_count": len(fields_info),
+        "fields": fields_info
+    }
+
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+
+def _get_bitable_data(app_token: str, table_id: str, filter_condition: str = None, sort_field: str = None, page_size: int = 100) -> str:
     """
-    获取飞书多维表格的字段结构信息
+    从飞书多维表格获取数据
     
     Args:
         app_token: 飞书多维表格的App Token
         table_id: 数据表的Table ID
+        filter_condition: 筛选条件（可选），格式为JSON字符串，例如：'{"field_name": "status", "operator": "is", "value": "active"}'
+        sort_field: 排序字段（可选），例如："created_time"
+        page_size: 每页获取的记录数，默认100
     
     Returns:
-        JSON格式的字段信息
+        JSON格式的数据，包含字段信息和记录列表
     """
-    ctx = None
-    
+    try:
+        query_params = _build_data_query(filter_condition, sort_field, page_size)
+    except json.JSONDecodeError:
+        return json.dumps({"error": "Invalid filter condition JSON format"}, ensure_ascii=False)
+
     feishu_client = FeishuBitableClient()
     token = get_access_token()
-    
+
     fields_response = feishu_client.get_fields(token, app_token, table_id)
-    fields_info = fields_response.get("data", {}).get("items", [])
+    records_response = feishu_client.search_records(
+        token, app_token, table_id,
+        **query_params
+    )
+    return _bitable_data_result(fields_response, records_response)
+
+
+async def _aget_bitable_data(app_token: str, table_id: str, filter_condition: str = None, sort_field: str = None, page_size: int = 100) -> str:
+    """
+    get_bitable_data 的异步实现：在事件循环上运行，字段与记录并发请求
+    """
+    try:
+        query_params = _build_data_query(filter_condition, sort_field, page_size)
+    except json.JSONDecodeError:
+        return json.dumps({"error": "Invalid filter condition JSON format"}, ensure_ascii=False)
+
+    feishu_client = AsyncFeishuBitableClient()
+    token = await aget_access_token()
+
+    fields_response, records_response = await asyncio.gather(
+        feishu_client.get_fields(token, app_token, table_id),
+        feishu_client.search_records(token, app_token, table_id, **query_params),
+    )
+    return _bitable_data_result(fields_response, records_response)
+
+
+def _get_bitable_fields(app_token: str, table_id: str) -> str:
+    """
+    获取飞书多维表格的字段结构信息
     
-    result = {
-        "table_id": table_id,
-        "field_count": len(fields_info),
-        "fields": fields_info
-    }
+    Args:
+        app_token: 飞书多维表格的App Token
+        table_id: 数据表的Table ID
     
-    return json.dumps(result, ensure_ascii=False, indent=2)
+    Returns:
+        JSON格式的字段信息
+    """
+    feishu_client = FeishuBitableClient()
+    token = get_access_token()
+
+    fields_response = feishu_client.get_fields(token, app_token, table_id)
+    return _bitable_fields_result(table_id, fields_response)
+
+
+async def _aget_bitable_fields(app_token: str, table_id: str) -> str:
+    """
+    get_bitable_fields 的异步实现
+    """
+    feishu_client = AsyncFeishuBitableClient()
+    token = await aget_access_token()
+
+    fields_response = await feishu_client.get_fields(token, app_token, table_id)
+    return _bitable_fields_result(table_id, fields_response)
+
+
+# 同时注册同步与异步实现：graph.stream 走同步，graph.astream/ainvoke 直接在事件循环上 await
+get_bitable_data = StructuredTool.from_function(
+    func=_get_bitable_data,
+    coroutine=_aget_bitable_data,
+    name="get_bitable_data",
+)
+
+get_bitable_fields = StructuredTool.from_function(
+    func=_get_bitable_fields,
+    coroutine=_aget_bitable_fields,
+    name="get_bitable_fields",
+)
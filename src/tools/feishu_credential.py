@@ -0,0 +1,176 @@
+"""
+飞书集成凭证缓存
+get_integration_credential 的结果按名称缓存并记录过期时间
+（优先使用飞书返回的 expire，缺失时按 CREDENTIAL_TTL）：
+- 热路径只是一次 dict 读取
+- 临近过期时在后台线程提前刷新，期间继续返回旧值
+- 缓存缺失/已过期时，并发调用方（线程或协程）共同等待同一个刷新请求
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Tuple, Union
+from coze_workload_identity import Client
+
+logger = logging.getLogger(__name__)
+
+# 凭证未携带 expire 时的缓存有效期（秒），飞书 tenant_access_token 有效期为2小时
+CREDENTIAL_TTL = float(os.getenv("FEISHU_CREDENTIAL_TTL", "3600"))
+# 距离过期多少秒时开始后台刷新
+CREDENTIAL_REFRESH_AHEAD = float(os.getenv("FEISHU_CREDENTIAL_REFRESH_AHEAD", "300"))
+
+
+# loader 返回凭证值，或 (凭证值, 剩余有效秒数)
+CredentialLoader = Callable[[str], Union[str, Tuple[str, float]]]
+
+
+@dataclass(frozen=True)
+class _Credential:
+    value: str
+    refresh_at: float
+    expires_at: float
+
+
+class CredentialCache:
+    """
+    线程安全、协程安全的凭证缓存（single-flight 刷新）
+    """
+
+    def __init__(
+        self,
+        loader: CredentialLoader,
+        ttl: float = CREDENTIAL_TTL,
+        refresh_ahead: float = CREDENTIAL_REFRESH_AHEAD,
+    ):
+        self._loader = loader
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._entries: dict[str, _Credential] = {}
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="credential-refresh")
+
+    def _load(self, name: str) -> str:
+        try:
+            value = self._loader(name)
+            ttl = self._ttl
+            if isinstance(value, tuple):
+                value, expire = value
+                if expire and expire > 0:
+                    ttl = float(expire)
+            if value:
+                now = time.monotonic()
+                self._entries[name] = _Credential(
+                    value=value,
+                    refresh_at=now + ttl - min(self._refresh_ahead, ttl / 2),
+                    expires_at=now + ttl,
+                )
+            return value
+        except Exception as e:
+            logger.warning(f"Failed to refresh credential {name}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+
+    def _refresh(self, name: str) -> Future:
+        """发起刷新；已有刷新在进行时复用同一个 Future"""
+        with self._lock:
+            future = self._inflight.get(name)
+            if future is None:
+                future = self._executor.submit(self._load, name)
+                self._inflight[name] = future
+        return future
+
+    def _lookup(self, name: str) -> str | None:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now < entry.refresh_at:
+            return entry.value
+        if now < entry.expires_at:
+            # 即将过期：后台刷新，本次仍返回旧值
+            self._refresh(name)
+            return entry.value
+        return None
+
+    def get(self, name: str) -> str:
+        value = self._lookup(name)
+        if value is not None:
+            return value
+        return self._refresh(name).result()
+
+    async def aget(self, name: str) -> str:
+        value = self._lookup(name)
+        if value is not None:
+            return value
+        return await asyncio.wrap_future(self._refresh(name))
+
+    def invalidate(self, name: str | None = None, value: str | None = None):
+        """使指定凭证（默认全部）失效，下次读取时重新获取
+
+        传入 value 时只在缓存值仍是该值时失效，避免并发调用方重复作废已刷新的凭证
+        """
+        if name is None:
+            self._entries.clear()
+            return
+        entry = self._entries.get(name)
+        if entry is not None and (value is None or entry.value == value):
+            self._entries.pop(name, None)
+
+
+_client: Client | None = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client()
+    return _client
+
+
+def _load_integration_credential(name: str) -> Union[str, Tuple[str, float]]:
+    credential = _get_client().get_integration_credential(name)
+    # 以飞书 token 接口原始响应形式返回时，取其中的 token 与 expire（秒）
+    if isinstance(credential, str) and credential.startswith("{"):
+        try:
+            data = json.loads(credential)
+        except ValueError:
+            return credential
+        token = data.get("tenant_access_token") or data.get("access_token") if isinstance(data, dict) else None
+        if token and data.get("expire"):
+            return token, float(data["expire"])
+    return credential
+
+
+credential_cache = CredentialCache(_load_integration_credential)
+
+
+def get_credential(name: str) -> str:
+    """
+    获取集成凭证（带缓存）
+    """
+    return credential_cache.get(name)
+
+
+def invalidate_credential(name: str, value: str | None = None):
+    """
+    使缓存的凭证失效（例如接口返回 token 无效时），下次读取时重新获取
+    """
+    credential_cache.invalidate(name, value)
+
+
+async def aget_credential(name: str) -> str:
+    """
+    获取集成凭证（带缓存），供事件循环上的调用方使用
+    """
+    return await credential_cache.aget(name)
@@ -0,0 +1,152 @@
+"""
+飞书HTTP连接池
+多维表格API使用进程级 requests.Session，复用 TCP/TLS 连接，
+并对只读请求（GET 与 records/search POST）的读超时与 429/5xx 做带退避的重试；
+机器人webhook发送不是幂等的，使用单独的会话，只重试请求未发出的连接错误；
+异步调用方（FastAPI 事件循环）使用按事件循环共享的 httpx.AsyncClient
+"""
+import os
+import asyncio
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 每个host的最大连接数（超过时阻塞等待空闲连接）
+POOL_MAXSIZE = int(os.getenv("FEISHU_HTTP_POOL_MAXSIZE", "20"))
+# 缓存连接池的host数量
+POOL_CONNECTIONS = int(os.getenv("FEISHU_HTTP_POOL_CONNECTIONS", "10"))
+# 429/5xx 的最大重试次数与退避系数（秒）
+MAX_RETRIES = int(os.getenv("FEISHU_HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("FEISHU_HTTP_BACKOFF_FACTOR", "0.5"))
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session: requests.Session | None = None
+_webhook_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+# httpx.AsyncClient 绑定创建它的事件循环，按循环各持有一个
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _api_retry() -> Retry:
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        # 该会话只承载多维表格读请求，search 接口虽是 POST 但只读，需要一并重试
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def _webhook_retry() -> Retry:
+    # 消息可能已送达（读超时、5xx），重试会重复发送，只重试连接建立失败
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=False,
+        status=0,
+        other=0,
+        backoff_factor=BACKOFF_FACTOR,
+        raise_on_status=False,
+    )
+
+
+def _build_session(retry: Retry) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+        pool_block=True,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """
+    获取进程级共享的多维表格API会话（keep-alive + 连接池 + 重试）
+    只用于只读请求，非幂等请求请使用 get_webhook_session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(_api_retry())
+    return _session
+
+
+def get_webhook_session() -> requests.Session:
+    """
+    获取进程级共享的机器人webhook会话（keep-alive + 连接池，只重试连接错误）
+    """
+    global _webhook_session
+    if _webhook_session is None:
+        with _session_lock:
+            if _webhook_session is None:
+                _webhook_session = _build_session(_webhook_retry())
+    return _webhook_session
+
+
+def close_http_session():
+    """
+    关闭共享会话，释放连接池
+    """
+    global _session, _webhook_session
+    with _session_lock:
+        for session in (_session, _webhook_session):
+            if session is not None:
+                session.close()
+        _session = None
+        _webhook_session = None
+
+
+def retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    计算第 attempt 次（从0开始）重试前的等待秒数，优先使用 Retry-After
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+    return BACKOFF_FACTOR * (2 ** attempt)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    获取当前事件循环共享的 httpx.AsyncClient（keep-alive + 连接上限）
+    只能在协程内调用
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        limits = httpx.Limits(
+            max_connections=POOL_MAXSIZE * POOL_CONNECTIONS,
+            max_keepalive_connections=POOL_MAXSIZE,
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            transport=httpx.AsyncHTTPTransport(limits=limits, retries=MAX_RETRIES),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_http_client():
+    """
+    关闭当前事件循环的共享 httpx.AsyncClient
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -3,17 +3,19 @@
 用于发送飞书机器人消息
 """
 import json
-import requests
 from langchain.tools import tool, ToolRuntime
-from coze_workload_identity import Client
+from tools.feishu_http import get_webhook_session
+from tools.feishu_credential import get_credential
+
+# webhook 请求超时（秒）
+WEBHOOK_TIMEOUT = 30
 
 
 def get_webhook_url() -> str:
     """
     获取飞书消息的webhook URL
     """
-    client = Client()
-    wechat_bot_credential = client.get_integration_credential("integration-feishu-message")
+    wechat_bot_credential = get_credential("integration-feishu-message")
     webhook_key = json.loads(wechat_bot_credential)["webhook_url"]
     return webhook_key
 
@@ -44,7 +46,7 @@ def send_feishu_text_message(text: str, at_all: bool = False) -> str:
     }
     
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = get_webhook_session().post(webhook_url, json=payload, timeout=WEBHOOK_TIMEOUT)
         result = response.json()
         return json.dumps(result, ensure_ascii=False)
     except Exception as e:
@@ -89,7 +91,7 @@ def send_feishu_rich_text(title: str, content: str) -> str:
     }
     
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = get_webhook_session().post(webhook_url, json=payload, timeout=WEBHOOK_TIMEOUT)
         result = response.json()
         return json.dumps(result, ensure_ascii=False)
     except Exception as e:
@@ -142,7 +144,7 @@ def send_feishu_markdown_message(title: str, markdown_content: str, at_all: bool
     }
     
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = get_webhook_session().post(webhook_url, json=payload, timeout=WEBHOOK_TIMEOUT)
         result = response.json()
         return json.dumps(result, ensure_ascii=False)
     except Exception as e:
@@ -217,7 +219,7 @@ def send_feishu_analysis_report(title: str, analysis_content: str, key_findings:
     }
     
     try:
-        response = requests.post(webhook_url, json=payload)
+        response = get_webhook_session().post(webhook_url, json=payload, timeout=WEBHOOK_TIMEOUT)
         result = response.json()
         return json.dumps(result, ensure_ascii=False)
     except Exception as e:
@@ -0,0 +1,168 @@
+"""
+多维表格字段结构缓存
+get_fields 的结果按 app_token/table_id 缓存（read-through + TTL），供工具与数据处理脚本共用：
+- 内存层：进程内 dict，命中时不发请求
+- 磁盘层（可选）：设置 FEISHU_SCHEMA_CACHE_DIR 后写入 JSON 文件，进程冷启动时也能跳过请求
+字段结构变更后可调用 invalidate 立即失效（接口返回字段不存在时由客户端自动调用）
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# 字段结构缓存有效期（秒）
+SCHEMA_CACHE_TTL = float(os.getenv("FEISHU_SCHEMA_CACHE_TTL", "3600"))
+# 磁盘缓存目录，为空时只使用内存缓存
+SCHEMA_CACHE_DIR = os.getenv("FEISHU_SCHEMA_CACHE_DIR", "")
+
+_SAFE_NAME = re.compile(r"[A-Za-z0-9]+")
+
+
+def _file_part(value: str) -> str:
+    # 正常的 app_token/table_id 只含字母数字，直接作为文件名；其他值取哈希，避免路径穿越
+    if _SAFE_NAME.fullmatch(value):
+        return value
+    return "h" + hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass(frozen=True)
+class _Schema:
+    response: dict
+    fetched_at: float  # 墙钟时间，磁盘缓存跨进程使用
+
+
+class SchemaCache:
+    """
+    线程安全的字段结构缓存，返回值为共享对象，调用方不要修改
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL, cache_dir: str = SCHEMA_CACHE_DIR):
+        self._ttl = ttl
+        self._cache_dir = cache_dir
+        self._entries: dict[tuple[str, str], _Schema] = {}
+        # 同一张表的加载串行执行，避免并发冷启动时重复请求
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        # (事件循环, key) -> 正在进行的异步加载，同一循环内的并发 aget 共享一次请求
+        self._inflight: dict[tuple[asyncio.AbstractEventLoop, tuple[str, str]], asyncio.Task] = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _lock_for(self, key: tuple[str, str]) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _path(self, key: tuple[str, str]) -> str:
+        return os.path.join(self._cache_dir, f"{_file_part(key[0])}__{_file_part(key[1])}.json")
+
+    def _fresh(self, entry: _Schema | None) -> bool:
+        return entry is not None and time.time() - entry.fetched_at < self._ttl
+
+    def _read_disk(self, key: tuple[str, str]) -> _Schema | None:
+        if not self._cache_dir:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return _Schema(response=data["response"], fetched_at=float(data["fetched_at"]))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read schema cache for {'/'.join(key)}: {e}")
+            return None
+
+    def _write_disk(self, key: tuple[str, str], entry: _Schema):
+        if not self._cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": entry.fetched_at, "response": entry.response}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write schema cache for {'/'.join(key)}: {e}")
+
+    def _lookup(self, key: tuple[str, str]) -> dict | None:
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry.response
+        entry = self._read_disk(key)
+        if self._fresh(entry):
+            self._entries[key] = entry
+            return entry.response
+        return None
+
+    def _store(self, key: tuple[str, str], response: dict) -> dict:
+        entry = _Schema(response=response, fetched_at=time.time())
+        self._entries[key] = entry
+        self._write_disk(key, entry)
+        return response
+
+    def put(self, app_token: str, table_id: str, response: dict) -> dict:
+        """写入刚从接口获取的字段结构（绕过缓存读取时用于刷新缓存）"""
+        return self._store((app_token, table_id), response)
+
+    def get(self, app_token: str, table_id: str, loader: Callable[[], dict]) -> dict:
+        """读取字段结构，缓存缺失或过期时调用 loader 加载"""
+        key = (app_token, table_id)
+        response = self._lookup(key)
+        if response is not None:
+            return response
+        with self._lock_for(key):
+            response = self._lookup(key)
+            if response is not None:
+                return response
+            return self._store(key, loader())
+
+    async def aget(self, app_token: str, table_id: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        """读取字段结构（异步），缓存缺失或过期时 await loader() 加载"""
+        key = (app_token, table_id)
+        response = self._lookup(key)
+        if response is not None:
+            return response
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = loop.create_task(self._aload(key, loader))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        # shield：单个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _aload(self, key: tuple[str, str], loader: Callable[[], Awaitable[dict]]) -> dict:
+        response = self._lookup(key)
+        if response is not None:
+            return response
+        return self._store(key, await loader())
+
+    def invalidate(self, app_token: str | None = None, table_id: str | None = None):
+        """使匹配的表格（参数为 None 表示不限）的字段结构失效，下次读取时重新请求"""
+        def matches(key: tuple[str, str]) -> bool:
+            return (app_token is None or key[0] == app_token) and (table_id is None or key[1] == table_id)
+
+        for key in [key for key in list(self._entries) if matches(key)]:
+            self._entries.pop(key, None)
+
+        if not self._cache_dir:
+            return
+        prefix = "" if app_token is None else f"{_file_part(app_token)}__"
+        suffix = ".json" if table_id is None else f"__{_file_part(table_id)}.json"
+        for name in os.listdir(self._cache_dir):
+            if name.startswith(prefix) and name.endswith(suffix):
+                try:
+                    os.remove(os.path.join(self._cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+
+schema_cache = SchemaCache()
@@ -186,6 +186,8 @@ class ErrorCode(IntEnum):
     # 702xxx - 内存/资源错误
     RUNTIME_MEMORY_ERROR = 702001         # 内存错误
     RUNTIME_RECURSION_LIMIT = 702002      # 递归深度超限
+    RUNTIME_OVERLOADED = 702003           # 执行队列已满（服务繁忙）
+    RUNTIME_ADMISSION_REJECTED = 702004   # 并发数已达上限，排队超时或队列已满
 
     # 703xxx - 异步错误
     RUNTIME_ASYNC_NOT_IMPL = 703001       # 异步方法未实现
@@ -325,6 +327,8 @@ ERROR_DESCRIPTIONS: Dict[int, str] = {
     ErrorCode.RUNTIME_CANCELLED: "执行被取消",
     ErrorCode.RUNTIME_MEMORY_ERROR: "内存错误",
     ErrorCode.RUNTIME_RECURSION_LIMIT: "递归深度超限",
+    ErrorCode.RUNTIME_OVERLOADED: "服务繁忙，执行队列已满",
+    ErrorCode.RUNTIME_ADMISSION_REJECTED: "请求并发已达上限，请稍后重试",
     ErrorCode.RUNTIME_ASYNC_NOT_IMPL: "异步方法未实现",
     ErrorCode.RUNTIME_ASYNC_CANCELLED: "异步任务取消",
     ErrorCode.RUNTIME_SUBPROCESS_TIMEOUT: "子进程执行超时",
@@ -0,0 +1,256 @@
+"""
+HTTP 请求准入控制
+每个接口与每个项目各有并发上限，超出上限的请求进入有界 FIFO 队列等待：
+- 队列已满或等待超过 ADMISSION_QUEUE_TIMEOUT 时拒绝，接口返回 429 + Retry-After
+- 流式响应在流结束（或客户端断开）后才释放名额
+- 运行/排队数与累计拒绝数通过 stats() 暴露在 /health，同时作为指标暴露在 /metrics；
+  名额释放时记录接口耗时（graph_http_request_duration_seconds）
+在事件循环内使用，每个 worker 进程独立计数
+"""
+import os
+import time
+import asyncio
+import logging
+import weakref
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.responses import StreamingResponse
+
+from utils.error import ErrorCode, VibeCodingError
+from utils.helper.metrics import metrics, request_duration
+
+logger = logging.getLogger(__name__)
+
+# 各接口的最大并发数（0 表示不限制）
+ADMISSION_LIMITS = {
+    "run": int(os.getenv("ADMISSION_MAX_RUN", "32")),
+    "stream_run": int(os.getenv("ADMISSION_MAX_STREAM_RUN", "64")),
+    "node_run": int(os.getenv("ADMISSION_MAX_NODE_RUN", "32")),
+    "openai_chat": int(os.getenv("ADMISSION_MAX_OPENAI_CHAT", "64")),
+}
+# 单个项目在所有接口上的最大并发数（0 表示不限制）
+ADMISSION_MAX_PER_PROJECT = int(os.getenv("ADMISSION_MAX_PER_PROJECT", "0"))
+# 每个并发上限允许排队的请求数
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# 排队等待的最长时间（秒）
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# 拒绝时建议客户端的重试间隔（秒）
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+
+class AdmissionRejectedError(VibeCodingError):
+    """并发已达上限，且排队已满或等待超时"""
+
+    def __init__(self, gate: str, reason: str, retry_after: int = ADMISSION_RETRY_AFTER):
+        super().__init__(
+            ErrorCode.RUNTIME_ADMISSION_REJECTED,
+            f"请求并发已达上限（{gate}，{reason}），请 {retry_after} 秒后重试",
+        )
+        self.retry_after = retry_after
+
+
+class _Gate:
+    """单个并发上限：running 计数 + FIFO 等待队列，释放时把名额直接交给队首"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, on_idle: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.limit = limit
+        # 名额全部释放且无人排队时回调（项目级 gate 借此从控制器中移除）
+        self._on_idle = on_idle
+        self.max_queue = max_queue
+        self.running = 0
+        self._waiters: deque = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.max_wait = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float):
+        if self.limit <= 0:
+            self.running += 1
+            self.admitted += 1
+            return
+        if self.running < self.limit and not self._waiters:
+            self.running += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejectedError(self.name, "排队已满")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 超时/取消与交接同时发生：名额已交给本请求，转交下一位
+                self.release()
+            else:
+                waiter.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            raise AdmissionRejectedError(self.name, f"排队超过 {timeout:g} 秒") from None
+        finally:
+            self.max_wait = max(self.max_wait, time.monotonic() - started)
+        self.admitted += 1
+
+    def _remove(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # running 不变，名额直接交给等待者
+                waiter.set_result(None)
+                return
+        self.running -= 1
+        if self.running <= 0 and self._on_idle is not None:
+            self._on_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class Ticket:
+    """一次准入的名额，release 可重复调用"""
+
+    def __init__(self, gates, endpoint: str = "", started: float = 0.0):
+        self._gates = gates
+        self._released = False
+        self._endpoint = endpoint
+        self._started = started
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        for gate in reversed(self._gates):
+            gate.release()
+        if self._endpoint:
+            request_duration.observe(time.monotonic() - self._started, self._endpoint)
+
+
+def _release_soon(loop: asyncio.AbstractEventLoop, ticket: Ticket):
+    try:
+        loop.call_soon_threadsafe(ticket.release)
+    except RuntimeError:
+        # 事件循环已关闭，不再有等待者
+        pass
+
+
+class AdmissionController:
+    """按接口与项目限制并发的准入控制器"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        max_per_project: int = ADMISSION_MAX_PER_PROJECT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self._max_queue = max_queue
+        self._max_per_project = max_per_project
+        self._queue_timeout = queue_timeout
+        self._endpoints = {
+            name: _Gate(name, limit, max_queue) for name, limit in (limits or ADMISSION_LIMITS).items()
+        }
+        self._projects: Dict[str, _Gate] = {}
+
+    def _project_gate(self, project_id: str) -> Optional[_Gate]:
+        if self._max_per_project <= 0 or not project_id:
+            return None
+        gate = self._projects.get(project_id)
+        if gate is None:
+            gate = _Gate(
+                f"project:{project_id}", self._max_per_project, self._max_queue,
+                on_idle=lambda: self._evict_project(project_id, gate),
+            )
+            self._projects[project_id] = gate
+        return gate
+
+    def _evict_project(self, project_id: str, gate: _Gate):
+        # 空闲的项目 gate 不再保留，项目数量无上限时避免字典无限增长
+        if self._projects.get(project_id) is gate:
+            del self._projects[project_id]
+
+    async def acquire(self, endpoint: str, project_id: str = "") -> Ticket:
+        """
+        申请名额：先项目后接口，任一排队超时/已满时抛出 AdmissionRejectedError
+        调用方负责在请求结束时 release（流式响应使用 hold_until_done）
+        """
+        started = time.monotonic()
+        gates = [gate for gate in (self._project_gate(project_id), self._endpoints.get(endpoint)) if gate]
+        acquired = []
+        try:
+            for gate in gates:
+                await gate.acquire(self._queue_timeout)
+                acquired.append(gate)
+        except BaseException:
+            Ticket(acquired).release()
+            raise
+        return Ticket(acquired, endpoint, started)
+
+    @staticmethod
+    def hold_until_done(response: Any, ticket: Ticket) -> Any:
+        """流式响应在流结束后释放名额，其他响应立即释放"""
+        if not isinstance(response, StreamingResponse):
+            ticket.release()
+            return response
+
+        body = response.body_iterator
+
+        async def guarded():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                ticket.release()
+
+        response.body_iterator = guarded()
+        # 客户端在开始读取前断开时生成器不会执行 finally，回收时兜底释放；
+        # 回收可能发生在任意线程，释放（会唤醒排队的 future）需交回事件循环执行
+        weakref.finalize(response.body_iterator, _release_soon, asyncio.get_running_loop(), ticket)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        projects = {
+            name: gate.stats() for name, gate in self._projects.items() if gate.running or gate.waiting
+        }
+        return {
+            "queue_timeout_s": self._queue_timeout,
+            "endpoints": {name: gate.stats() for name, gate in self._endpoints.items()},
+            "projects": projects,
+        }
+
+    def collect_metrics(self):
+        """/metrics 采集：各接口运行中、排队中的请求数与累计拒绝数"""
+        gates = self._endpoints.items()
+        yield ("graph_http_requests_in_flight", "gauge", "运行中的请求数",
+               [({"endpoint": name}, gate.running) for name, gate in gates])
+        yield ("graph_http_requests_queued", "gauge", "准入排队中的请求数",
+               [({"endpoint": name}, gate.waiting) for name, gate in gates])
+        yield ("graph_http_requests_rejected_total", "counter", "准入拒绝（429）的请求数",
+               [({"endpoint": name}, gate.rejected) for name, gate in gates])
+
+
+admission = AdmissionController()
+metrics.register_collector(admission.collect_metrics)
@@ -1,7 +1,8 @@
 import uuid
 import json
 import os
-from typing import Any, Dict, List, Tuple, Iterator
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Iterator
 import time
 from utils.file.file import File, FileOps, infer_file_category
 from utils.error import classify_error
@@ -30,6 +31,8 @@ from utils.messages.server import (
     MESSAGE_TYPE_TOOL_RESPONSE,
 )
 
+logger = logging.getLogger(__name__)
+
 
 def to_stream_input(msg: ClientMessage) -> Dict[str, Any]:
     content_parts = []
@@ -278,31 +281,42 @@ def _item_to_server_messages(
     return messages
 
 
-def _iter_body_to_server_messages(
-        items: Iterator[Dict[Any, Dict[str, Any]]],
-        *,
-        session_id: str,
-        query_msg_id: str,
-        reply_id: str,
-        sequence_id_start: int = 1,
-        log_id: str = "",
-) -> Iterator[ServerMessage]:
-    seq = sequence_id_start
-    # Stable msg_id mapping per logical message stream
-    # Keys are derived from meta to keep same msg_id across chunks
-    stable_ids: Dict[Tuple[str, Any], str] = {}
-
-    accumulated_tool_chunks: List[Any] = []
-    accumulated_tool_response_content: Dict[str, str] = {}
-
-    def _flush_tool_chunks(seq_num: int) -> Tuple[List[ServerMessage], int]:
-        nonlocal accumulated_tool_chunks
+class _BodyConverter:
+    """
+    将 LangGraph messages 流逐条转换为 ServerMessage（同步/异步迭代共用）
+
+    工具调用分片的累积、sequence_id 递增与 msg_id 稳定映射都保存在实例上，
+    每次 feed 处理一个 (chunk, meta) 并返回需要下发的消息
+    """
+
+    def __init__(
+            self,
+            *,
+            session_id: str,
+            query_msg_id: str,
+            reply_id: str,
+            sequence_id_start: int = 1,
+            log_id: str = "",
+    ):
+        self.session_id = session_id
+        self.query_msg_id = query_msg_id
+        self.reply_id = reply_id
+        self.log_id = log_id
+        self.seq = sequence_id_start
+        # Stable msg_id mapping per logical message stream
+        # Keys are derived from meta to keep same msg_id across chunks
+        self.stable_ids: Dict[Tuple[str, Any], str] = {}
+
+        self.accumulated_tool_chunks: List[Any] = []
+        self.accumulated_tool_response_content: Dict[str, str] = {}
+
+    def _flush_tool_chunks(self, seq_num: int) -> Tuple[List[ServerMessage], int]:
         msgs: List[ServerMessage] = []
-        if not accumulated_tool_chunks:
+        if not self.accumulated_tool_chunks:
             return msgs, seq_num
 
-        merged_tcs = _merge_tool_call_chunks(accumulated_tool_chunks)
-        accumulated_tool_chunks = []
+        merged_tcs = _merge_tool_call_chunks(self.accumulated_tool_chunks)
+        self.accumulated_tool_chunks = []
         for tc in merged_tcs:
             raw_args = tc.get("args", {})
             if isinstance(raw_args, str):
@@ -327,20 +341,27 @@ def _iter_body_to_server_messages(
             msgs.append(
                 ServerMessage(
                     type=MESSAGE_TYPE_TOOL_REQUEST,
-                    session_id=session_id,
-                    query_msg_id=query_msg_id,
-                    reply_id=reply_id,
+                    session_id=self.session_id,
+                    query_msg_id=self.query_msg_id,
+                    reply_id=self.reply_id,
                     msg_id=str(uuid.uuid4()),
                     sequence_id=seq_num,
                     finish=True,
                     content=content,
-                    log_id=log_id,
+                    log_id=self.log_id,
                 )
             )
             seq_num += 1
         return msgs, seq_num
 
-    for item in items:
+    def feed(self, item: Any) -> List[ServerMessage]:
+        session_id = self.session_id
+        query_msg_id = self.query_msg_id
+        reply_id = self.reply_id
+        log_id = self.log_id
+        seq = self.seq
+        stable_ids = self.stable_ids
+
         chunk, meta = item
         chunk_type = chunk.__class__.__name__
         is_last = (meta or {}).get("chunk_position") == "last"
@@ -361,24 +382,24 @@ def _iter_body_to_server_messages(
         # because usually tool calls and text content are either separate or tool calls come first.
         # But let's be safe: only flush on ToolMessage or if is_last=True on AIMessageChunk.
 
-        if chunk_type == "ToolMessage" and accumulated_tool_chunks:
-            f_msgs, seq = _flush_tool_chunks(seq)
+        if chunk_type == "ToolMessage" and self.accumulated_tool_chunks:
+            f_msgs, seq = self._flush_tool_chunks(seq)
             flushed_msgs.extend(f_msgs)
 
         # 1. Handle AIMessageChunk with tool_call_chunks (Streaming Tool Request)
         if chunk_type == "AIMessageChunk":
             tc_chunks = getattr(chunk, "tool_call_chunks", None)
             if tc_chunks:
-                accumulated_tool_chunks.extend(tc_chunks)
+                self.accumulated_tool_chunks.extend(tc_chunks)
             # If we have accumulated chunks but this chunk has NO tool_call_chunks,
             # it implies the tool definition phase is likely over.
-            elif accumulated_tool_chunks:
-                f_msgs, seq = _flush_tool_chunks(seq)
+            elif self.accumulated_tool_chunks:
+                f_msgs, seq = self._flush_tool_chunks(seq)
                 flushed_msgs.extend(f_msgs)
 
             # Flush if this is the last chunk
-            if is_last and accumulated_tool_chunks:
-                f_msgs, seq = _flush_tool_chunks(seq)
+            if is_last and self.accumulated_tool_chunks:
+                f_msgs, seq = self._flush_tool_chunks(seq)
                 flushed_msgs.extend(f_msgs)
 
         # 2. Handle ToolMessage (Tool Response)
@@ -393,12 +414,12 @@ def _iter_body_to_server_messages(
                 full_result = result
                 should_emit = True
             else:
-                if tcid not in accumulated_tool_response_content:
-                    accumulated_tool_response_content[tcid] = ""
-                accumulated_tool_response_content[tcid] += str(result)
+                if tcid not in self.accumulated_tool_response_content:
+                    self.accumulated_tool_response_content[tcid] = ""
+                self.accumulated_tool_response_content[tcid] += str(result)
 
                 if is_last:
-                    full_result = accumulated_tool_response_content.pop(tcid)
+                    full_result = self.accumulated_tool_response_content.pop(tcid)
                     should_emit = True
 
             if should_emit:
@@ -437,7 +458,7 @@ def _iter_body_to_server_messages(
             # Combine: flushed (previous) + inner (current)
             final_msgs = flushed_msgs + inner_msgs
             msgs_to_yield.extend(final_msgs)
-            
+
             if inner_msgs:
                 seq = inner_msgs[-1].sequence_id + 1
         else:
@@ -448,7 +469,7 @@ def _iter_body_to_server_messages(
             # However, msgs_to_yield is a list we are appending to.
             # So we should insert flushed_msgs at the beginning?
             # Or better, just construct a new list.
-            
+
             # Current content of msgs_to_yield comes from block 2 (Tool Response).
             # flushed_msgs comes from block 0 (Tool Requests flushed).
             # Order: Tool Request -> Tool Response.
@@ -485,30 +506,47 @@ def _iter_body_to_server_messages(
                 stable_ids[key] = str(uuid.uuid4())
             m.msg_id = stable_ids[key]
 
-            yield m
+        self.seq = seq
+        return msgs_to_yield
 
 
-def iter_server_messages(
+def _iter_body_to_server_messages(
         items: Iterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id_start: int = 1,
+        log_id: str = "",
+) -> Iterator[ServerMessage]:
+    converter = _BodyConverter(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start,
+        log_id=log_id,
+    )
+    for item in items:
+        yield from converter.feed(item)
+
+
+def _start_message(
         *,
         session_id: str,
         query_msg_id: str,
         local_msg_id: str,
         run_id: str,
-        sequence_id_start: int = 1,
+        reply_id: str,
+        sequence_id: int,
         log_id: str,
-) -> Iterator[ServerMessage]:
-    t0 = time.time()
-    reply_id = str(uuid.uuid4())
-    start_msg_id = str(uuid.uuid4())
-    # message_start
-    start_sm = ServerMessage(
+) -> ServerMessage:
+    return ServerMessage(
         type=MESSAGE_TYPE_MESSAGE_START,
         session_id=session_id,
         query_msg_id=query_msg_id,
         reply_id=reply_id,
-        msg_id=start_msg_id,
-        sequence_id=sequence_id_start,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
         finish=True,
         content=ServerMessageContent(
             message_start=MessageStartDetail(
@@ -517,67 +555,162 @@ def iter_server_messages(
         ),
         log_id=log_id,
     )
-    yield start_sm
-    next_seq = sequence_id_start + 1
+
+
+def _end_message(
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id: int,
+        log_id: str,
+        t0: float,
+        error: Exception | None = None,
+) -> ServerMessage:
+    if error is None:
+        code, message = MESSAGE_END_CODE_SUCCESS, ""
+    else:
+        # 使用错误分类器获取错误码
+        err = classify_error(error, {"node_name": "stream"})
+        code, message = str(err.code), err.message
+    return ServerMessage(
+        type=MESSAGE_TYPE_MESSAGE_END,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
+        finish=True,
+        content=ServerMessageContent(
+            message_end=MessageEndDetail(
+                code=code,
+                message=message,
+                token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
+                time_cost_ms=int((time.time() - t0) * 1000),
+            )
+        ),
+        log_id=log_id,
+    )
+
+
+def _report_error(on_error: Optional[Callable[[Exception], None]], error: Exception):
+    if on_error is None:
+        return
+    try:
+        on_error(error)
+    except Exception as e:
+        logger.warning(f"Stream error callback failed: {e}")
+
+
+def iter_server_messages(
+        items: Iterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        sequence_id_start: int = 1,
+        log_id: str,
+        on_error: Optional[Callable[[Exception], None]] = None,
+) -> Iterator[ServerMessage]:
+    """
+    将 graph.stream(stream_mode="messages") 转换为 message_start / 消息体 / message_end；
+    执行异常会被转换为带错误码的 message_end，不会抛给调用方，需要上报时通过 on_error 回调获取
+    """
+    t0 = time.time()
+    reply_id = str(uuid.uuid4())
+    # message_start
+    yield _start_message(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        reply_id=reply_id,
+        sequence_id=sequence_id_start,
+        log_id=log_id,
+    )
+    converter = _BodyConverter(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start + 1,
+        log_id=log_id,
+    )
     last_seq = sequence_id_start
+    error = None
     try:
         # body stream
-        for sm in _iter_body_to_server_messages(
-                items,
-                session_id=session_id,
-                query_msg_id=query_msg_id,
-                reply_id=reply_id,
-                sequence_id_start=next_seq,
-                log_id=log_id,
-        ):
-            yield sm
-            last_seq = sm.sequence_id
-
-        # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code=MESSAGE_END_CODE_SUCCESS,
-                    message="",
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                    time_cost_ms=t_ms,
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+        for item in items:
+            for sm in converter.feed(item):
+                yield sm
+                last_seq = sm.sequence_id
     except Exception as ex:
-        # 使用错误分类器获取错误码
-        err = classify_error(ex, {"node_name": "stream"})
-        # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code=str(err.code),
-                    message=err.message,
-                    time_cost_ms=t_ms,
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+        error = ex
+        _report_error(on_error, ex)
+    # message_end
+    yield _end_message(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id=last_seq + 1,
+        log_id=log_id,
+        t0=t0,
+        error=error,
+    )
+
+
+async def aiter_server_messages(
+        items: AsyncIterator[Any],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        sequence_id_start: int = 1,
+        log_id: str,
+        on_error: Optional[Callable[[Exception], None]] = None,
+) -> AsyncIterator[ServerMessage]:
+    """iter_server_messages 的异步版本，消费 graph.astream(stream_mode="messages")"""
+    t0 = time.time()
+    reply_id = str(uuid.uuid4())
+    # message_start
+    yield _start_message(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        reply_id=reply_id,
+        sequence_id=sequence_id_start,
+        log_id=log_id,
+    )
+    converter = _BodyConverter(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start + 1,
+        log_id=log_id,
+    )
+    last_seq = sequence_id_start
+    error = None
+    try:
+        # body stream
+        async for item in items:
+            for sm in converter.feed(item):
+                yield sm
+                last_seq = sm.sequence_id
+    except Exception as ex:
+        error = ex
+        _report_error(on_error, ex)
+    # message_end
+    yield _end_message(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id=last_seq + 1,
+        log_id=log_id,
+        t0=t0,
+        error=error,
+    )
 
 
 def agent_iter_server_messages(
@@ -588,6 +721,7 @@ def agent_iter_server_messages(
         local_msg_id: str,
         run_id: str,
         log_id: str,
+        on_error: Optional[Callable[[Exception], None]] = None,
 ) -> Iterator[ServerMessage]:
     return iter_server_messages(
         items,
@@ -597,4 +731,27 @@ def agent_iter_server_messages(
         run_id=run_id,
         sequence_id_start=1,
         log_id=log_id,
+        on_error=on_error,
+    )
+
+
+def agent_aiter_server_messages(
+        items: AsyncIterator[Any],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        log_id: str,
+        on_error: Optional[Callable[[Exception], None]] = None,
+) -> AsyncIterator[ServerMessage]:
+    return aiter_server_messages(
+        items,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        sequence_id_start=1,
+        log_id=log_id,
+        on_error=on_error,
     )
@@ -0,0 +1,148 @@
+"""
+运行级协作取消
+后台线程中的 graph.stream 只能在两条消息之间检查取消标志，模型长时间输出（如 thinking）时
+上游 LLM 请求与图执行会一直持续。CancelScope 把取消传递到模型调用本身：
+- 作为 producer 的 cancelled 标志使用（threading.Event 子类），producer_pool 在执行 producer 时写入 contextvar
+- LLM HTTP 客户端的钩子在发起请求前检查取消（取消后不再调度新的模型调用），
+  并登记响应流：读取每个数据块前检查取消，set() 时关闭 HTTP/1.1 连接的 socket，唤醒阻塞在读取上的线程
+  （同步客户端因此固定使用 HTTP/1.1，见 utils.helper.llm_client）
+- 异步路径（graph.astream）主要由 asyncio 任务取消中断模型请求；节点在未被取消的子任务中发起的请求，
+  由同一 CancelScope 关闭 HTTP/1.1 连接的 socket，挂起在读取上的协程随即收到连接关闭
+"""
+import socket
+import logging
+import threading
+import weakref
+import contextvars
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+
+from utils.error import ErrorCode, VibeCodingError
+
+logger = logging.getLogger(__name__)
+
+_current_scope: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "cancel_scope", default=None
+)
+
+
+class RunCancelledError(VibeCodingError):
+    """运行已取消，中断模型调用"""
+
+    def __init__(self):
+        super().__init__(ErrorCode.RUNTIME_CANCELLED, "运行已取消，模型调用已中断")
+
+
+class CancelScope(threading.Event):
+    """一次运行的取消标志，set() 时同时中断进行中的模型响应流"""
+
+    def __init__(self):
+        super().__init__()
+        self._responses: "weakref.WeakSet[httpx.Response]" = weakref.WeakSet()
+        self._responses_lock = threading.Lock()
+
+    def attach(self, response: httpx.Response):
+        with self._responses_lock:
+            self._responses.add(response)
+        if self.is_set():
+            _abort(response)
+
+    def set(self):
+        if self.is_set():
+            return
+        super().set()
+        with self._responses_lock:
+            responses = list(self._responses)
+        for response in responses:
+            _abort(response)
+
+
+def _abort(response: httpx.Response):
+    """关闭响应底层 socket；HTTP/2 连接由多个请求复用（同步客户端不会出现），只依赖读取数据块前的检查"""
+    if response.is_closed or response.http_version != "HTTP/1.1":
+        return
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def current_scope() -> Optional[threading.Event]:
+    return _current_scope.get()
+
+
+def set_current_scope(scope: Optional[threading.Event]) -> contextvars.Token:
+    return _current_scope.set(scope)
+
+
+def check_cancelled():
+    """当前运行已取消时抛出 RunCancelledError"""
+    scope = _current_scope.get()
+    if scope is not None and scope.is_set():
+        raise RunCancelledError()
+
+
+class _CancellableSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, scope: threading.Event):
+        self._stream = stream
+        self._scope = scope
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            if self._scope.is_set():
+                raise RunCancelledError()
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class _CancellableAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, scope: threading.Event):
+        self._stream = stream
+        self._scope = scope
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            if self._scope.is_set():
+                raise RunCancelledError()
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+
+def track_request(request: httpx.Request):
+    """httpx request 钩子：已取消的运行不再发起模型请求"""
+    check_cancelled()
+
+
+def track_response(response: httpx.Response):
+    """httpx response 钩子（同步客户端）：响应流接入当前运行的取消"""
+    scope = _current_scope.get()
+    if scope is None:
+        return
+    if scope.is_set():
+        response.close()
+        raise RunCancelledError()
+    response.stream = _CancellableSyncStream(response.stream, scope)
+    if isinstance(scope, CancelScope):
+        scope.attach(response)
+
+
+async def atrack_response(response: httpx.Response):
+    """httpx response 钩子（异步客户端）"""
+    scope = _current_scope.get()
+    if scope is None:
+        return
+    if scope.is_set():
+        await response.aclose()
+        raise RunCancelledError()
+    response.stream = _CancellableAsyncStream(response.stream, scope)
+    if isinstance(scope, CancelScope):
+        scope.attach(response)
@@ -3,10 +3,20 @@ import inspect
 import importlib
 import ast
 import textwrap
+import threading
 from pydantic import BaseModel
 from typing import get_type_hints,Type,Optional,get_origin,Union,get_args
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.graph import START, END
+from coze_coding_utils.runtime_ctx.context import default_headers
+from utils.helper.llm_client import set_request_headers
+
+# 是否复用 Agent 实例（模块提供 agent_cache_key 时生效）
+AGENT_CACHE_ENABLED = os.getenv("AGENT_CACHE_ENABLED", "1") == "1"
+
+# (module_name, agent_cache_key()) -> Agent 实例
+_agent_cache: dict = {}
+_agent_cache_lock = threading.Lock()
 
 
 def get_graph_instance(module_name):
@@ -17,8 +27,45 @@ def get_graph_instance(module_name):
     return None
 
 def get_agent_instance(module_name, ctx):
+    """
+    获取 Agent 实例
+    模块提供 agent_cache_key() 时按键缓存编译好的 Agent，配置未变化的请求直接复用（含模型连接）；
+    请求级 header 写入当前上下文，由 LLM HTTP 客户端发出请求时注入
+    """
     module = importlib.import_module(module_name)
-    return module.build_agent(ctx)
+    cache_key = getattr(module, "agent_cache_key", None)
+    if not AGENT_CACHE_ENABLED or cache_key is None:
+        return module.build_agent(ctx)
+
+    set_request_headers(default_headers(ctx) if ctx else None)
+    key = (module_name, cache_key())
+    agent = _agent_cache.get(key)
+    if agent is not None:
+        return agent
+
+    with _agent_cache_lock:
+        agent = _agent_cache.get(key)
+        if agent is None:
+            agent = module.build_agent()
+            # 配置变化后旧实例不再使用
+            for stale in [k for k in _agent_cache if k[0] == module_name]:
+                del _agent_cache[stale]
+            _agent_cache[key] = agent
+    return agent
+
+# return: func, input_class, output_class
+def _node_func_with_inout(_func):
+    # 获取函数签名
+    sig = inspect.signature(_func)
+    # 获取参数列表
+    params = list(sig.parameters.values())
+    input_cls = None
+    if params:
+        input_cls = params[0].annotation
+
+    output_cls = ParamExtractHelper.get_concrete_return_class(_func)
+
+    return _func, input_cls, output_cls
 
 # return: func, input_class, output_class
 def get_graph_node_func_with_inout(graph, node_name):
@@ -31,19 +78,24 @@ def get_graph_node_func_with_inout(graph, node_name):
             if _func.__name__ != node_name:
                 continue
 
-            # 获取函数签名
-            sig = inspect.signature(_func)
-            # 获取参数列表
-            params = list(sig.parameters.values())
-            input_cls = None
-            if params:
-                input_cls = params[0].annotation
+            return _node_func_with_inout(_func)
 
-            output_cls = ParamExtractHelper.get_concrete_return_class(_func)
+    return None, None, None
 
-            return _func, input_cls, output_cls
+# return: {函数名: (func, input_class, output_class)}，一次遍历解析全部节点，供启动时预计算
+def get_graph_nodes_with_inout(graph):
+    nodes = {}
+    for node_id, node in graph.nodes.items():
+        if node_id == START or node_id == END:
+            continue
 
-    return None, None, None
+        _func = getattr(node.data, "func", None) if node.data else None
+        # 同名函数以第一个节点为准，与 get_graph_node_func_with_inout 一致
+        if _func is None or _func.__name__ in nodes:
+            continue
+        nodes[_func.__name__] = _node_func_with_inout(_func)
+
+    return nodes
 
 def is_agent_proj() -> bool:
     return os.getenv("COZE_PROJECT_TYPE", "workflow") == "agent"
@@ -0,0 +1,141 @@
+"""
+LLM HTTP 客户端注册表与请求级 header 注入
+- 进程内所有 ChatOpenAI 共用一个同步 httpx.Client 与按事件循环共享的 httpx.AsyncClient，
+  keep-alive 复用到模型服务的连接，连接上限可配置；异步客户端可用时启用 HTTP/2，
+  同步客户端固定使用 HTTP/1.1（运行取消需要关闭响应独占的 socket 来唤醒阻塞读取的线程）
+- Agent 实例在请求间复用，ChatOpenAI 的 default_headers 只在构建时生效；
+  每个请求的 header（default_headers(ctx)）写入 contextvar，由 httpx 请求钩子在发出请求时注入。
+  contextvar 会随请求任务、producer 线程池（copy_context）与 LangGraph 节点执行传递
+- 请求/响应钩子同时接入 utils.helper.cancellation，运行取消时中断模型调用
+"""
+import os
+import asyncio
+import threading
+import weakref
+import contextvars
+import importlib.util
+from typing import Dict, Optional
+
+import httpx
+
+from utils.helper.cancellation import track_request, track_response, atrack_response
+
+# 到模型服务的最大连接数 / 最大空闲连接数 / 空闲连接保活时间（秒）
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "200"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "50"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+# 异步客户端是否启用 HTTP/2（需安装 h2，服务端不支持时自动协商回 HTTP/1.1）
+LLM_HTTP2_ENABLED = os.getenv("LLM_HTTP2_ENABLED", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_request_headers: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "llm_request_headers", default=None
+)
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+_shared_async_client: "SharedAsyncClient | None" = None
+
+# httpx.AsyncClient 的连接绑定创建它的事件循环，按循环各持有一个
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def set_request_headers(headers: Optional[Dict[str, str]]) -> contextvars.Token:
+    """设置当前请求上下文中发往模型服务的 header"""
+    return _request_headers.set(dict(headers) if headers else None)
+
+
+def get_request_headers() -> Optional[Dict[str, str]]:
+    return _request_headers.get()
+
+
+def _inject_headers(request: httpx.Request):
+    headers = _request_headers.get()
+    if headers:
+        request.headers.update(headers)
+
+
+def _before_request(request: httpx.Request):
+    track_request(request)
+    _inject_headers(request)
+
+
+async def _abefore_request(request: httpx.Request):
+    _before_request(request)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    获取进程级共享的同步 httpx.Client（线程安全），超时由 openai SDK 按请求传入
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                # HTTP/2 多个请求复用同一连接，无法只中断其中一个阻塞中的读取，同步客户端不启用
+                _client = httpx.Client(
+                    limits=_limits(),
+                    http2=False,
+                    event_hooks={"request": [_before_request], "response": [track_response]},
+                )
+    return _client
+
+
+def _loop_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=_limits(),
+            http2=LLM_HTTP2_ENABLED,
+            event_hooks={"request": [_abefore_request], "response": [atrack_response]},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+class SharedAsyncClient(httpx.AsyncClient):
+    """
+    交给 ChatOpenAI 的 http_async_client：请求转发到当前事件循环的共享客户端，
+    缓存的 Agent 跨事件循环使用时也不会复用其他循环的连接
+    """
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await _loop_async_client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        # 共享连接由 aclose_async_http_client 统一关闭
+        return None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """获取进程级共享的异步客户端（可在协程外调用，实际连接按事件循环共享）"""
+    global _shared_async_client
+    if _shared_async_client is None:
+        with _client_lock:
+            if _shared_async_client is None:
+                _shared_async_client = SharedAsyncClient()
+    return _shared_async_client
+
+
+def close_http_client():
+    """关闭共享同步客户端，释放连接池"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_async_http_client():
+    """关闭当前事件循环的共享异步客户端"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,220 @@
+"""
+进程内指标注册表（Prometheus 文本格式，由 /metrics 暴露）
+- Counter / Histogram 按线程分条（lock striping）：每个线程固定写入一个分条，
+  热路径只持有该分条的锁，采集时再合并各分条
+- 瞬时值（运行中/排队中的请求等）通过 register_collector 在采集时读取，热路径无开销
+- 多 worker 时每个进程各自计数，指标对应处理本次采集请求的 worker
+"""
+import os
+import bisect
+import logging
+import threading
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+from utils.error.codes import get_error_category
+from utils.error.exceptions import VibeCodingError, classify_error
+
+logger = logging.getLogger(__name__)
+
+# 是否采集指标（关闭后 observe/inc 直接返回，节点回调也不再为指标安装）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# 未被追踪采样的运行是否也安装节点回调采集节点耗时/失败数（每次运行多一个回调的开销）；
+# 关闭时这些指标只覆盖采样的运行，token 数由 Agent 运行的轻量回调采集
+METRICS_UNSAMPLED_RUNS = os.getenv("METRICS_UNSAMPLED_RUNS", "0") == "1"
+# 每个指标的分条数
+METRICS_STRIPES = int(os.getenv("METRICS_STRIPES", "16"))
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_thread_stripe = threading.local()
+_stripe_counter = count()
+
+
+def _stripe_index() -> int:
+    # 线程首次写入时按轮转分配分条
+    index = getattr(_thread_stripe, "index", None)
+    if index is None:
+        index = next(_stripe_counter) % METRICS_STRIPES
+        _thread_stripe.index = index
+    return index
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._stripes: List[Tuple[threading.Lock, dict]] = [
+            (threading.Lock(), {}) for _ in range(max(METRICS_STRIPES, 1))
+        ]
+
+    def _stripe(self) -> Tuple[threading.Lock, dict]:
+        return self._stripes[_stripe_index()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        lock, values = self._stripe()
+        with lock:
+            values[labels] = values.get(labels, 0) + amount
+
+    def collect(self) -> Dict[tuple, float]:
+        merged: Dict[tuple, float] = {}
+        for lock, values in self._stripes:
+            with lock:
+                items = list(values.items())
+            for labels, value in items:
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        if not METRICS_ENABLED:
+            return
+        # 各桶非累计计数 + 溢出桶 + sum + count
+        index = bisect.bisect_left(self.buckets, value)
+        lock, values = self._stripe()
+        with lock:
+            data = values.get(labels)
+            if data is None:
+                data = [0] * (len(self.buckets) + 3)
+                values[labels] = data
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def collect(self) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        for lock, values in self._stripes:
+            with lock:
+                items = [(labels, list(data)) for labels, data in values.items()]
+            for labels, data in items:
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = data
+                else:
+                    for i, value in enumerate(data):
+                        total[i] += value
+        return merged
+
+
+# 采集时调用，返回 (指标名, 类型, 说明, [(标签字典, 值)])
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                for labels, data in sorted(metric.collect().items()):
+                    cumulative = 0
+                    for bound, value in zip(metric.buckets, data):
+                        cumulative += value
+                        le = _labels(metric.labelnames, labels, 'le="%s"' % bound)
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    cumulative += data[len(metric.buckets)]
+                    le = _labels(metric.labelnames, labels, 'le="+Inf"')
+                    lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(data[-2])}")
+                    lines.append(f"{metric.name}_count{_labels(metric.labelnames, labels)} {data[-1]}")
+            else:
+                for labels, value in sorted(metric.collect().items()):
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}")
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, values in samples:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "graph_http_request_duration_seconds", "接口请求耗时（含准入排队，流式响应到流结束）", ("endpoint",)
+)
+node_duration = metrics.histogram(
+    "graph_node_duration_seconds", "工作流节点执行耗时", ("node",)
+)
+node_errors = metrics.counter(
+    "graph_node_errors_total", "工作流节点执行失败次数", ("node",)
+)
+run_errors = metrics.counter(
+    "graph_run_errors_total", "运行失败次数（按错误码大类与错误码）", ("category", "code")
+)
+llm_tokens = metrics.counter(
+    "graph_llm_tokens_total", "模型调用消耗的 token 数", ("type",)
+)
+
+
+def record_run_error(error: Union[BaseException, int]):
+    """记录一次运行失败：VibeCodingError / ErrorCode 直接取错误码，其他异常先分类"""
+    if isinstance(error, VibeCodingError):
+        code = error.code
+    elif isinstance(error, int):
+        code = error
+    else:
+        code = classify_error(error).code
+    run_errors.inc(get_error_category(int(code)).name, str(int(code)))
@@ -0,0 +1,139 @@
+"""
+同步图执行的共享线程池
+graph.stream 是同步迭代器，需要在后台线程中消费后推送给事件循环。
+所有 producer（/stream_run、OpenAI 兼容接口的流式与非流式）共用一个有界线程池：
+- 同时运行的 producer 数不超过 PRODUCER_MAX_WORKERS
+- 排队等待的 producer 数不超过 PRODUCER_MAX_PENDING，超出时直接拒绝（RUNTIME_OVERLOADED）
+- 记录排队深度与等待时间
+- 消费方断开/取消后，排队中的任务不再执行；运行中的任务在下一条消息处退出，
+  cancelled 为 CancelScope 时进行中的模型调用也会被中断（见 utils.helper.cancellation）
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from utils.error import ErrorCode, VibeCodingError
+from utils.helper.cancellation import set_current_scope
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的 producer 线程数
+PRODUCER_MAX_WORKERS = int(os.getenv("PRODUCER_MAX_WORKERS", "32"))
+# 线程全部占用时允许排队的 producer 数
+PRODUCER_MAX_PENDING = int(os.getenv("PRODUCER_MAX_PENDING", "64"))
+
+
+class ProducerPoolFullError(VibeCodingError):
+    """线程池与等待队列均已占满"""
+
+    def __init__(self, capacity: int):
+        super().__init__(
+            ErrorCode.RUNTIME_OVERLOADED,
+            f"服务繁忙，执行队列已满（容量 {capacity}），请稍后重试",
+        )
+
+
+class ProducerPool:
+    """有界的 producer 线程池，带排队深度与等待时间统计"""
+
+    def __init__(self, max_workers: int = PRODUCER_MAX_WORKERS, max_pending: int = PRODUCER_MAX_PENDING):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graph-producer")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._reclaimed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Future:
+        """
+        提交 producer，在当前 contextvars 上下文中执行
+
+        Args:
+            fn: producer 函数
+            cancelled: 消费方取消标志；任务开始前已置位时直接回收，不再执行；
+                       执行期间作为当前运行的取消范围，供 LLM 客户端检查
+
+        Raises:
+            ProducerPoolFullError: 运行与排队数已达上限
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"Producer pool saturated: running={self._running}, pending={self._pending}")
+            raise ProducerPoolFullError(self.capacity)
+
+        context = contextvars.copy_context()
+        if cancelled is not None:
+            context.run(set_current_scope, cancelled)
+        enqueued_at = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+
+        def run():
+            wait = time.monotonic() - enqueued_at
+            with self._lock:
+                self._pending -= 1
+                self._running += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                if cancelled is not None and cancelled.is_set():
+                    with self._lock:
+                        self._reclaimed += 1
+                    return None
+                return context.run(fn, *args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._slots.release()
+
+        return self._executor.submit(run)
+
+    def stats(self) -> Dict[str, Any]:
+        """当前运行/排队数与累计统计"""
+        with self._lock:
+            started = self._submitted - self._pending
+            return {
+                "max_workers": self.max_workers,
+                "capacity": self.capacity,
+                "running": self._running,
+                "pending": self._pending,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "reclaimed": self._reclaimed,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+            }
+
+
+def iter_until_cancelled(items: Iterable[Any], cancelled: threading.Event) -> Iterator[Any]:
+    """消费方取消后停止迭代，并关闭底层生成器释放图执行"""
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            if cancelled.is_set():
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+producer_pool = ProducerPool()
@@ -0,0 +1,164 @@
+"""
+多 worker 模式下的 run_id -> worker 路由
+各 worker 之间不共享状态（任务表、线程池、缓存均为进程内），/cancel 可能落到不持有该任务的 worker：
+- 每个 worker 在 RUN_REGISTRY_DIR 下监听 worker-<pid>.sock 控制套接字
+- 任务登记时写入 runs/<run_id>（内容为所属 worker 的 pid），结束时删除
+- /cancel 在本 worker 找不到任务时按登记文件把取消请求转发给所属 worker
+单 worker（HTTP_WORKERS<=1）时不启用，任务表退化为普通 dict 行为
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# HTTP 服务 worker 进程数（start_http_server 写入环境变量，worker 进程继承）
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "1"))
+# 控制套接字与 run 登记目录
+RUN_REGISTRY_DIR = os.getenv("RUN_REGISTRY_DIR", "/tmp/graph_run_registry")
+# 转发取消请求的超时（秒）
+RUN_REGISTRY_TIMEOUT = float(os.getenv("RUN_REGISTRY_TIMEOUT", "3"))
+
+
+class RunRegistry:
+    """基于本地 Unix 套接字的跨 worker 取消路由"""
+
+    def __init__(self, base_dir: str = RUN_REGISTRY_DIR, enabled: bool = HTTP_WORKERS > 1):
+        self.enabled = enabled
+        self._base_dir = base_dir
+        self._runs_dir = os.path.join(base_dir, "runs")
+        self._pid = os.getpid()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._cancel_local: Optional[Callable[[str], Dict[str, Any]]] = None
+        if enabled:
+            os.makedirs(self._runs_dir, exist_ok=True)
+
+    def _socket_path(self, pid: int) -> str:
+        return os.path.join(self._base_dir, f"worker-{pid}.sock")
+
+    def _run_path(self, run_id: str) -> str:
+        # run_id 为 uuid，替换路径分隔符防止越界
+        return os.path.join(self._runs_dir, run_id.replace(os.sep, "_"))
+
+    async def start(self, cancel_local: Callable[[str], Dict[str, Any]]):
+        """worker 启动时调用：监听控制套接字，收到转发的取消请求时调用 cancel_local(run_id)"""
+        if not self.enabled:
+            return
+        # fork 之后的 pid 才是 worker 自身的
+        self._pid = os.getpid()
+        self._cancel_local = cancel_local
+        path = self._socket_path(self._pid)
+        if os.path.exists(path):
+            os.remove(path)
+        self._server = await asyncio.start_unix_server(self._handle, path=path)
+        logger.info(f"Run registry listening on {path}")
+
+    async def stop(self):
+        """worker 退出时调用：关闭并删除控制套接字"""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.remove(self._socket_path(self._pid))
+        except FileNotFoundError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("op") == "cancel" and self._cancel_local is not None:
+                result = self._cancel_local(str(request.get("run_id", "")))
+            else:
+                result = {"status": "error", "message": f"Unsupported op: {request.get('op')}"}
+            writer.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Run registry request failed: {e}")
+        finally:
+            writer.close()
+
+    def register(self, run_id: str):
+        if not self.enabled:
+            return
+        try:
+            with open(self._run_path(run_id), "w") as f:
+                f.write(str(self._pid))
+        except OSError as e:
+            logger.warning(f"Failed to register run {run_id}: {e}")
+
+    def unregister(self, run_id: str):
+        if not self.enabled:
+            return
+        try:
+            os.remove(self._run_path(run_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to unregister run {run_id}: {e}")
+
+    def owner(self, run_id: str) -> Optional[int]:
+        """持有 run_id 的 worker pid，未登记时返回 None"""
+        try:
+            with open(self._run_path(run_id), "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    async def forward_cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        将取消请求转发给持有 run_id 的 worker
+        未启用、未登记、属于本 worker 或对端不可达时返回 None
+        """
+        if not self.enabled:
+            return None
+        pid = self.owner(run_id)
+        if pid is None or pid == self._pid:
+            return None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self._socket_path(pid)), RUN_REGISTRY_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Worker {pid} owning run {run_id} is unreachable: {e}")
+            # worker 已退出，登记文件失效
+            self.unregister(run_id)
+            return None
+        try:
+            writer.write(json.dumps({"op": "cancel", "run_id": run_id}).encode("utf-8") + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), RUN_REGISTRY_TIMEOUT)
+            return json.loads(line) if line else None
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"Failed to forward cancel for run {run_id} to worker {pid}: {e}")
+            return None
+        finally:
+            writer.close()
+
+
+class TaskTable(dict):
+    """run_id -> asyncio.Task，登记与移除时同步到 RunRegistry"""
+
+    def __init__(self, registry: RunRegistry):
+        super().__init__()
+        self._registry = registry
+
+    def __setitem__(self, run_id: str, task: Any):
+        if run_id not in self:
+            self._registry.register(run_id)
+        super().__setitem__(run_id, task)
+
+    def __delitem__(self, run_id: str):
+        super().__delitem__(run_id)
+        self._registry.unregister(run_id)
+
+    def pop(self, run_id: str, *default: Any) -> Any:
+        if run_id in self:
+            self._registry.unregister(run_id)
+        return super().pop(run_id, *default)
+
+
+run_registry = RunRegistry()
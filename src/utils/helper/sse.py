@@ -0,0 +1,50 @@
+"""
+SSE 事件序列化
+- JSON 后端：已安装 orjson 时默认使用（SSE_JSON_BACKEND=json 强制使用标准库），输出 UTF-8 bytes，
+  直接交给 StreamingResponse，省去 str -> bytes 的再次编码；每个事件只做一次序列化
+"""
+import os
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+# JSON 序列化后端：orjson / json
+SSE_JSON_BACKEND = os.getenv("SSE_JSON_BACKEND", "orjson")
+
+_USE_ORJSON = orjson is not None and SSE_JSON_BACKEND == "orjson"
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+_EVENT_PREFIX = b"event: message\ndata: "
+_DATA_PREFIX = b"data: "
+_EVENT_SUFFIX = b"\n\n"
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def dumps(data: Any) -> bytes:
+    """序列化为紧凑 JSON（UTF-8 bytes），无法序列化的对象按 str() 输出"""
+    if _USE_ORJSON:
+        try:
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # 超出 64 位的整数等 orjson 不支持的值，回退标准库
+            pass
+    return _json_dumps(data)
+
+
+def sse_message_event(data: Any) -> bytes:
+    """event: message 格式的 SSE 事件"""
+    return b"".join((_EVENT_PREFIX, dumps(data), _EVENT_SUFFIX))
+
+
+def sse_data_event(data: Any) -> bytes:
+    """仅 data 行的 SSE 事件（OpenAI 兼容接口）"""
+    return b"".join((_DATA_PREFIX, dumps(data), _EVENT_SUFFIX))
+
@@ -0,0 +1,126 @@
+"""
+producer（后台线程或同一事件循环上的任务）与 SSE 消费协程之间的有界缓冲
+- 缓冲达到高水位 STREAM_QUEUE_HIGH_WATER 时阻塞 producer 线程 / 挂起 producer 任务（暂停图执行），单个流的内存占用有上限
+- 消费方一次取走全部积压的消息，可在客户端读取变慢时合并后再下发
+- 消费方退出后 close()，阻塞中的 producer 立即返回
+"""
+import os
+import asyncio
+import threading
+from collections import deque
+from typing import Any, List
+
+from utils.messages.server import MESSAGE_TYPE_ANSWER
+
+# 每个流最多缓存的消息数
+STREAM_QUEUE_HIGH_WATER = int(os.getenv("STREAM_QUEUE_HIGH_WATER", "256"))
+# 积压时是否合并连续的 answer 增量
+STREAM_COALESCE_ENABLED = os.getenv("STREAM_COALESCE_ENABLED", "1") == "1"
+
+
+class StreamBuffer:
+    """单 producer（线程用 put，协程用 aput）-> 单消费协程 的有界缓冲"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, high_water: int = STREAM_QUEUE_HIGH_WATER):
+        self._loop = loop
+        self._high_water = max(high_water, 1)
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._ready = asyncio.Event()
+        # 供同一事件循环上的 producer 任务等待缓冲有空位
+        self._space = asyncio.Event()
+        self._space.set()
+        self._closed = False
+
+    def put(self, item: Any) -> bool:
+        """
+        producer 线程调用：缓冲已满时阻塞等待；消费方已关闭时返回 False
+        """
+        with self._cond:
+            while len(self._items) >= self._high_water and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return False
+            self._items.append(item)
+            wake = len(self._items) == 1
+        if wake:
+            # 只有缓冲由空变为非空时才唤醒消费方，积压期间不再逐条跨线程调度
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                return False
+        return True
+
+    async def aput(self, item: Any) -> bool:
+        """
+        与消费方同一事件循环上的 producer 任务调用：缓冲已满时挂起等待；消费方已关闭时返回 False
+        """
+        while True:
+            with self._cond:
+                if self._closed:
+                    return False
+                if len(self._items) < self._high_water:
+                    self._items.append(item)
+                    wake = len(self._items) == 1
+                    break
+                self._space.clear()
+            await self._space.wait()
+        if wake:
+            self._ready.set()
+        return True
+
+    async def get_batch(self) -> List[Any]:
+        """消费协程调用：等待并取走当前全部消息"""
+        while True:
+            with self._cond:
+                if self._items:
+                    batch = list(self._items)
+                    self._items.clear()
+                    self._ready.clear()
+                    self._cond.notify_all()
+                    self._space.set()
+                    return batch
+                self._ready.clear()
+            await self._ready.wait()
+
+    def close(self):
+        """消费方退出：丢弃积压消息并释放阻塞中的 producer"""
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+        self._space.set()
+
+
+def coalesce_answer_dicts(batch: List[Any]) -> List[Any]:
+    """
+    合并一批消息中连续的 answer 增量（同一 msg_id，前一条未结束），
+    合并后的消息使用最后一条的 sequence_id 与 finish；消息字典为本流独占，直接原地修改
+    """
+    if not STREAM_COALESCE_ENABLED or len(batch) < 2:
+        return batch
+
+    merged: List[Any] = []
+    for item in batch:
+        prev = merged[-1] if merged else None
+        if (
+            _is_answer_delta(item)
+            and _is_answer_delta(prev)
+            and not prev["finish"]
+            and prev["msg_id"] == item["msg_id"]
+        ):
+            prev["content"]["answer"] += item["content"]["answer"]
+            prev["sequence_id"] = item["sequence_id"]
+            prev["finish"] = item["finish"]
+            continue
+        merged.append(item)
+    return merged
+
+
+def _is_answer_delta(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and item.get("type") == MESSAGE_TYPE_ANSWER
+        and isinstance((item.get("content") or {}).get("answer"), str)
+    )
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+测试脚本：运行取消/超时时，进行中的异步模型请求（httpx 流式响应）被真正关闭
+本地起一个只返回首个数据块后挂起的 HTTP/1.1 服务，模拟长时间无输出的模型调用
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from utils.helper.cancellation import CancelScope, atrack_response, set_current_scope
+
+# 等待连接关闭的上限（秒）
+CLOSE_WAIT_SECONDS = 2.0
+
+
+class HangingServer:
+    """返回首个数据块后不再输出，记录客户端何时关闭连接"""
+
+    def __init__(self):
+        self.closed = asyncio.Event()
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+            b"6\r\ndata: \r\n"
+        )
+        await writer.drain()
+        # 客户端关闭连接时读到 EOF
+        while await reader.read(1024):
+            pass
+        self.closed.set()
+        writer.close()
+
+
+async def _stream(client: httpx.AsyncClient, url: str, started: asyncio.Event):
+    async with client.stream("POST", url, json={"stream": True}) as response:
+        async for _ in response.aiter_bytes():
+            started.set()
+
+
+async def _run_case(cancel_task: bool) -> float:
+    """
+    producer 任务持有 CancelScope；cancel_task=True 时请求在 producer 内发起并取消 producer，
+    否则请求在子任务中发起（不随 producer 取消），只依赖 scope.set() 关闭连接
+    返回从超时到服务端观察到连接关闭的耗时
+    """
+    server = HangingServer()
+    url = await server.start()
+    scope = CancelScope()
+    started = asyncio.Event()
+    children = []
+
+    async def producer():
+        set_current_scope(scope)
+        if cancel_task:
+            await _stream(client, url, started)
+        else:
+            child = asyncio.create_task(_stream(client, url, started))
+            children.append(child)
+            await asyncio.shield(child)
+
+    async with httpx.AsyncClient(event_hooks={"response": [atrack_response]}) as client:
+        task = asyncio.create_task(producer())
+        await asyncio.wait_for(started.wait(), CLOSE_WAIT_SECONDS)
+        deadline = time.monotonic()
+        # 与 GraphService._astream_native 的超时回调一致：先 set 作用域，再取消 producer 任务
+        scope.set()
+        task.cancel()
+        await asyncio.wait_for(server.closed.wait(), CLOSE_WAIT_SECONDS)
+        elapsed = time.monotonic() - deadline
+        await asyncio.gather(task, *children, return_exceptions=True)
+    await server.stop()
+    return elapsed
+
+
+def test_cancelled_task_closes_request():
+    elapsed = asyncio.run(_run_case(cancel_task=True))
+    assert elapsed < CLOSE_WAIT_SECONDS
+
+
+def test_scope_closes_request_in_child_task():
+    elapsed = asyncio.run(_run_case(cancel_task=False))
+    assert elapsed < CLOSE_WAIT_SECONDS
+
+
+def main():
+    for name, case in (
+        ("取消 producer 任务", test_cancelled_task_closes_request),
+        ("子任务中的请求由 CancelScope 关闭", test_scope_closes_request_in_child_task),
+    ):
+        try:
+            case()
+            print(f"✅ {name}")
+        except (AssertionError, asyncio.TimeoutError):
+            print(f"❌ {name}: {CLOSE_WAIT_SECONDS}s 内连接未关闭")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+节点输入/输出日志的限长序列化
+- 常见情况（结果在 NODE_LOG_DATA_MAX_CHARS 以内）整体交给 C 实现的 json 编码器，一次完成
+- 粗略估算已明显超限、编码结果超限或含循环引用时，改为逐层遍历并直接拼接 JSON 片段：
+  输出长度达到上限时停止遍历，在截断处写入标记，输出仍是合法 JSON
+- 逐层遍历时，同一次运行内（一个 DataSerializer）按对象身份缓存不可变对象（长字符串、frozen 的 Pydantic 模型）
+  的编码结果；可变对象（dict/list、普通模型与自定义对象）可能被节点原地修改，始终重新遍历。
+  缓存按条数与总字符数设上限
+"""
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# 单条日志中 input/output 序列化结果的最大长度（字符），0 表示不限制
+NODE_LOG_DATA_MAX_CHARS = int(os.getenv("NODE_LOG_DATA_MAX_CHARS", "262144"))
+# 每次运行最多缓存的对象编码数
+NODE_LOG_MEMO_MAX_ENTRIES = int(os.getenv("NODE_LOG_MEMO_MAX_ENTRIES", "4096"))
+# 每次运行缓存的编码结果总字符数上限
+NODE_LOG_MEMO_MAX_CHARS = int(os.getenv("NODE_LOG_MEMO_MAX_CHARS", str(8 * 1024 * 1024)))
+# 字符串长度达到该值时才按身份缓存（短字符串直接编码更快）
+NODE_LOG_MEMO_MIN_STR_CHARS = 1024
+
+TRUNCATED_MARKER = "...[truncated]"
+_TRUNCATED_JSON = json.dumps(TRUNCATED_MARKER)
+_TRUNCATED_KEY = json.dumps("__truncated__")
+_CIRCULAR_JSON = json.dumps("<circular>")
+
+_encode_str = json.encoder.encode_basestring
+# 只含这些类型元素的小容器整体交给 C 实现的 json.dumps
+_SCALAR_TYPES = frozenset([str, int, float, bool, type(None)])
+_FAST_PATH_MAX_ITEMS = 256
+# 估算大小时每个容器最多查看的元素数（其余按已查看元素的平均值外推）与最大深度
+_ESTIMATE_SAMPLE_ITEMS = 16
+_ESTIMATE_MAX_DEPTH = 3
+
+
+class DataSerializer:
+    """有长度上限的 JSON 序列化器，一次运行内复用以共享对象编码缓存"""
+
+    def __init__(
+        self,
+        max_chars: int = NODE_LOG_DATA_MAX_CHARS,
+        memo_max_entries: int = NODE_LOG_MEMO_MAX_ENTRIES,
+        memo_max_chars: int = NODE_LOG_MEMO_MAX_CHARS,
+    ):
+        self.max_chars = max_chars
+        self.memo_max_entries = memo_max_entries
+        self.memo_max_chars = memo_max_chars
+        # id(obj) -> (obj, 编码结果)，持有 obj 引用防止 id 被复用
+        self._memo: Dict[int, Tuple[Any, str]] = {}
+        self._memo_chars = 0
+
+    def serialize(self, data: Any) -> str:
+        if self.max_chars <= 0 or _estimate_chars(data, self.max_chars) <= self.max_chars:
+            try:
+                encoded = _DUMP_ENCODER.encode(data)
+            except (TypeError, ValueError, RecursionError):
+                # 循环引用、非字符串键等：交给逐层遍历处理
+                encoded = None
+            if encoded is not None and (self.max_chars <= 0 or len(encoded) <= self.max_chars):
+                return encoded
+        state = _State(self.max_chars or -1)
+        self._write(data, state)
+        return "".join(state.parts)
+
+    def _write(self, item: Any, state: "_State"):
+        if state.exhausted:
+            return
+        if isinstance(item, str):
+            if len(item) >= NODE_LOG_MEMO_MIN_STR_CHARS:
+                self._write_memoized(item, state, self._write_str)
+            else:
+                self._write_str(item, state)
+        elif item is None or isinstance(item, (bool, int, float)):
+            state.emit(json.dumps(item))
+        elif isinstance(item, dict):
+            self._write_dict(item, state)
+        elif isinstance(item, (list, tuple)):
+            self._write_list(item, state)
+        elif isinstance(item, BaseModel):
+            self._write_memoized(
+                item, state, lambda obj, st: self._write_dump(obj.model_dump(), st),
+                memoize=bool(item.model_config.get("frozen")),
+            )
+        elif hasattr(item, '__dict__'):
+            self._write_memoized(item, state, lambda obj, st: self._write_dump(obj.__dict__, st), memoize=False)
+        else:
+            self._write_str(str(item), state)
+
+    def _write_str(self, item: str, state: "_State"):
+        if 0 <= state.remaining < len(item) + 2:
+            # 长字符串只保留预算内的前缀
+            state.emit(_encode_str(item[:max(state.remaining - len(TRUNCATED_MARKER) - 2, 0)] + TRUNCATED_MARKER))
+            state.exhausted = True
+            return
+        state.emit(_encode_str(item))
+
+    def _write_memoized(self, item: Any, state: "_State", write, memoize: bool = True):
+        key = id(item)
+        cached = self._memo.get(key) if memoize else None
+        if cached is not None and cached[0] is item:
+            if 0 <= state.remaining < len(cached[1]):
+                state.emit(_TRUNCATED_JSON)
+                state.exhausted = True
+            else:
+                state.emit(cached[1])
+            return
+        if key in state.active:
+            state.emit(_CIRCULAR_JSON)
+            return
+        start = len(state.parts)
+        state.active.add(key)
+        try:
+            write(item, state)
+        finally:
+            state.active.discard(key)
+        if memoize and not state.exhausted and len(self._memo) < self.memo_max_entries:
+            encoded = "".join(state.parts[start:])
+            if self._memo_chars + len(encoded) <= self.memo_max_chars:
+                self._memo[key] = (item, encoded)
+                self._memo_chars += len(encoded)
+
+    def _write_dump(self, data: Any, state: "_State"):
+        # 模型/对象的 dump 每次都要重新编码：先整体交给 C 实现的 json.dumps，
+        # 超出剩余预算或含循环引用时再逐层遍历（截断/循环标记与遍历结果一致）
+        if state.remaining != 0:
+            try:
+                encoded = _DUMP_ENCODER.encode(data)
+            except (TypeError, ValueError, RecursionError):
+                encoded = None
+            if encoded is not None and not 0 <= state.remaining < len(encoded):
+                state.emit(encoded)
+                return
+        self._write(data, state)
+
+    def _write_scalars(self, item: Any, values, state: "_State") -> bool:
+        if len(item) > _FAST_PATH_MAX_ITEMS or not all(type(value) in _SCALAR_TYPES for value in values):
+            return False
+        try:
+            encoded = json.dumps(item, ensure_ascii=False)
+        except TypeError:
+            # 非字符串/数字键，逐项处理
+            return False
+        if 0 <= state.remaining < len(encoded):
+            return False
+        state.emit(encoded)
+        return True
+
+    def _write_dict(self, item: dict, state: "_State"):
+        if self._write_scalars(item, item.values(), state):
+            return
+        key = id(item)
+        if key in state.active:
+            state.emit(_CIRCULAR_JSON)
+            return
+        state.active.add(key)
+        state.emit("{")
+        first = True
+        for name, value in item.items():
+            if state.remaining == 0 or state.exhausted:
+                state.emit(("" if first else ", ") + _TRUNCATED_KEY + ": true")
+                state.exhausted = True
+                break
+            state.emit(("" if first else ", ") + _encode_str(_key_str(name)) + ": ")
+            first = False
+            self._write(value, state)
+        state.emit("}")
+        state.active.discard(key)
+
+    def _write_list(self, item: Any, state: "_State"):
+        if self._write_scalars(item, item, state):
+            return
+        key = id(item)
+        if key in state.active:
+            state.emit(_CIRCULAR_JSON)
+            return
+        state.active.add(key)
+        state.emit("[")
+        first = True
+        for value in item:
+            if state.remaining == 0 or state.exhausted:
+                state.emit(("" if first else ", ") + _TRUNCATED_JSON)
+                state.exhausted = True
+                break
+            if not first:
+                state.emit(", ")
+            first = False
+            self._write(value, state)
+        state.emit("]")
+        state.active.discard(key)
+
+
+class _State:
+    """一次 serialize 调用的输出缓冲与剩余预算（remaining 为 -1 表示不限制）"""
+
+    __slots__ = ("parts", "remaining", "exhausted", "active")
+
+    def __init__(self, budget: int):
+        self.parts: List[str] = []
+        self.remaining = budget
+        self.exhausted = False
+        self.active: set = set()
+
+    def emit(self, chunk: str):
+        self.parts.append(chunk)
+        if self.remaining >= 0:
+            self.remaining = max(self.remaining - len(chunk), 0)
+
+
+def _json_default(obj: Any) -> Any:
+    # 与 DataSerializer._write 对嵌套对象的处理一致
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    return str(obj)
+
+
+_DUMP_ENCODER = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+
+
+def _estimate_chars(item: Any, limit: int, depth: int = 0) -> int:
+    """
+    粗略估算编码后的长度，只用于判断是否明显超过上限：大容器抽样外推，
+    模型与自定义对象及过深的层级按固定值计（偏低估，超限时仍会由编码结果兜底）
+    """
+    if isinstance(item, str):
+        return len(item) + 2
+    if item is None or isinstance(item, (bool, int, float)):
+        return 4
+    if depth >= _ESTIMATE_MAX_DEPTH:
+        return 16
+    if isinstance(item, dict):
+        values = item.items()
+    elif isinstance(item, (list, tuple)):
+        values = item
+    else:
+        return 64
+    count = len(item)
+    total = 0
+    sampled = 0
+    for value in values:
+        if sampled >= _ESTIMATE_SAMPLE_ITEMS:
+            break
+        if isinstance(item, dict):
+            key, value = value
+            total += len(str(key)) + 4
+        total += _estimate_chars(value, limit, depth + 1) + 2
+        sampled += 1
+        if total > limit:
+            return total
+    if sampled and count > sampled:
+        total = total * count // sampled
+    return total + 2
+
+
+def _key_str(key: Any) -> str:
+    # 与 json.dumps 一致：bool/None/数字键转为 JSON 字面量
+    if isinstance(key, str):
+        return key
+    if key is True or key is False or key is None:
+        return json.dumps(key)
+    return str(key)
+
+
+def serialize_data(data: Any, serializer: Optional[DataSerializer] = None) -> str:
+    return (serializer or DataSerializer()).serialize(data)
@@ -0,0 +1,175 @@
+"""
+节点日志的后台批量写入
+write_log 在请求线程上只做入队（deque.append，无锁），由后台线程批量序列化并写入：
+- 日志文件句柄常驻，不再每条日志 open/close；每批写入前比较路径与句柄的 st_dev/st_ino，
+  文件被 RotatingFileHandler（setup_logging 对同一 LOG_FILE 轮转）或外部工具轮转后重新打开
+- 组提交：每批写入后 flush，fsync 按 NODE_LOG_FSYNC_INTERVAL_MS 毫秒或 NODE_LOG_FSYNC_RECORDS 条触发
+- 队列超过 NODE_LOG_QUEUE_MAX 时丢弃新日志并计数，请求线程永不阻塞
+- 进程退出（atexit）或服务关闭时 close() 排空队列并 fsync
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Any, Dict
+
+# 两次 fsync 的最长间隔（毫秒），0 表示每批都 fsync
+NODE_LOG_FSYNC_INTERVAL_MS = int(os.getenv("NODE_LOG_FSYNC_INTERVAL_MS", "200"))
+# 累计写入多少条后立即 fsync
+NODE_LOG_FSYNC_RECORDS = int(os.getenv("NODE_LOG_FSYNC_RECORDS", "256"))
+# 是否 fsync（0 时只 flush 到操作系统缓存）
+NODE_LOG_FSYNC_ENABLED = os.getenv("NODE_LOG_FSYNC_ENABLED", "1") == "1"
+# 队列上限，超出后丢弃
+NODE_LOG_QUEUE_MAX = int(os.getenv("NODE_LOG_QUEUE_MAX", "100000"))
+
+
+def _dumps(entry: Any) -> str:
+    try:
+        return json.dumps(entry, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BatchedLogWriter:
+    """单文件的后台批量写入器"""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._queue: deque = deque()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = None
+        self._closed = False
+        self._dropped = 0
+        self._written = 0
+
+    def _ensure_started(self):
+        # fork 出的子进程不继承写入线程，按 pid 重新启动
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = deque()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="node-log-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, entry: Dict[str, Any]) -> bool:
+        """入队一条日志（字典，后台序列化），不阻塞；队列已满或已关闭时丢弃并返回 False"""
+        if self._closed:
+            return False
+        self._ensure_started()
+        if len(self._queue) >= NODE_LOG_QUEUE_MAX:
+            self._dropped += 1
+            return False
+        self._queue.append(entry)
+        if len(self._queue) >= NODE_LOG_FSYNC_RECORDS:
+            self._wakeup.set()
+        return True
+
+    def _drain(self) -> list:
+        queue = self._queue
+        batch = []
+        try:
+            while True:
+                batch.append(queue.popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def _open(self):
+        return open(self._path, 'a', encoding='utf-8')
+
+    def _rotated(self, f) -> bool:
+        """路径已指向另一个文件（或已被移走）时返回 True"""
+        try:
+            path_stat = os.stat(self._path)
+        except FileNotFoundError:
+            return True
+        file_stat = os.fstat(f.fileno())
+        return (path_stat.st_dev, path_stat.st_ino) != (file_stat.st_dev, file_stat.st_ino)
+
+    def _run(self):
+        f = None
+        pending_sync = 0
+        last_sync = time.monotonic()
+        interval = NODE_LOG_FSYNC_INTERVAL_MS / 1000
+        while True:
+            self._wakeup.wait(interval or 0.05)
+            self._wakeup.clear()
+            stopping = self._closed
+            batch = self._drain()
+            if batch:
+                try:
+                    if f is not None and self._rotated(f):
+                        f.close()
+                        f = None
+                    if f is None:
+                        f = self._open()
+                    f.write("".join(_dumps(entry) + "\n" for entry in batch))
+                    f.flush()
+                    self._written += len(batch)
+                    pending_sync += len(batch)
+                except Exception as e:
+                    print(f"Failed to write log batch ({len(batch)} records): {e}", flush=True)
+                    if f is not None:
+                        try:
+                            f.close()
+                        except Exception:
+                            pass
+                    f = None
+
+            now = time.monotonic()
+            if f is not None and pending_sync and NODE_LOG_FSYNC_ENABLED and (
+                stopping or pending_sync >= NODE_LOG_FSYNC_RECORDS or now - last_sync >= interval
+            ):
+                try:
+                    os.fsync(f.fileno())
+                except OSError as e:
+                    print(f"Failed to fsync log file: {e}", flush=True)
+                pending_sync = 0
+                last_sync = now
+
+            if stopping and not self._queue:
+                if f is not None:
+                    f.close()
+                return
+
+    def close(self, timeout: float = 5.0):
+        """停止接收新日志，排空队列并 fsync 后关闭文件"""
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            self._wakeup.set()
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": len(self._queue), "written": self._written, "dropped": self._dropped}
+
+
+_writers: Dict[str, BatchedLogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(path: str) -> BatchedLogWriter:
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = BatchedLogWriter(path)
+                _writers[path] = writer
+    return writer
+
+
+def close_log_writers(timeout: float = 5.0):
+    """排空并关闭全部写入器（服务关闭 / 进程退出时调用）"""
+    for writer in list(_writers.values()):
+        writer.close(timeout)
+
+
+atexit.register(close_log_writers)
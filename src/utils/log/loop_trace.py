@@ -1,15 +1,32 @@
 import os
+import time
+import atexit
+import random
+import logging
+import threading
 import cozeloop
 from cozeloop.integration.langchain.trace_callback import LoopTracer
 from langchain_core.runnables import RunnableConfig
-from utils.log.common import get_execute_mode
-from utils.log.node_log import Logger
+from utils.log.common import get_execute_mode, is_prod
+from utils.log.node_log import Logger, TokenMetricsHandler
+from utils.helper.metrics import METRICS_ENABLED, METRICS_UNSAMPLED_RUNS
+
+logger = logging.getLogger(__name__)
 
 space_id = os.getenv("COZE_PROJECT_SPACE_ID", "YOUR_SPACE_ID")
 api_token = os.getenv("COZE_LOOP_API_TOKEN", "YOUR_LOOP_API_TOKEN")
 base_url = os.getenv("COZE_LOOP_BASE_URL", "https://api.coze.cn")
 commit_hash = os.getenv("COZE_PROJECT_COMMIT_HASH","") # 发布版本的hash值
 
+# 追踪级别：full 按采样率追踪，error 只上报失败的运行，off 关闭
+TRACE_LEVEL = os.getenv("TRACE_LEVEL", "full")
+# 线上运行的头部采样率（0~1），试运行始终全量追踪
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+# 按项目覆盖采样率，格式 "project_id=rate,project_id=rate"
+TRACE_SAMPLE_RATE_OVERRIDES = os.getenv("TRACE_SAMPLE_RATE_OVERRIDES", "")
+# 后台 flush 的最短间隔（毫秒），期间多次请求合并为一次 flush
+TRACE_FLUSH_INTERVAL_MS = int(os.getenv("TRACE_FLUSH_INTERVAL_MS", "200"))
+
 cozeloopTracer = cozeloop.new_client(
     workspace_id=space_id,
     api_token=api_token,
@@ -18,48 +35,163 @@ cozeloopTracer = cozeloop.new_client(
 cozeloop.set_default_client(cozeloopTracer)
 
 
+def _parse_overrides(raw: str) -> dict:
+    overrides = {}
+    for item in raw.split(","):
+        project_id, sep, rate = item.partition("=")
+        if not sep:
+            continue
+        try:
+            overrides[project_id.strip()] = float(rate)
+        except ValueError:
+            logger.warning(f"Invalid TRACE_SAMPLE_RATE_OVERRIDES entry: {item}")
+    return overrides
+
+
+_sample_rate_overrides = _parse_overrides(TRACE_SAMPLE_RATE_OVERRIDES)
+
+
+def should_sample(ctx) -> bool:
+    """头部采样：运行开始时决定是否安装追踪回调"""
+    if TRACE_LEVEL != "full":
+        return False
+    if not is_prod():
+        return True
+    rate = _sample_rate_overrides.get(ctx.project_id or "", TRACE_SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
+
+def is_sampled(run_config: RunnableConfig) -> bool:
+    # 指标用的 Logger / TokenMetricsHandler 不算追踪回调
+    return bool(run_config) and any(
+        not isinstance(cb, (Logger, TokenMetricsHandler)) for cb in run_config.get("callbacks") or []
+    )
+
+
+def _trace_tags(ctx) -> dict:
+    return {
+        "project_id": ctx.project_id,
+        "execute_mode": get_execute_mode(),
+        "log_id": ctx.logid,
+        "commit_hash": commit_hash,
+    }
+
+
 def init_run_config(graph, ctx):
-    tracer = Logger(graph, ctx)
+    sampled = should_sample(ctx)
+    # 节点日志只在试运行写入（见 node_log.write_log），与追踪采样无关；线上的 Logger 只采集指标并为追踪提供节点标签
+    write_logs = not is_prod()
+    # 基于回调的节点指标默认只采集采样的运行
+    collect_metrics = METRICS_ENABLED and (sampled or METRICS_UNSAMPLED_RUNS)
+    if not sampled and not write_logs and not collect_metrics:
+        # 未采样的运行不安装任何回调，失败时由 trace_error 补报
+        return RunnableConfig(callbacks=[])
+    tracer = Logger(graph, ctx, write_logs=write_logs)
     tracer.on_chain_start = tracer.on_chain_start_graph  # 非必须
     tracer.on_chain_end = tracer.on_chain_end_graph
-    trace_callback_handler = LoopTracer.get_callback_handler(
-        cozeloopTracer,
-        add_tags_fn=tracer.get_node_tags,
-        modify_name_fn=tracer.get_node_name,
-        tags={
-            "project_id": ctx.project_id,
-            "execute_mode": get_execute_mode(),
-            "log_id": ctx.logid,
-            "commit_hash": commit_hash,
-        }
-    )
+    callbacks = []
+    if tracer.write_logs or collect_metrics:
+        callbacks.append(tracer)
+    if sampled:
+        callbacks.append(LoopTracer.get_callback_handler(
+            cozeloopTracer,
+            add_tags_fn=tracer.get_node_tags,
+            modify_name_fn=tracer.get_node_name,
+            tags=_trace_tags(ctx)
+        ))
     config = RunnableConfig(
-        callbacks=[
-            tracer,
-            trace_callback_handler
-        ],
+        callbacks=callbacks,
     )
     return config
 
 
 def init_agent_config(graph, ctx):
-    config = RunnableConfig(
-        callbacks=[
+    callbacks = []
+    if METRICS_ENABLED:
+        # 只处理 on_llm_end 的轻量回调，未采样的运行也采集 token 用量
+        callbacks.append(TokenMetricsHandler())
+    if should_sample(ctx):
+        callbacks.append(
             LoopTracer.get_callback_handler(
                 cozeloopTracer,
-                tags={
-                    "project_id": ctx.project_id,
-                    "execute_mode": get_execute_mode(),
-                    "log_id": ctx.logid,
-                    "commit_hash": commit_hash,
-                }
+                tags=_trace_tags(ctx)
                 )
-        ]
+        )
+    config = RunnableConfig(
+        callbacks=callbacks,
     )
-    print("config", config)
     return config
 
 
+def trace_error(run_config: RunnableConfig, ctx, error: BaseException, name: str = "Workflow"):
+    """
+    失败的运行始终上报：已采样的运行由回调记录，未采样的运行在这里补一个错误 span
+    """
+    if TRACE_LEVEL == "off" or is_sampled(run_config):
+        return
+    try:
+        span = cozeloopTracer.start_span(name, "error")
+        span.set_tags({**_trace_tags(ctx), "run_id": ctx.run_id, "sampled": "false"})
+        span.set_error(error)
+        span.finish()
+    except Exception as e:
+        logger.warning(f"Failed to trace error for run {ctx.run_id}: {e}")
+    schedule_flush()
+
+
+class _TraceFlusher:
+    """后台线程执行 cozeloop.flush()，请求结束时只做一次 Event.set"""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._pending = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = None
+
+    def schedule(self):
+        # fork 出的子进程不继承 flush 线程，按 pid 重新启动
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="trace-flusher", daemon=True)
+                    self._thread.start()
+        self._pending.set()
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            self.flush()
+            # 间隔内到达的 flush 请求合并到下一轮
+            time.sleep(self._interval)
+
+    @staticmethod
+    def flush():
+        try:
+            cozeloop.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush traces: {e}")
+
+
+_flusher = _TraceFlusher(TRACE_FLUSH_INTERVAL_MS / 1000)
+
+
+def schedule_flush():
+    """请求结束时调用：异步 flush 追踪数据，不阻塞请求"""
+    if TRACE_LEVEL != "off":
+        _flusher.schedule()
+
+
+def flush_traces():
+    """服务关闭 / 进程退出时同步 flush"""
+    _flusher.flush()
+
+
+atexit.register(flush_traces)
+
+
 # 保留add_trace_tags函数，作为对trace.set_tags的简单包装
 def add_trace_tags(trace, tags):
     """
@@ -12,7 +12,10 @@ import sys
 import json
 from typing import Dict, Optional, Any
 from pydantic import BaseModel
-from utils.log.parser import LangGraphParser
+from utils.log.parser import get_graph_parser
+from utils.log.log_writer import get_log_writer
+from utils.log.data_serializer import DataSerializer, serialize_data
+from utils.helper.metrics import node_duration, node_errors, llm_tokens
 import asyncio
 
 
@@ -49,51 +52,27 @@ logging.basicConfig(
     ]
 )
 
-# 获取logger实例（仅用于控制台输出）
+# 获取logger实例
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# 节点日志文件的后台批量写入器
+_log_writer = get_log_writer(LOG_FILE)
+
 
 def write_log(log_entry):
     """
-    直接使用文件操作写入JSON格式日志，确保立即刷新到磁盘
-    :param log_entry: 符合要求格式的日志字典
+    写入JSON格式日志：只入队，由后台线程批量写入 LOG_FILE 并按策略 fsync（见 log_writer）
+    :param log_entry: 符合要求格式的日志字典（入队后不要再修改）
     """
     try:
         if is_prod():
             #  线上不打日志，待具备清理能后再打
             return None
-        log_json = json.dumps(log_entry, ensure_ascii=False)
-
-        # 修改为行缓冲模式（buffering=1）而不是无缓冲模式
-        with open(LOG_FILE, 'a', encoding='utf-8', buffering=1) as f:  # 行缓冲模式
-            f.write(log_json + '\n')
-            # 显式调用flush和fsync确保数据写入磁盘
-            f.flush()
-            os.fsync(f.fileno())
-
-        # 同时输出到控制台以便调试
-        level = log_entry.get('level', 'info').lower()
-        log_method = getattr(logger, level, logger.info)
-        log_method(log_entry.get('message', ''))
-
+        _log_writer.write(log_entry)
     except Exception as e:
         # 如果写入失败，打印到标准错误
         print(f"Failed to write log: {e}", flush=True)
-        # 尝试再次写入作为备选
-        try:
-            log_json = json.dumps(log_entry, ensure_ascii=False)
-            print(f"Attempting fallback write: {log_json}", flush=True)
-            # 修改备选方案为行缓冲模式
-            f = open(LOG_FILE, 'a', encoding='utf-8', buffering=1)
-            try:
-                f.write(log_json + '\n')
-                f.flush()
-                os.fsync(f.fileno())
-            finally:
-                f.close()
-        except Exception as fallback_e:
-            print(f"Fallback log write failed: {fallback_e}", flush=True)
 
 
 def create_log_entry(level="info", message="", timestamp=None, log_id=None, latency=0,
@@ -191,7 +170,8 @@ def log_workflow_start(project_id, commit_id, log_id=None, execute_id="", input_
 
 
 def log_workflow_end(execution_id, output=None, total_time=None, status="success", token_consumed=None,
-                     error_reason=None, error_code=None, is_test_run=False, log_id="", method=""):
+                     error_reason=None, error_code=None, is_test_run=False, log_id="", method="",
+                     serializer: Optional[DataSerializer] = None):
     """
     记录流程结束日志
     :param execution_id: 执行唯一ID
@@ -202,6 +182,7 @@ def log_workflow_end(execution_id, output=None, total_time=None, status="success
     :param error_reason: 错误原因
     :param error_code: 错误码
     :param is_test_run: 是否试运行
+    :param serializer: 运行级序列化器（复用对象编码缓存）
     """
     level = "error" if status == "error" else "info"
     execute_mode = "test_run" if is_test_run else "run"
@@ -214,7 +195,7 @@ def log_workflow_end(execution_id, output=None, total_time=None, status="success
         level=level,
         message=message,
         latency=int(total_time * 1000) if total_time else 0,
-        output_data=_serialize_data(output),
+        output_data=_serialize_data(output, serializer),
         execute_mode=execute_mode,
         event_type="test_run_done" if is_test_run else "done",
         token=str(token_consumed) if token_consumed else "",
@@ -229,12 +210,17 @@ def log_workflow_end(execution_id, output=None, total_time=None, status="success
 
 
 class Logger(BaseCallbackHandler):
-    def __init__(self, graph, ctx: Context):
+    def __init__(self, graph, ctx: Context, write_logs: bool = True):
         self.root_run_id = None
         self.graph = graph
         self.runtime_ctx = ctx
         self.start_time = time.time()
-        self.parser = LangGraphParser(graph)
+        self.parser = get_graph_parser(graph)
+        # 本次运行内共享的序列化器（对象编码缓存）
+        self.serializer = DataSerializer()
+        # 为 False 时只采集指标（节点耗时、token、失败数），不写节点日志
+        self.write_logs = write_logs
+        self._node_started: Dict[uuid.UUID, float] = {}
 
     run_id_map: Dict[uuid.UUID, str] = {}
 
@@ -255,6 +241,10 @@ class Logger(BaseCallbackHandler):
         node_name: str | None = node_name_value if isinstance(node_name_value, str) else None
         if node_name:
             self.run_id_map[run_id] = node_name
+            if node_name in self.parser.nodes or node_name in self.parser.condition_funcs:
+                self._node_started[run_id] = time.perf_counter()
+        if not self.write_logs:
+            return
         if parent_run_id is None:
             self._on_graph_start(inputs)  # workflow 开始
         node_info = self.parser.nodes.get(node_name) if node_name is not None else None
@@ -265,7 +255,7 @@ class Logger(BaseCallbackHandler):
                 log_entry = create_log_entry(
                     level="info",
                     message=f"Condition node '{node_name}' started",
-                    input_data=_serialize_data(inputs),
+                    input_data=_serialize_data(inputs, self.serializer),
                     node_name=self.parser.condition_funcs[node_name]["cond_node_name"],  # 前端的条件节点名
                     execution_id=self.runtime_ctx.run_id,
                     execute_mode=get_execute_mode(),
@@ -281,7 +271,7 @@ class Logger(BaseCallbackHandler):
         log_entry = create_log_entry(
             level="info",
             message=f"Node '{node_info.name}' started",
-            input_data=_serialize_data(inputs),
+            input_data=_serialize_data(inputs, self.serializer),
             node_id=node_info.node_id,
             node_type=node_info.node_type,
             node_title=node_info.title,
@@ -303,6 +293,11 @@ class Logger(BaseCallbackHandler):
             **kwargs: Any,
     ) -> Any:
         node_name = self.run_id_map.pop(run_id, None)
+        started = self._node_started.pop(run_id, None)
+        if started is not None:
+            node_duration.observe(time.perf_counter() - started, node_name)
+        if not self.write_logs:
+            return
         if parent_run_id is None:  # 根节点
             self._on_graph_end(outputs)
         elif node_name:
@@ -315,7 +310,7 @@ class Logger(BaseCallbackHandler):
                     log_entry = create_log_entry(
                         level="info",
                         message=f"Condition node '{node_name}' ended",
-                        output_data=_serialize_data(outputs),
+                        output_data=_serialize_data(outputs, self.serializer),
                         node_name=self.parser.condition_funcs[node_name]["cond_node_name"],  # 前端的条件节点名
                         execution_id=self.runtime_ctx.run_id,
                         execute_mode=get_execute_mode(),
@@ -331,7 +326,7 @@ class Logger(BaseCallbackHandler):
             log_entry = create_log_entry(
                 level="info",
                 message=f"Node '{node_info.name}' ended",
-                output_data=_serialize_data(outputs),
+                output_data=_serialize_data(outputs, self.serializer),
                 node_id=node_info.node_id,  # 注册的时候使用的function name，前端用来流转
                 node_type=node_info.node_type,
                 node_title=node_info.title,
@@ -353,7 +348,7 @@ class Logger(BaseCallbackHandler):
             commit_id=commit_id,
             log_id=str(self.runtime_ctx.logid),
             execute_id=self.runtime_ctx.run_id,
-            input_data=_serialize_data(inputs),
+            input_data=_serialize_data(inputs, self.serializer),
             method=self.runtime_ctx.method,
         )
 
@@ -368,6 +363,7 @@ class Logger(BaseCallbackHandler):
             log_id=self.runtime_ctx.logid,
             is_test_run=not is_prod(),
             method=self.runtime_ctx.method,
+            serializer=self.serializer,
         )
 
     def on_chain_error(
@@ -386,6 +382,13 @@ class Logger(BaseCallbackHandler):
             event_type = "cancel"
         # 记录节点失败日志
         node_name = self.run_id_map.pop(run_id, "")
+        started = self._node_started.pop(run_id, None)
+        if started is not None:
+            node_duration.observe(time.perf_counter() - started, node_name)
+            if event_type == "error":
+                node_errors.inc(node_name)
+        if not self.write_logs:
+            return
         # Node end
         node_id = ""
         node_title = ""
@@ -413,6 +416,9 @@ class Logger(BaseCallbackHandler):
         )
         write_log(error_log_entry)
 
+    def on_llm_end(self, response: Any, **kwargs: Any) -> Any:
+        _record_token_usage(response)
+
     def get_node_tags(self, node_name: str) -> dict[str, str]:
         node_tags = {}
         if node_name is None or node_name == "":
@@ -440,42 +446,52 @@ class Logger(BaseCallbackHandler):
         return node_title
 
 
-def _serialize_data(data: Any) -> str:
-    """
-    增强版数据序列化函数，支持：
-    - Pydantic BaseModel
-    - 字典/列表等基础类型
-    - 自定义对象（通过 __dict__ 序列化）
-    - 特殊字符（保证 ASCII 编码）
-    """
+class TokenMetricsHandler(BaseCallbackHandler):
+    """只采集 token 用量的轻量回调（Agent 运行未采样时使用），链/工具等其他事件由回调管理器直接跳过"""
+
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+    ignore_retry = True
+    ignore_custom_event = True
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> Any:
+        _record_token_usage(response)
 
-    def _recursive_serialize(item: Any):
-        """递归序列化单个元素"""
-        # 处理 Pydantic 模型
-        if isinstance(item, BaseModel):
-            return item.model_dump()  # 先转字典再序列化
 
-        # 处理列表/元组
-        elif isinstance(item, (list, tuple)):
-            return [_recursive_serialize(sub_item) for sub_item in item]
+def _record_token_usage(response: Any):
+    prompt_tokens, completion_tokens = _token_usage(response)
+    if prompt_tokens:
+        llm_tokens.inc("prompt", amount=prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc("completion", amount=completion_tokens)
 
-        # 处理字典
-        elif isinstance(item, dict):
-            return {key: _recursive_serialize(value) for key, value in item.items()}
 
-        # 处理自定义对象（有 __dict__ 属性的）
-        elif hasattr(item, '__dict__') and not isinstance(item, (str, int, float, bool, type(None))):
-            return _recursive_serialize(item.__dict__)
+def _token_usage(response: Any) -> tuple:
+    """从 LLMResult 提取 (prompt_tokens, completion_tokens)：优先 llm_output，流式调用时取消息的 usage_metadata"""
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage_metadata.get("input_tokens") or 0
+            completion_tokens += usage_metadata.get("output_tokens") or 0
+    return prompt_tokens, completion_tokens
 
-        # 基础类型直接返回
-        else:
-            return item
 
+def _serialize_data(data: Any, serializer: Optional[DataSerializer] = None) -> str:
+    """
+    数据序列化函数（utils.log.data_serializer），支持：
+    - Pydantic BaseModel
+    - 字典/列表等基础类型
+    - 自定义对象（通过 __dict__ 序列化）
+    - 特殊字符（不转义非 ASCII 字符）
+    超过 NODE_LOG_DATA_MAX_CHARS 时截断并写入标记；传入运行级 serializer 时复用对象编码缓存
+    """
     try:
-        # 先递归处理数据为可序列化的基础类型
-        serialized_data = _recursive_serialize(data)
-        # 最终序列化为 JSON 字符串
-        return json.dumps(serialized_data, ensure_ascii=False, indent=None)
+        return serialize_data(data, serializer)
 
     except Exception as e:
         logger.error(f"Error serializing data: {e}", exc_info=True)
@@ -1,4 +1,5 @@
 import inspect
+import threading
 from dataclasses import dataclass
 from typing import Dict, Optional, Any, Callable, cast
 from langgraph.graph.state import CompiledStateGraph
@@ -73,6 +74,24 @@ class NodeInfo:
     node_type: str = ""
 
 
+# 解析结果缓存在图对象的该属性上，构建后只读，同一个图的所有运行共用；
+# 解析结果引用图（graph_app），挂在图上只形成可回收的循环引用，图释放时一并释放
+_PARSER_ATTR = "_log_graph_parser"
+_parser_cache_lock = threading.Lock()
+
+
+def get_graph_parser(app: CompiledStateGraph) -> "LangGraphParser":
+    """获取图的解析结果（按图对象缓存），避免每次运行重新 get_graph() 并遍历节点"""
+    parser = getattr(app, _PARSER_ATTR, None)
+    if parser is None:
+        with _parser_cache_lock:
+            parser = getattr(app, _PARSER_ATTR, None)
+            if parser is None:
+                parser = LangGraphParser(app)
+                setattr(app, _PARSER_ATTR, parser)
+    return parser
+
+
 class LangGraphParser:
     def __init__(self, app: CompiledStateGraph):
         # 从LangGraph中获取图结构
@@ -2,6 +2,10 @@ import logging
 import logging.handlers
 import json
 import os
+import copy
+import time
+import queue
+import atexit
 from contextvars import ContextVar
 from typing import Optional
 from pathlib import Path
@@ -11,27 +15,68 @@ from utils.log.config import LOG_DIR
 
 request_context: ContextVar[Optional[Context]] = ContextVar('request_context', default=None)
 
+# 日志 JSON 序列化后端：orjson / json
+LOG_JSON_BACKEND = os.getenv("LOG_JSON_BACKEND", "orjson")
+# 是否通过 QueueHandler/QueueListener 在后台线程写日志
+LOG_QUEUE_ENABLED = os.getenv("LOG_QUEUE_ENABLED", "1") == "1"
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+
+def _dumps(log_data: dict) -> str:
+    if orjson is not None and LOG_JSON_BACKEND == "orjson":
+        try:
+            return orjson.dumps(log_data, default=str).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(log_data, ensure_ascii=False, default=str)
+
+
+# 日志记录中由 logging 自身或 ContextFilter 写入、不作为额外字段输出的键
+_RESERVED_KEYS = frozenset([
+    'name', 'msg', 'args', 'created', 'filename', 'funcName',
+    'levelname', 'levelno', 'lineno', 'module', 'msecs',
+    'message', 'pathname', 'process', 'processName', 'relativeCreated',
+    'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
+    'log_id', 'run_id', 'space_id', 'project_id', 'method',
+    'x_tt_env', 'rpc_persist_rec_rec_biz_scene',
+    'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
+    'rpc_persist_rec_root_entity_id',
+])
+
+_CONTEXT_KEYS = ('log_id', 'run_id', 'space_id', 'project_id', 'method', 'x_tt_env')
+
+_EMPTY_CONTEXT_FIELDS = {key: '' for key in _CONTEXT_KEYS}
+
+# (Context, 字段) —— 同一请求上下文内只从 Context 取一次字段
+_context_fields: ContextVar[Optional[tuple]] = ContextVar('log_context_fields', default=None)
+
+
+def _fields_for(ctx: Optional[Context]) -> dict:
+    if ctx is None:
+        return _EMPTY_CONTEXT_FIELDS
+    cached = _context_fields.get()
+    if cached is not None and cached[0] is ctx:
+        return cached[1]
+    fields = {
+        'log_id': ctx.logid or '',
+        'run_id': ctx.run_id or '',
+        'space_id': ctx.space_id or '',
+        'project_id': ctx.project_id or '',
+        'method': ctx.method or '',
+        'x_tt_env': ctx.x_tt_env or '',
+    }
+    _context_fields.set((ctx, fields))
+    return fields
+
 
 class ContextFilter(logging.Filter):
     
     def filter(self, record: logging.LogRecord) -> bool:
-        ctx = request_context.get()
-        
-        if ctx:
-            record.log_id = ctx.logid or ''
-            record.run_id = ctx.run_id or ''
-            record.space_id = ctx.space_id or ''
-            record.project_id = ctx.project_id or ''
-            record.method = ctx.method or ''
-            record.x_tt_env = ctx.x_tt_env or ''
-        else:
-            record.log_id = ''
-            record.run_id = ''
-            record.space_id = ''
-            record.project_id = ''
-            record.method = ''
-            record.x_tt_env = ''
-        
+        record.__dict__.update(_fields_for(request_context.get()))
         return True
 
 
@@ -45,74 +90,87 @@ class APSchedulerFilter(logging.Filter):
         return True
 
 
-class JsonFormatter(logging.Formatter):
-    
+class _StructuredFormatter(logging.Formatter):
+    """输出 JSON 行：固定字段 + 日志记录上的额外字段"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (秒, 格式化后的时间)，同一秒内的记录复用 strftime 结果
+        self._time_cache: Optional[tuple] = None
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        second = int(record.created)
+        cached = self._time_cache
+        if cached is None or cached[0] != second:
+            cached = (second, time.strftime(datefmt or self.default_time_format, self.converter(record.created)))
+            self._time_cache = cached
+        if datefmt:
+            return cached[1]
+        return self.default_msec_format % (cached[1], record.msecs)
+
     def format(self, record: logging.LogRecord) -> str:
+        fields = record.__dict__
         log_data = {
             'message': record.getMessage(),
             'timestamp': self.formatTime(record, self.datefmt),
             'level': record.levelname,
             'logger': record.name,
-            'log_id': getattr(record, 'log_id', ''),
-            'run_id': getattr(record, 'run_id', ''),
-            'space_id': getattr(record, 'space_id', ''),
-            'project_id': getattr(record, 'project_id', ''),
-            'method': getattr(record, 'method', ''),
-            'x_tt_env': getattr(record, 'x_tt_env', ''),
+            'log_id': fields.get('log_id', ''),
+            'run_id': fields.get('run_id', ''),
+            'space_id': fields.get('space_id', ''),
+            'project_id': fields.get('project_id', ''),
+            'method': fields.get('method', ''),
+            'x_tt_env': fields.get('x_tt_env', ''),
             'lineno': record.lineno,
             'funcName': record.funcName,
         }
 
         if record.exc_info:
             log_data['exc_info'] = self.formatException(record.exc_info)
-        
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName', 
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs', 
-                          'message', 'pathname', 'process', 'processName', 'relativeCreated',
-                          'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
-                          'log_id', 'run_id', 'space_id', 'project_id', 'method',
-                          'x_tt_env', 'rpc_persist_rec_rec_biz_scene', 
-                          'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
-                          'rpc_persist_rec_root_entity_id']:
+        elif record.exc_text:
+            # 经 QueueHandler 转发的记录，异常已在调用线程中格式化
+            log_data['exc_info'] = record.exc_text
+
+        for key, value in fields.items():
+            if key not in _RESERVED_KEYS:
                 log_data[key] = value
-        
-        return json.dumps(log_data, ensure_ascii=False)
 
+        return _dumps(log_data)
 
-class PlainTextFormatter(logging.Formatter):
-    
-    def format(self, record: logging.LogRecord) -> str:
-        log_data = {
-            'message': record.getMessage(),
-            'timestamp': self.formatTime(record, self.datefmt),
-            'level': record.levelname,
-            'logger': record.name,
-            'log_id': getattr(record, 'log_id', ''),
-            'run_id': getattr(record, 'run_id', ''),
-            'space_id': getattr(record, 'space_id', ''),
-            'project_id': getattr(record, 'project_id', ''),
-            'method': getattr(record, 'method', ''),
-            'x_tt_env': getattr(record, 'x_tt_env', ''),
-            'lineno': record.lineno,
-            'funcName': record.funcName,
-        }
-        
+
+class JsonFormatter(_StructuredFormatter):
+    pass
+
+
+class PlainTextFormatter(_StructuredFormatter):
+    pass
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    在调用线程中完成消息插值与异常格式化（上下文字段由 ContextFilter 写入记录），
+    JSON 序列化与文件/控制台写入交给 QueueListener 线程
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
         if record.exc_info:
-            log_data['exc_info'] = self.formatException(record.exc_info)
-        
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName', 
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs', 
-                          'message', 'pathname', 'process', 'processName', 'relativeCreated',
-                          'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
-                          'log_id', 'run_id', 'space_id', 'project_id', 'method',
-                          'x_tt_env', 'rpc_persist_rec_rec_biz_scene', 
-                          'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
-                          'rpc_persist_rec_root_entity_id']:
-                log_data[key] = value
-        
-        return json.dumps(log_data, ensure_ascii=False)
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_exception_formatter = logging.Formatter()
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_queue_listener():
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
 
 def setup_logging(
@@ -121,8 +179,10 @@ def setup_logging(
     backup_count: int = 5,
     log_level: str = "INFO",
     use_json_format: bool = True,
-    console_output: bool = True
+    console_output: bool = True,
+    use_queue: bool = LOG_QUEUE_ENABLED
 ):
+    global _queue_listener
     
     if log_file is None:
         try:
@@ -139,6 +199,7 @@ def setup_logging(
     root_logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
     
     root_logger.handlers.clear()
+    _stop_queue_listener()
     
     context_filter = ContextFilter()
     apscheduler_filter = APSchedulerFilter()
@@ -160,9 +221,7 @@ def setup_logging(
         )
     
     file_handler.setFormatter(file_formatter)
-    file_handler.addFilter(context_filter)
-    file_handler.addFilter(apscheduler_filter)
-    root_logger.addHandler(file_handler)
+    handlers = [file_handler]
     
     if console_output:
         console_handler = logging.StreamHandler()
@@ -173,13 +232,31 @@ def setup_logging(
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         console_handler.setFormatter(console_formatter)
-        console_handler.addFilter(context_filter)
-        console_handler.addFilter(apscheduler_filter)
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
+
+    if use_queue:
+        # 上下文字段必须在调用线程中读取，过滤器挂在 QueueHandler 上；格式化与写入在 listener 线程执行
+        queue_handler = _ContextQueueHandler(queue.SimpleQueue())
+        queue_handler.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+        queue_handler.addFilter(context_filter)
+        queue_handler.addFilter(apscheduler_filter)
+        root_logger.addHandler(queue_handler)
+        _queue_listener = logging.handlers.QueueListener(
+            queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        _queue_listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(context_filter)
+            handler.addFilter(apscheduler_filter)
+            root_logger.addHandler(handler)
     
     logging.info(f"Logging configured: file={log_file}, max_bytes={max_bytes}, backup_count={backup_count}")
     
     return log_file
 
 
+atexit.register(_stop_queue_listener)
+
+
 __all__ = ['setup_logging', 'request_context', 'ContextFilter', 'APSchedulerFilter', 'JsonFormatter', 'PlainTextFormatter']
@@ -1,5 +1,6 @@
 import uuid
-from dataclasses import dataclass, field, asdict
+import copy
+from dataclasses import dataclass, field
 from typing import List, Optional, Any, Dict, Literal
 
 # Message Types
@@ -32,12 +33,23 @@ MESSAGE_END_CODE_CANCELED = "1"
 TOOL_RESP_CODE_SUCCESS = "0"
 
 
+def _to_dict(detail: Any) -> Optional[Dict[str, Any]]:
+    return None if detail is None else detail.to_dict()
+
+
 @dataclass
 class TokenCost:
     input_tokens: int = field(default_factory=int)
     output_tokens: int = field(default_factory=int)
     total_tokens: int = field(default_factory=int)
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
 
 @dataclass
 class MessageEndDetail:
@@ -47,6 +59,14 @@ class MessageEndDetail:
     token_cost: Optional[TokenCost] = field(default=None)  # 消耗的token数量
     time_cost_ms: Optional[int] = field(default=None)  # 耗时，单位毫秒
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "message": self.message,
+            "token_cost": _to_dict(self.token_cost),
+            "time_cost_ms": self.time_cost_ms,
+        }
+
 
 @dataclass
 class MessageStartDetail:
@@ -54,18 +74,31 @@ class MessageStartDetail:
     msg_id: str = field(default_factory=str)
     execute_id: str = field(default_factory=str)
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {"local_msg_id": self.local_msg_id, "msg_id": self.msg_id, "execute_id": self.execute_id}
+
 @dataclass
 class ErrorDetail:
     local_msg_id: str = field(default_factory=str)
     code: str = field(default_factory=str)  # 错误码
     error_msg: str = field(default_factory=str)  # 错误消息
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {"local_msg_id": self.local_msg_id, "code": self.code, "error_msg": self.error_msg}
+
 @dataclass
 class ToolRequestDetail:
     tool_call_id: str = field(default_factory=str)
     tool_name: str = field(default_factory=str)
     parameters: Dict[str, Any] = field(default_factory=dict)  # tool_name to parameters
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tool_call_id": self.tool_call_id,
+            "tool_name": self.tool_name,
+            "parameters": copy.deepcopy(self.parameters),
+        }
+
 
 @dataclass
 class ToolResponseDetail:
@@ -77,6 +110,15 @@ class ToolResponseDetail:
     result: str = field(default_factory=str)  # tool执行结果
     time_cost_ms: Optional[int] = field(default=None)  # 耗时，单位毫秒
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tool_call_id": self.tool_call_id,
+            "code": self.code,
+            "message": self.message,
+            "result": self.result,
+            "time_cost_ms": self.time_cost_ms,
+        }
+
 
 @dataclass
 class ServerMessageContent:
@@ -90,6 +132,17 @@ class ServerMessageContent:
     message_start: Optional[MessageStartDetail] = field(default=None)  # 消息开始详情, 接收到消息后发送
     message_end: Optional[MessageEndDetail] = field(default=None)      # 消息结束详情, 处理完消息后发送
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "answer": self.answer,
+            "thinking": self.thinking,
+            "tool_request": _to_dict(self.tool_request),
+            "tool_response": _to_dict(self.tool_response),
+            "error": _to_dict(self.error),
+            "message_start": _to_dict(self.message_start),
+            "message_end": _to_dict(self.message_end),
+        }
+
 
 @dataclass
 class ServerMessage:
@@ -110,7 +163,18 @@ class ServerMessage:
     log_id: str = field(default_factory=str)  # 日志id, 用于关联日志
 
     def dict(self):
-        return asdict(self)
+        # 手写的 to_dict 与 dataclasses.asdict 结果一致，省去其逐字段递归与深拷贝（流式输出的热路径）
+        return {
+            "type": self.type,
+            "session_id": self.session_id,
+            "query_msg_id": self.query_msg_id,
+            "reply_id": self.reply_id,
+            "msg_id": self.msg_id,
+            "sequence_id": self.sequence_id,
+            "finish": self.finish,
+            "content": self.content.to_dict(),
+            "log_id": self.log_id,
+        }
 
 
 
@@ -15,6 +15,7 @@ from utils.openai.types.response import (
     Message,
     Usage,
 )
+from utils.helper.sse import SSE_DONE, dumps
 
 
 class ResponseConverter:
@@ -27,6 +28,13 @@ class ResponseConverter:
         self._sent_role = False  # 是否已发送 assistant role
         # 工具调用流式状态
         self._current_tool_calls: Dict[int, Dict[str, Any]] = {}  # index -> {id, name, args}
+        # chunk 中 id/object/created/model 在一次请求内不变，预先编码
+        self._sse_prefix = b"".join((
+            b'data: {"id":', dumps(self.request_id),
+            b',"object":"chat.completion.chunk","created":', dumps(self.created),
+            b',"model":', dumps(self.model),
+            b',"choices":[{"index":0,"delta":',
+        ))
 
     def _create_chunk(
         self,
@@ -50,7 +58,7 @@ class ResponseConverter:
 
     def iter_langgraph_stream(
         self, items: Iterator[Any]
-    ) -> Iterator[str]:
+    ) -> Iterator[bytes]:
         """
         直接处理 LangGraph 原始流，实现工具参数的增量输出
 
@@ -59,7 +67,7 @@ class ResponseConverter:
                    每个 item 是 (chunk, metadata) 元组
 
         Yields:
-            SSE 格式字符串
+            SSE 格式 bytes
         """
         # 跟踪是否已发送过 finish_reason（tool_calls 或 stop）
         sent_finish_reason = False
@@ -93,11 +101,11 @@ class ResponseConverter:
         if self._sent_role and not sent_finish_reason:
             yield self._chunk_to_sse(self._create_chunk(Delta(), finish_reason="stop"))
 
-        yield "data: [DONE]\n\n"
+        yield SSE_DONE
 
     def _process_langgraph_chunk(
         self, chunk: Any, meta: Dict[str, Any]
-    ) -> Iterator[str]:
+    ) -> Iterator[bytes]:
         """处理单个 LangGraph chunk"""
         chunk_type = chunk.__class__.__name__
         is_last = (meta or {}).get("chunk_position") == "last"
@@ -111,7 +119,7 @@ class ResponseConverter:
 
     def _process_ai_message_chunk(
         self, chunk: Any, meta: Dict[str, Any], is_last: bool
-    ) -> Iterator[str]:
+    ) -> Iterator[bytes]:
         """处理 AIMessageChunk - 支持增量文本和工具调用"""
         # 处理文本内容
         text = getattr(chunk, "content", "")
@@ -148,7 +156,7 @@ class ResponseConverter:
             self._current_tool_calls = {}
             self._sent_role = False
 
-    def _process_tool_call_chunk(self, tc_chunk: Any) -> Iterator[str]:
+    def _process_tool_call_chunk(self, tc_chunk: Any) -> Iterator[bytes]:
         """处理单个工具调用增量 - 流式输出参数"""
         # 获取 chunk 属性
         if isinstance(tc_chunk, dict):
@@ -218,7 +226,7 @@ class ResponseConverter:
                 )
                 yield self._chunk_to_sse(self._create_chunk(Delta(tool_calls=[tool_call])))
 
-    def _process_ai_message(self, chunk: Any) -> Iterator[str]:
+    def _process_ai_message(self, chunk: Any) -> Iterator[bytes]:
         """处理完整的 AIMessage"""
         text = getattr(chunk, "content", "")
         if text:
@@ -229,7 +237,7 @@ class ResponseConverter:
 
     def _process_tool_message(
         self, chunk: Any, meta: Dict[str, Any], is_last: bool
-    ) -> Iterator[str]:
+    ) -> Iterator[bytes]:
         """处理 ToolMessage - 工具执行结果"""
         is_streaming = (meta or {}).get("chunk_position") is not None
 
@@ -262,9 +270,16 @@ class ResponseConverter:
             return "".join(str(x) for x in value)
         return str(value)
 
-    def _chunk_to_sse(self, chunk: ChatCompletionChunk) -> str:
-        """将 chunk 转换为 SSE 格式"""
-        return f"data: {json.dumps(chunk.to_dict(), ensure_ascii=False)}\n\n"
+    def _chunk_to_sse(self, chunk: ChatCompletionChunk) -> bytes:
+        """将 _create_chunk 创建的 chunk 转换为 SSE 格式，只序列化 delta 与 finish_reason"""
+        choice = chunk.choices[0]
+        return b"".join((
+            self._sse_prefix,
+            dumps(choice.delta.to_dict()),
+            b',"finish_reason":',
+            dumps(choice.finish_reason),
+            b"}]}\n\n",
+        ))
 
     def collect_langgraph_to_response(
         self, items: Iterator[Any]
@@ -2,8 +2,6 @@
 
 import asyncio
 import logging
-import threading
-import contextvars
 from typing import Dict, Any, Union, AsyncGenerator
 
 from fastapi.responses import StreamingResponse, JSONResponse
@@ -12,7 +10,12 @@ from coze_coding_utils.runtime_ctx.context import Context
 from utils.openai.types.response import OpenAIError, OpenAIErrorResponse
 from utils.openai.converter.request_converter import RequestConverter
 from utils.openai.converter.response_converter import ResponseConverter
-from utils.error import classify_error
+from utils.error import ErrorCode, classify_error
+from utils.helper.producer_pool import producer_pool, iter_until_cancelled, ProducerPoolFullError
+from utils.helper.stream_buffer import StreamBuffer
+from utils.helper.cancellation import CancelScope
+from utils.helper.metrics import record_run_error
+from utils.helper.sse import SSE_DONE, sse_data_event
 
 logger = logging.getLogger(__name__)
 
@@ -104,14 +107,16 @@ class OpenAIChatHandler:
     ) -> StreamingResponse:
         """流式响应处理"""
 
-        async def stream_generator() -> AsyncGenerator[str, None]:
+        async def stream_generator() -> AsyncGenerator[bytes, None]:
             """异步流式生成器"""
-            loop = asyncio.get_running_loop()
-            queue: asyncio.Queue = asyncio.Queue()
-            context = contextvars.copy_context()
+            # 有界缓冲：积压到高水位时暂停 producer
+            buffer = StreamBuffer(asyncio.get_running_loop())
+            # 消费方断开/取消时通知 producer 停止
+            cancelled = CancelScope()
 
             def producer():
                 """后台线程生产者"""
+                run_config = None
                 try:
                     # 获取 graph 并配置
                     from utils.helper import graph_helper
@@ -136,36 +141,53 @@ class OpenAIChatHandler:
                     )
 
                     # 使用 iter_langgraph_stream 方法，支持工具参数流式输出
+                    items = iter_until_cancelled(items, cancelled)
                     for sse_data in response_converter.iter_langgraph_stream(items):
-                        if sse_data != "data: [DONE]\n\n":  # 不在这里发送 DONE
-                            loop.call_soon_threadsafe(queue.put_nowait, sse_data)
+                        if sse_data != SSE_DONE:  # 不在这里发送 DONE
+                            if not buffer.put(sse_data):
+                                return
 
                 except Exception as ex:
                     logger.error(f"Stream producer error: {ex}", exc_info=True)
                     err = classify_error(ex, {"node_name": "openai_stream"})
+                    from utils.log.loop_trace import trace_error
+                    trace_error(run_config, ctx, ex)
+                    record_run_error(err)
                     error_chunk = self._create_error_sse_chunk(
                         str(err.code),
                         str(ex),
                         response_converter.request_id,
                     )
-                    loop.call_soon_threadsafe(queue.put_nowait, error_chunk)
+                    buffer.put(error_chunk)
                 finally:
-                    loop.call_soon_threadsafe(queue.put_nowait, "data: [DONE]\n\n")
-                    loop.call_soon_threadsafe(queue.put_nowait, None)
+                    buffer.put(SSE_DONE)
+                    buffer.put(None)
 
-            # 启动后台线程
-            threading.Thread(target=lambda: context.run(producer), daemon=True).start()
+            # 在共享线程池中启动 producer
+            try:
+                producer_pool.submit(producer, cancelled=cancelled)
+            except ProducerPoolFullError as ex:
+                yield self._create_error_sse_chunk(str(ex.code), ex.message, response_converter.request_id)
+                yield SSE_DONE
+                return
 
-            # 从队列消费
+            # 从缓冲消费：积压的多个 SSE 事件合并为一次写出
             try:
                 while True:
-                    item = await queue.get()
-                    if item is None:
+                    batch = await buffer.get_batch()
+                    done = batch[-1] is None
+                    if done:
+                        batch.pop()
+                    if batch:
+                        yield b"".join(batch)
+                    if done:
                         break
-                    yield item
             except asyncio.CancelledError:
                 logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
                 raise
+            finally:
+                cancelled.set()
+                buffer.close()
 
         return StreamingResponse(
             stream_generator(),
@@ -181,11 +203,17 @@ class OpenAIChatHandler:
     ) -> JSONResponse:
         """非流式响应处理"""
         loop = asyncio.get_running_loop()
-        context = contextvars.copy_context()
         result_future: asyncio.Future = loop.create_future()
+        cancelled = CancelScope()
+
+        def settle(setter, value):
+            # 请求已取消时 future 已完成，不再设置结果
+            if not result_future.done():
+                setter(value)
 
         def producer():
             """后台线程生产者"""
+            run_config = None
             try:
                 # 获取 graph 并配置
                 from utils.helper import graph_helper
@@ -210,27 +238,50 @@ class OpenAIChatHandler:
                 )
 
                 # 使用 collect_langgraph_to_response 方法收集结果
-                response = response_converter.collect_langgraph_to_response(items)
+                response = response_converter.collect_langgraph_to_response(
+                    iter_until_cancelled(items, cancelled)
+                )
                 loop.call_soon_threadsafe(
+                    settle,
                     result_future.set_result,
                     response.to_dict()
                 )
 
             except Exception as ex:
                 logger.error(f"Non-stream producer error: {ex}", exc_info=True)
+                from utils.log.loop_trace import trace_error
+                trace_error(run_config, ctx, ex)
+                record_run_error(ex)
                 loop.call_soon_threadsafe(
+                    settle,
                     result_future.set_exception,
                     ex
                 )
 
-        # 启动后台线程
-        threading.Thread(target=lambda: context.run(producer), daemon=True).start()
+        # 在共享线程池中启动 producer，已满时直接返回 503
+        try:
+            producer_pool.submit(producer, cancelled=cancelled)
+        except ProducerPoolFullError as e:
+            return self._handle_error(e)
 
         try:
             result = await result_future
             return JSONResponse(content=result)
         except Exception as e:
             return self._handle_error(e)
+        finally:
+            cancelled.set()
+
+    def overloaded_response(self, message: str, code: str, retry_after: int) -> JSONResponse:
+        """并发已达上限、请求被拒绝时的 429 响应，Retry-After 告知客户端重试间隔（秒）"""
+        response = self._error_response(
+            message=message,
+            error_type="rate_limit_error",
+            code=code,
+            status_code=429,
+        )
+        response.headers["Retry-After"] = str(retry_after)
+        return response
 
     def _handle_error(self, error: Exception) -> JSONResponse:
         """错误处理，返回 OpenAI 标准错误格式"""
@@ -251,6 +302,10 @@ class OpenAIChatHandler:
             error_type = "not_found_error"
             status_code = 404
 
+        if err.code == ErrorCode.RUNTIME_OVERLOADED:
+            error_type = "server_overloaded"
+            status_code = 503
+
         return self._error_response(
             message=str(error),
             error_type=error_type,
@@ -283,9 +338,8 @@ class OpenAIChatHandler:
         code: str,
         message: str,
         request_id: str,
-    ) -> str:
+    ) -> bytes:
         """创建错误 SSE chunk"""
-        import json
         error_data = {
             "id": request_id,
             "object": "chat.completion.chunk",
@@ -295,4 +349,4 @@ class OpenAIChatHandler:
                 "code": code,
             }
         }
-        return f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+        return sse_data_event(error_data)